@@ -0,0 +1,99 @@
+"""
+Блокировка event loop ежедневной волной задач планировщика (REMINDER_HOUR):
+проверка дней рождения, дедлайнов сборов и напоминания неплательщикам.
+
+Волна прогоняется в режимах executor_mode="loop" (AsyncSession.run_sync в event
+loop) и "thread" (пул потоков); параллельно LoopStallMonitor меряет, насколько
+задерживается обработка апдейтов.
+
+    python -m benchmarks.bench_scheduler_stall --users 20000 --funds 5
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, delete, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Fund, Notification, User
+from scheduler import NotificationScheduler
+from utils.loop_monitor import LoopStallMonitor
+
+
+def seed(engine, users: int, funds: int):
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.execute(insert(User), [
+            {"id": i + 1, "telegram_id": 100000 + i, "employee_id": str(i + 1),
+             "full_name": f"Сотрудник {i}",
+             "birthday": datetime.combine(date(1990, 1, 1) + timedelta(days=i % 365),
+                                          datetime.min.time()),
+             "is_active": True}
+            for i in range(users)
+        ])
+        db.execute(insert(Fund), [
+            {"title": f"Сбор {i}", "target_amount": 1000.0, "current_amount": 0.0,
+             "end_date": datetime.now() + timedelta(days=1, hours=1), "is_active": True,
+             "fund_type": "event", "treasurer_id": 1}
+            for i in range(funds)
+        ])
+        db.commit()
+
+
+async def run_wave(scheduler: NotificationScheduler, monitor: LoopStallMonitor):
+    monitor.reset()
+    started = time.perf_counter()
+    await scheduler.check_upcoming_birthdays()
+    await scheduler.check_fund_deadlines()
+    await scheduler.remind_unpaid_participants()
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(monitor.interval * 2)
+    return elapsed, monitor.stats()
+
+
+async def run(directory: str, users: int, funds: int, rounds: int):
+    path = os.path.join(directory, "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    seed(engine, users, funds)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+    monitor = LoopStallMonitor(interval=0.01, warning_ms=float("inf"))
+    monitor.start()
+    for mode in ("loop", "thread") * rounds:
+        # Ключи идемпотентности сделали бы повторную волну пустой
+        with engine.begin() as connection:
+            connection.execute(delete(Notification))
+        scheduler = NotificationScheduler(
+            session_factory=async_sessionmaker(bind=async_engine, expire_on_commit=False),
+            jobstore_engine=engine,
+            sync_session_factory=sessionmaker(bind=engine),
+            executor_mode=mode
+        )
+        elapsed, stats = await run_wave(scheduler, monitor)
+        scheduler.executor.shutdown()
+        print(f"{mode:>6}: wave {elapsed:6.2f} s, loop stall max {stats['max_ms']:8.1f} ms, "
+              f"p99 {stats['p99_ms']:7.1f} ms ({stats['samples']} samples)")
+    await monitor.close()
+    await async_engine.dispose()
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Блокировка event loop задачами планировщика")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--funds", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=2, help="повторов каждого режима")
+    args = parser.parse_args()
+
+    print(f"{args.users} users, {args.funds} funds")
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(directory, args.users, args.funds, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
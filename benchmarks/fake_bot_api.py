@@ -0,0 +1,234 @@
+"""
+Локальная замена Telegram Bot API для нагрузочного тестирования.
+
+aiohttp-сервер отвечает на методы Bot API по адресу /bot<token>/<method>,
+поэтому бот подключается к нему обычной AiohttpSession:
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base("http://127.0.0.1:8081"))
+
+Возможности:
+- задержка ответа (latency + случайный jitter);
+- внедрение ошибок: 429 с retry_after и 403 «bot was blocked by the user»;
+- getUpdates с long polling по очереди входящих апдейтов;
+- ScriptedUpdates — генератор входящих сообщений по сценарию.
+
+Запуск отдельно:
+    python -m benchmarks.fake_bot_api --port 8081 --latency 0.05 --error-429 0.01
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "Benchmark Bot", "username": "benchmark_bot"}
+
+
+class FakeBotApi:
+    """
+    Имитация Bot API.
+
+    Attributes:
+        calls (Counter): Количество вызовов по методам
+        errors (Counter): Количество внедрённых ошибок по кодам
+        pushed_at (Dict[int, float]): Момент постановки апдейта (time.perf_counter) по update_id
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_429_rate: float = 0.0,
+        retry_after: int = 1,
+        blocked_chat_ids: Iterable[int] = (),
+        seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_429_rate = error_429_rate
+        self.retry_after = retry_after
+        self.blocked_chat_ids: Set[int] = set(blocked_chat_ids)
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.pushed_at: Dict[int, float] = {}
+        self._random = random.Random(seed)
+        self._updates: List[Dict[str, Any]] = []
+        self._new_updates = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    # ---------- Входящие апдейты ----------
+
+    def push_update(self, update: Dict[str, Any]) -> int:
+        """Постановка апдейта в очередь getUpdates; update_id назначается автоматически"""
+        update_id = next(self._update_ids)
+        update = {**update, "update_id": update_id}
+        self._updates.append(update)
+        self.pushed_at[update_id] = time.perf_counter()
+        self._new_updates.set()
+        return update_id
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+
+        # Подтверждённые (update_id < offset) апдейты больше не нужны
+        if offset:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    # ---------- Методы Bot API ----------
+
+    def _message(self, chat_id: int, text: str) -> Dict[str, Any]:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text,
+        }
+
+    async def _call(self, method: str, params: Dict[str, Any]) -> web.Response:
+        if method == "getupdates":
+            return self._ok(await self._get_updates(params))
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+
+        if method in ("sendmessage", "editmessagetext", "sendphoto", "senddocument"):
+            chat_id = int(params.get("chat_id", 0))
+            if chat_id in self.blocked_chat_ids:
+                return self._error(403, "Forbidden: bot was blocked by the user")
+            if self.error_429_rate and self._random.random() < self.error_429_rate:
+                return self._error(429, f"Too Many Requests: retry after {self.retry_after}",
+                                   parameters={"retry_after": self.retry_after})
+            return self._ok(self._message(chat_id, params.get("text", "")))
+
+        if method == "getme":
+            return self._ok(BOT_USER)
+        if method == "getwebhookinfo":
+            return self._ok({"url": "", "has_custom_certificate": False, "pending_update_count": 0})
+        # setMyCommands, deleteWebhook, answerCallbackQuery, close и прочие методы с ответом True
+        return self._ok(True)
+
+    def _ok(self, result: Any) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    def _error(self, code: int, description: str, **extra: Any) -> web.Response:
+        self.errors[code] += 1
+        return web.json_response(
+            {"ok": False, "error_code": code, "description": description, **extra}, status=code
+        )
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        self.calls[method] += 1
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        # Сложные параметры aiogram передаёт JSON-строками
+        for key, value in params.items():
+            if isinstance(value, str) and value[:1] in "[{":
+                try:
+                    params[key] = json.loads(value)
+                except ValueError:
+                    pass
+        return await self._call(method, params)
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/bot{token}/{method}", self.handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> web.AppRunner:
+        """Запуск сервера; вернуть runner нужно для runner.cleanup()"""
+        runner = web.AppRunner(self.create_app())
+        await runner.setup()
+        await web.TCPSite(runner, host=host, port=port).start()
+        logger.info(f"Fake Bot API started on http://{host}:{port}")
+        return runner
+
+
+class ScriptedUpdates:
+    """
+    Генератор входящих сообщений по сценарию.
+
+    Пользователи по кругу отправляют случайные тексты из script (команды и кнопки меню).
+    """
+
+    DEFAULT_SCRIPT = ("/menu", "/mydata", "/active_funds", "💰 Активные сборы", "/start")
+
+    def __init__(self, telegram_ids: Sequence[int], script: Sequence[str] = DEFAULT_SCRIPT,
+                 seed: Optional[int] = None):
+        self.telegram_ids = list(telegram_ids)
+        self.script = list(script)
+        self._random = random.Random(seed)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        # Пользователи чередуются по кругу, чтобы не упираться в AntiSpamMiddleware
+        for i in itertools.count():
+            telegram_id = self.telegram_ids[i % len(self.telegram_ids)]
+            yield {
+                "message": {
+                    "message_id": i + 1,
+                    "date": int(time.time()),
+                    "chat": {"id": telegram_id, "type": "private"},
+                    "from": {"id": telegram_id, "is_bot": False,
+                             "first_name": f"User{telegram_id}"},
+                    "text": self._random.choice(self.script),
+                }
+            }
+
+    async def feed(self, api: FakeBotApi, count: int, rate: float = 0.0):
+        """Постановка count апдейтов в FakeBotApi; rate — апдейтов в секунду (0 — сразу все)"""
+        started = time.perf_counter()
+        for i, update in enumerate(itertools.islice(self, count)):
+            if rate:
+                delay = started + i / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            api.push_update(update)
+
+
+async def _serve(args: argparse.Namespace):
+    api = FakeBotApi(latency=args.latency, jitter=args.jitter, error_429_rate=args.error_429,
+                     retry_after=args.retry_after)
+    runner = await api.start(args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальная замена Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, сек")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="случайная добавка к задержке, сек")
+    parser.add_argument("--error-429", type=float, default=0.0, help="доля ответов 429 на отправку")
+    parser.add_argument("--retry-after", type=int, default=1)
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
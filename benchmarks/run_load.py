@@ -0,0 +1,189 @@
+"""
+Нагрузочный прогон бота против локального Bot API (benchmarks/fake_bot_api.py).
+
+Поднимает FakeBotApi, заполняет отдельную БД (DB_NAME=benchmark) пользователями
+и сборами, запускает реальные роутеры из handlers/ в режиме поллинга и подаёт
+сценарные апдейты. По итогам печатает пропускную способность (апдейтов/с)
+и перцентили p50/p95/p99 времени обработки и сквозной задержки.
+
+Пример:
+    python -m benchmarks.run_load --users 500 --updates 5000 --latency 0.02 --error-429 0.01
+"""
+
+import os
+
+# БД и токен прогона задаются до импорта config
+os.environ.setdefault("DB_NAME", "benchmark")
+os.environ.setdefault("BOT_TOKEN", "42:BENCHMARK")
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from benchmarks.fake_bot_api import FakeBotApi, ScriptedUpdates
+from bot import create_bot, create_dispatcher
+from config import DB_NAME
+from database import engine
+from models import Base, Fund, Role, Staff, User, user_roles
+
+logger = logging.getLogger(__name__)
+
+FIRST_TELEGRAM_ID = 100000
+
+
+def seed_database(users: int, funds: int):
+    """Пересоздание БД прогона и наполнение пользователями со связанными сотрудниками"""
+    if not DB_NAME.startswith("benchmark"):
+        raise SystemExit(f"Refusing to recreate non-benchmark database '{DB_NAME}'")
+
+    engine.echo = False
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        role = Role(name="user")
+        db.add(role)
+        db.flush()
+        db.execute(insert(Staff), [
+            {"id": i + 1, "first_name": f"Имя{i}", "patronymic": f"Отчество{i}",
+             "birthday": date(1990, 1, 1) + timedelta(days=i % 365), "personnel_number": i + 1}
+            for i in range(users)
+        ])
+        db.execute(insert(User), [
+            {"id": i + 1, "telegram_id": FIRST_TELEGRAM_ID + i, "employee_id": str(i + 1),
+             "full_name": f"Сотрудник {i}", "staff_id": i + 1, "is_active": True}
+            for i in range(users)
+        ])
+        db.execute(insert(user_roles),
+                   [{"user_id": i + 1, "role_id": role.id} for i in range(users)])
+        db.execute(insert(Fund), [
+            {"title": f"Сбор {i}", "target_amount": 1000.0, "current_amount": 0.0,
+             "end_date": datetime.now() + timedelta(days=14), "is_active": True,
+             "fund_type": "event", "treasurer_id": 1}
+            for i in range(funds)
+        ])
+        db.commit()
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 в миллисекундах"""
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49] * 1000, "p95": cuts[94] * 1000, "p99": cuts[98] * 1000}
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    seed_database(args.users, args.funds)
+    telegram_ids = [FIRST_TELEGRAM_ID + i for i in range(args.users)]
+    blocked = telegram_ids[:int(args.users * args.blocked)]
+
+    api = FakeBotApi(latency=args.latency, jitter=args.jitter, error_429_rate=args.error_429,
+                     retry_after=args.retry_after, blocked_chat_ids=blocked, seed=args.seed)
+    runner = await api.start(port=args.port)
+
+    api_server = TelegramAPIServer.from_base(f"http://127.0.0.1:{args.port}")
+    bot = create_bot(AiohttpSession(api=api_server))
+    dp = create_dispatcher()
+
+    # Время обработки апдейта целиком: все middleware и хендлер
+    processing: List[float] = []
+    done_at: Dict[int, float] = {}
+    failed = 0
+    finished = asyncio.Event()
+    feed_update = dp.feed_update
+
+    async def timed_feed_update(bot, update, **kwargs):
+        nonlocal failed
+        started = time.perf_counter()
+        try:
+            return await feed_update(bot, update, **kwargs)
+        except Exception:
+            failed += 1
+            raise
+        finally:
+            now = time.perf_counter()
+            processing.append(now - started)
+            done_at[update.update_id] = now
+            if len(done_at) >= args.updates:
+                finished.set()
+
+    dp.feed_update = timed_feed_update
+
+    polling = asyncio.create_task(dp.start_polling(bot, polling_timeout=1, handle_signals=False))
+    started = time.perf_counter()
+    await ScriptedUpdates(telegram_ids, seed=args.seed).feed(api, args.updates, rate=args.rate)
+    try:
+        await asyncio.wait_for(finished.wait(), args.timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Timeout: processed {len(done_at)} of {args.updates} updates")
+    elapsed = time.perf_counter() - started
+
+    await dp.stop_polling()
+    await polling
+    await dp.storage.close()
+    await runner.cleanup()
+
+    end_to_end = [done_at[update_id] - api.pushed_at[update_id] for update_id in done_at]
+    return {
+        "updates": len(done_at),
+        "failed": failed,
+        "elapsed": elapsed,
+        "updates_per_sec": len(done_at) / elapsed if elapsed else 0.0,
+        "processing_ms": percentiles(processing),
+        "end_to_end_ms": percentiles(end_to_end),
+        "api_calls": dict(api.calls),
+        "api_errors": dict(api.errors),
+    }
+
+
+def print_report(report: Dict):
+    print(f"Updates processed: {report['updates']} in {report['elapsed']:.2f} s "
+          f"({report['updates_per_sec']:.1f} updates/s), handler errors: {report['failed']}")
+    for name in ("processing_ms", "end_to_end_ms"):
+        p = report[name]
+        print(f"{name:>15}: p50={p['p50']:.1f}  p95={p['p95']:.1f}  p99={p['p99']:.1f}")
+    print("Bot API calls:", ", ".join(f"{k}={v}" for k, v in sorted(report["api_calls"].items())))
+    if report["api_errors"]:
+        print("Injected errors:",
+              ", ".join(f"{k}={v}" for k, v in sorted(report["api_errors"].items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный прогон бота против локального Bot API"
+    )
+    parser.add_argument("--users", type=int, default=500, help="зарегистрированных пользователей")
+    parser.add_argument("--funds", type=int, default=5, help="активных сборов")
+    parser.add_argument("--updates", type=int, default=2000, help="входящих апдейтов")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="апдейтов в секунду (0 — сразу все)")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа Bot API, сек")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="случайная добавка к задержке, сек")
+    parser.add_argument("--error-429", type=float, default=0.0, help="доля ответов 429 на отправку")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--blocked", type=float, default=0.0,
+                        help="доля пользователей, заблокировавших бота")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--timeout", type=float, default=300, help="предельное время прогона, сек")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, force=True)
+    # Ошибки хендлеров (внедрённые 429/403) считаются в отчёте, трассировки не нужны
+    logging.getLogger("aiogram.event").setLevel(logging.CRITICAL)
+    print_report(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
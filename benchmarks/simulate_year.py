@@ -0,0 +1,287 @@
+"""
+Прогон ежедневных задач NotificationScheduler на виртуальном времени.
+
+Часы приложения (clock) переводятся на SimulatedClock, и день за днём
+на синтетической БД выполняются те же задачи, что и в боте: перестройка
+индекса дней рождения, проверки дней рождения и дедлайнов, напоминания
+неплательщикам и доставка запланированных уведомлений. Параллельно идёт
+жизнь сборов: за FUND_LEAD_DAYS до дня рождения открывается сбор, раз в
+--event-every дней — общий сбор, участники сдают деньги, истёкшие сборы
+закрываются.
+
+Сообщения никуда не отправляются (бот не нужен, токен не требуется) —
+считается только их количество. По итогам печатаются по дням длительность
+задач, просмотренные строки, созданные уведомления и отправки (по job_runs).
+
+    python -m benchmarks.simulate_year --users 500 --days 365
+    python -m benchmarks.simulate_year --users 2000 --csv year.csv
+"""
+
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from clock import SimulatedClock, clock
+from config import REMINDER_PLAN_HOUR, SCHEDULER_EXECUTOR_MODE
+from models import Base, Donation, Fund, JobRun, Role, User, user_roles
+from scheduler import NotificationScheduler
+from utils.due_timer import due_timer
+from utils.send_queue import DELIVERY_SENT
+
+DEPARTMENTS = ["Бухгалтерия", "Разработка", "Продажи", "Склад", "Администрация"]
+FUND_LEAD_DAYS = 14      # за сколько дней до дня рождения открывается сбор
+EVENT_FUND_DAYS = 10     # длительность общего сбора
+TREASURERS = 5           # казначеи и администраторы — первые пользователи
+
+JOBS = [
+    "birthday_index_rebuild", "birthday_check", "fund_check", "unpaid_reminder",
+    "scheduled_broadcasts"
+]
+
+
+class SimulatedScheduler(NotificationScheduler):
+    """Планировщик, который считает отправки вместо обращения к Bot API"""
+
+    async def _send_notification(self, notification) -> str:
+        return DELIVERY_SENT
+
+
+class FundActivity:
+    """Синтетическая жизнь сборов: открытие, взносы, закрытие"""
+
+    def __init__(self, db_factory, birthdays: Dict[int, date], users: int, donation_rate: float,
+                 event_every: int, rng: random.Random):
+        self.db_factory = db_factory
+        self.birthdays = birthdays
+        self.users = users
+        self.donation_rate = donation_rate
+        self.event_every = event_every
+        self.rng = rng
+        # Очередь будущих участников по сбору: каждый день сдаёт её начало
+        self.donors: Dict[int, List[int]] = {}
+
+    def _open(self, db, day: date, title: str, end: date, fund_type: str, birthday_person_id=None):
+        participants = [user_id for user_id in range(1, self.users + 1)
+                        if user_id != birthday_person_id]
+        self.rng.shuffle(participants)
+        fund_id = db.execute(insert(Fund).values(
+            title=title, target_amount=500.0 * len(participants), current_amount=0.0,
+            start_date=datetime.combine(day, datetime.min.time()),
+            end_date=datetime.combine(end, datetime.min.time()),
+            is_active=True, fund_type=fund_type, birthday_person_id=birthday_person_id,
+            treasurer_id=self.rng.randint(1, TREASURERS)
+        )).inserted_primary_key[0]
+        self.donors[fund_id] = participants
+
+    def run_day(self, day: date):
+        now = datetime.combine(day, datetime.min.time())
+        with self.db_factory() as db:
+            expired = db.scalars(
+                select(Fund.id).filter(Fund.is_active == True, Fund.end_date <= now)
+            ).all()
+            if expired:
+                db.execute(update(Fund).where(Fund.id.in_(expired)).values(is_active=False))
+                for fund_id in expired:
+                    self.donors.pop(fund_id, None)
+
+            target = day + timedelta(days=FUND_LEAD_DAYS)
+            for user_id in self.birthdays_on(target):
+                self._open(db, day, f"ДР сотрудника {user_id}", target, "birthday", user_id)
+            if self.event_every and day.toordinal() % self.event_every == 0:
+                end = day + timedelta(days=EVENT_FUND_DAYS)
+                self._open(db, day, f"Сбор {day:%d.%m}", end, "event")
+
+            donations = []
+            for fund_id, queue in self.donors.items():
+                count = min(len(queue), int(len(queue) * self.donation_rate) + 1)
+                donations.extend(
+                    {"fund_id": fund_id, "donor_id": donor_id, "amount": 500.0,
+                     "donation_date": now + timedelta(hours=self.rng.randint(8, 20))}
+                    for donor_id in queue[:count]
+                )
+                del queue[:count]
+            if donations:
+                db.execute(insert(Donation), donations)
+            db.commit()
+
+    def birthdays_on(self, day: date) -> List[int]:
+        return [user_id for user_id, birthday in self.birthdays.items()
+                if (birthday.month, birthday.day) == (day.month, day.day)]
+
+
+def seed(engine, users: int, rng: random.Random) -> Dict[int, date]:
+    Base.metadata.create_all(bind=engine)
+    birthdays = {i + 1: date(1970, 1, 1) + timedelta(days=rng.randrange(365 * 30))
+                 for i in range(users)}
+    with sessionmaker(bind=engine)() as db:
+        db.execute(insert(User), [
+            {"id": user_id, "telegram_id": 100000 + user_id, "employee_id": str(user_id),
+             "full_name": f"Сотрудник {user_id}",
+             "department": DEPARTMENTS[user_id % len(DEPARTMENTS)],
+             "birthday": datetime.combine(birthday, datetime.min.time()), "is_active": True}
+            for user_id, birthday in birthdays.items()
+        ])
+        # Уведомления о днях рождения адресуются администраторам
+        role_id = db.execute(insert(Role).values(name="admin")).inserted_primary_key[0]
+        db.execute(insert(user_roles), [
+            {"user_id": user_id, "role_id": role_id} for user_id in range(1, TREASURERS + 1)
+        ])
+        db.commit()
+    return birthdays
+
+
+def day_report(db_factory, day: date) -> Dict:
+    """Итоги дня по job_runs"""
+    start = datetime.combine(day, datetime.min.time())
+    report = {"day": day.isoformat(), "rows_scanned": 0, "notifications_created": 0,
+              "messages_sent": 0, "errors": 0}
+    report.update({f"{job}_ms": 0.0 for job in JOBS})
+    with db_factory() as db:
+        runs = db.scalars(select(JobRun).filter(
+            JobRun.started_at >= start, JobRun.started_at < start + timedelta(days=1)
+        )).all()
+    for run in runs:
+        if run.job in JOBS:
+            report[f"{run.job}_ms"] += run.duration_ms
+        report["rows_scanned"] += run.rows_scanned
+        report["notifications_created"] += run.notifications_created
+        report["messages_sent"] += run.messages_sent
+        report["errors"] += run.errors
+    return report
+
+
+async def simulate(directory: str, args: argparse.Namespace) -> List[Dict]:
+    path = os.path.join(directory, "simulation.db")
+    engine = create_engine(f"sqlite:///{path}")
+    rng = random.Random(args.seed)
+    birthdays = seed(engine, args.users, rng)
+    db_factory = sessionmaker(bind=engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+    scheduler = SimulatedScheduler(
+        bot=object(),  # доставка подменена, бот нужен только как признак «отправлять»
+        session_factory=async_sessionmaker(bind=async_engine, expire_on_commit=False),
+        jobstore_engine=engine,
+        sync_session_factory=db_factory,
+        executor_mode=args.executor_mode
+    )
+    activity = FundActivity(db_factory, birthdays, args.users, args.donation_rate,
+                            args.event_every, rng)
+    simulated = SimulatedClock(datetime.combine(args.start, datetime.min.time()))
+
+    reports = []
+    # Задачи кладут слоты доставки в общий due_timer процесса, а dispatch_scheduled
+    # здесь не запущен: наступившее снимается вручную, куча сбрасывается до и после
+    due_timer.clear()
+    try:
+        with clock.use(simulated):
+            for offset in range(args.days):
+                day = args.start + timedelta(days=offset)
+                midnight = datetime.combine(day, datetime.min.time())
+
+                simulated.set(midnight)
+                await scheduler.rebuild_birthday_index()
+                await scheduler.cleanup_job_runs()
+                activity.run_day(day)
+
+                simulated.set(midnight + timedelta(hours=REMINDER_PLAN_HOUR))
+                await scheduler.check_upcoming_birthdays()
+                await scheduler.check_fund_deadlines()
+                await scheduler.remind_unpaid_participants()
+
+                # Диспетчер за день доставляет всё, что наступило к концу суток
+                simulated.set(midnight + timedelta(hours=23, minutes=59))
+                await scheduler.send_scheduled_broadcasts()
+                due_timer.pop_due(clock.now())
+
+                reports.append(day_report(db_factory, day))
+                if not args.quiet:
+                    print(format_day(reports[-1]), flush=True)
+    finally:
+        due_timer.clear()
+        scheduler.executor.shutdown()
+        await async_engine.dispose()
+        engine.dispose()
+    return reports
+
+
+HEADER = (f"{'day':>10} {'birthday':>9} {'fund':>7} {'unpaid':>8} {'dispatch':>9} "
+          f"{'scanned':>9} {'created':>8} {'sent':>8} {'err':>4}")
+
+
+def format_day(r: Dict) -> str:
+    return (f"{r['day']:>10} {r['birthday_check_ms']:9.1f} {r['fund_check_ms']:7.1f} "
+            f"{r['unpaid_reminder_ms']:8.1f} {r['scheduled_broadcasts_ms']:9.1f} "
+            f"{r['rows_scanned']:9d} {r['notifications_created']:8d} {r['messages_sent']:8d} "
+            f"{r['errors']:4d}")
+
+
+def print_totals(reports: List[Dict], elapsed: float):
+    totals = defaultdict(float)
+    for r in reports:
+        for key, value in r.items():
+            if key != "day":
+                totals[key] += value
+    busiest = max(reports, key=lambda r: r["messages_sent"])
+    slowest = max(reports, key=lambda r: sum(r[f"{job}_ms"] for job in JOBS))
+    print(f"\n{len(reports)} days simulated in {elapsed:.1f} s")
+    print(f"Notifications created: {int(totals['notifications_created'])}, "
+          f"messages sent: {int(totals['messages_sent'])} "
+          f"({totals['messages_sent'] / len(reports):.0f}/day avg), "
+          f"errors: {int(totals['errors'])}")
+    print(f"Busiest day: {busiest['day']} ({busiest['messages_sent']} messages)")
+    slowest_ms = sum(slowest[f"{job}_ms"] for job in JOBS)
+    print(f"Slowest day: {slowest['day']} ({slowest_ms:.0f} ms of jobs)")
+    print("Job time total: "
+          + ", ".join(f"{job}={totals[f'{job}_ms'] / 1000:.1f}s" for job in JOBS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Год работы планировщика на виртуальном времени")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(date.today().year, 1, 1),
+                        help="первый день прогона (YYYY-MM-DD)")
+    parser.add_argument("--donation-rate", type=float, default=0.1,
+                        help="доля оставшихся участников сбора, сдающих за день")
+    parser.add_argument("--event-every", type=int, default=30,
+                        help="общий сбор раз в N дней (0 — без них)")
+    parser.add_argument("--executor-mode", choices=["thread", "loop"],
+                        default=SCHEDULER_EXECUTOR_MODE)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--csv", help="сохранить отчёт по дням в CSV")
+    parser.add_argument("--quiet", action="store_true", help="только итоги, без таблицы по дням")
+    args = parser.parse_args()
+
+    # Построчные INFO задач на тысячах виртуальных запусков только тормозят прогон
+    logging.disable(logging.INFO)
+    print(f"{args.users} users, {args.days} days from {args.start}")
+    if not args.quiet:
+        print(HEADER)
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        reports = asyncio.run(simulate(directory, args))
+    elapsed = time.perf_counter() - started
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(reports[0]))
+            writer.writeheader()
+            writer.writerows(reports)
+    print_totals(reports, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,13 +7,18 @@
 
 import asyncio
 import logging
+from typing import Optional
 from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.session.aiohttp import AiohttpSession
-from config import BOT_TOKEN
+from aiogram.fsm.storage.base import BaseStorage
+from config import BOT_TOKEN, BOT_MODE
 from database import init_db
-from utils.middleware import AntiSpamMiddleware, LoggingMiddleware
+from utils.fsm_storage import SQLAlchemyStorage
+from utils.loop_monitor import LoopStallMonitor
+from utils.send_queue import get_send_queue
+from utils.middleware import AntiSpamMiddleware, DbSessionMiddleware, LoggingMiddleware
 from handlers import (
     user,
     admin,
@@ -22,6 +27,9 @@ from handlers import (
     broadcasts
 )
 from scheduler import NotificationScheduler
+from services.lease_service import SCHEDULER_LEASE, LeaderLease
+from services.outbox_service import OutboxWorker
+from webhook import run_webhook
 
 # Настройка логирования
 logging.basicConfig(
@@ -30,6 +38,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def create_bot(session: Optional[AiohttpSession] = None, token: Optional[str] = None) -> Bot:
+    """
+    Создание экземпляра бота.
+
+    Args:
+        session (Optional[AiohttpSession]): HTTP-сессия; для нагрузочных тестов —
+            сессия, направленная на локальный Bot API (см. benchmarks/)
+        token (Optional[str]): Токен бота (по умолчанию BOT_TOKEN)
+    """
+    return Bot(
+        token=token or BOT_TOKEN,
+        session=session or AiohttpSession(),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+
+def create_dispatcher(storage: Optional[BaseStorage] = None) -> Dispatcher:
+    """
+    Создание диспетчера с middleware и роутерами бота.
+
+    Args:
+        storage (Optional[BaseStorage]): FSM-хранилище (по умолчанию SQLAlchemyStorage)
+    """
+    # FSM-состояния переживают перезапуск; запись в БД пакетная (write-back)
+    dp = Dispatcher(storage=storage or SQLAlchemyStorage())
+    
+    # Регистрация middleware
+    # DbSessionMiddleware: одна сессия и один поиск пользователя на апдейт
+    dp.update.outer_middleware(AntiSpamMiddleware())
+    dp.update.outer_middleware(DbSessionMiddleware())
+    dp.update.outer_middleware(LoggingMiddleware())
+    
+    # Регистрация хендлеров
+    dp.include_router(registration.router)
+    dp.include_router(user.router)
+    dp.include_router(fund_management.router)
+    dp.include_router(admin.router)
+    dp.include_router(broadcasts.router)
+    return dp
+
 async def main() -> None:
     """
     Основная асинхронная функция для запуска бота.
@@ -39,7 +86,7 @@ async def main() -> None:
     2. Создает экземпляр бота и диспетчера
     3. Регистрирует middleware и обработчики команд
     4. Запускает планировщик задач
-    5. Запускает поллинг бота
+    5. Запускает поллинг бота или вебхук-сервер (BOT_MODE=webhook)
     
     Raises:
         Exception: При возникновении непредвиденных ошибок в работе бота
@@ -51,34 +98,44 @@ async def main() -> None:
     session = AiohttpSession()
     
     # Инициализация бота и диспетчера
-    bot = Bot(token=BOT_TOKEN, parse_mode=ParseMode.HTML, session=session)
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
-    
-    # Регистрация middleware
-    dp.update.outer_middleware(AntiSpamMiddleware())
-    dp.update.outer_middleware(LoggingMiddleware())
-    
-    # Регистрация хендлеров
-    dp.include_router(registration.router)
-    dp.include_router(user.router)
-    dp.include_router(fund_management.router)
-    dp.include_router(admin.router)
-    dp.include_router(broadcasts.router)
+    bot = create_bot(session)
+    storage = SQLAlchemyStorage()
+    dp = create_dispatcher(storage)
     
-    # Инициализация и запуск планировщика
-    scheduler = NotificationScheduler()
-    scheduler.start()
+    # Планировщик стартует приостановленным: задачи выполняет только
+    # экземпляр, удерживающий аренду лидера
+    scheduler = NotificationScheduler(bot)
+    scheduler.start(paused=True)
+    leader = LeaderLease(SCHEDULER_LEASE, on_acquired=scheduler.resume, on_lost=scheduler.pause)
+    leader.start()
+
+    # Предупреждения в лог, если что-то надолго блокирует event loop
+    loop_monitor = LoopStallMonitor(interval=1.0)
+    loop_monitor.start()
+
+    # Доставка рассылок из outbox, включая прерванные прошлым запуском
+    outbox_worker = OutboxWorker(bot)
+    outbox_worker.start()
     
     try:
-        # Удаление вебхука на всякий случай
-        await bot.delete_webhook(drop_pending_updates=True)
-        
-        # Запуск поллинга
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        if BOT_MODE == 'webhook':
+            # Приём апдейтов встроенным aiohttp-сервером
+            await run_webhook(dp, bot)
+        else:
+            # Удаление вебхука на всякий случай
+            await bot.delete_webhook(drop_pending_updates=True)
+
+            # Запуск поллинга
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
-        # Остановка планировщика при завершении
+        # Освобождение аренды (резервный экземпляр подхватит задачи сразу)
+        # и остановка планировщика при завершении
+        await leader.close()
         scheduler.shutdown()
+        await outbox_worker.close()
+        await loop_monitor.close()
+        await get_send_queue(bot).close()
+        await storage.close()
         await session.close()
 
 if __name__ == '__main__':
@@ -0,0 +1,63 @@
+# clock.py
+"""
+Источник текущего времени для планировщика и сервисов.
+
+Код приложения берёт время через clock.now()/clock.today(), а не напрямую
+из datetime, поэтому прогон можно перевести на виртуальное время
+(SimulatedClock) — например, в benchmarks/simulate_year.py.
+
+Время ожидания в event loop (due_timer, аренда лидера, антиспам)
+остаётся реальным: оно измеряет настоящие интервалы.
+"""
+
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Iterator
+
+
+class SystemClock:
+    """Системное время (локальное, наивное — как DateTime в БД)"""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+
+class SimulatedClock(SystemClock):
+    """Виртуальное время, которое двигается только явно"""
+
+    def __init__(self, start: datetime):
+        self.current = start
+
+    def now(self) -> datetime:
+        return self.current
+
+    def set(self, moment: datetime):
+        self.current = moment
+
+    def advance(self, delta: timedelta):
+        self.current += delta
+
+
+class Clock:
+    """Часы приложения с подменяемым источником времени"""
+
+    def __init__(self):
+        self.source = SystemClock()
+
+    def now(self) -> datetime:
+        return self.source.now()
+
+    def today(self) -> date:
+        return self.source.now().date()
+
+    @contextmanager
+    def use(self, source: SystemClock) -> Iterator[SystemClock]:
+        """Временная подмена источника времени"""
+        previous, self.source = self.source, source
+        try:
+            yield source
+        finally:
+            self.source = previous
+
+
+clock = Clock()
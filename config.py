@@ -9,6 +9,17 @@ load_dotenv()
 # ====== Базовые настройки ======
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 
+# Режим получения апдейтов: polling или webhook (см. webhook.py)
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Публичный https-адрес, обязателен при BOT_MODE=webhook
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+# Апдейтов в обработке одновременно
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv('WEBHOOK_MAX_CONCURRENCY', 50))
+
 # ====== ID суперадмина (заполни реальным ID) ======
 SUPERADMIN_ID = int(os.getenv('SUPERADMIN_ID', 0))
 
@@ -22,10 +33,15 @@ DB_HOST = os.getenv('DB_HOST', 'localhost')
 DB_PORT = int(os.getenv('DB_PORT', 5432))
 
 # Construct database URL
+# ASYNC_DATABASE_URL — тот же источник через асинхронный драйвер (asyncpg / aiosqlite)
 if DB_TYPE == 'postgresql':
     DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    ASYNC_DATABASE_URL = (
+        f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
 else:
     DATABASE_URL = f"sqlite:///{Path('data')}/{DB_NAME}.db"
+    ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{Path('data')}/{DB_NAME}.db"
 
 # ====== Прочее ======
 BIRTHDAY_REMINDER_DAYS_BEFORE = 10   # За сколько дней до ДР напоминать админам
@@ -39,15 +55,85 @@ LOG_DB_PATH = os.getenv('LOG_DB_PATH', 'data/logs.db')
 RATE_LIMIT = int(os.getenv('RATE_LIMIT', 5))
 RATE_LIMIT_DURATION = int(os.getenv('RATE_LIMIT_DURATION', 60))
 
+# FSM Storage
+# Период записи состояний в БД, сек
+FSM_FLUSH_INTERVAL = float(os.getenv('FSM_FLUSH_INTERVAL', 2))
+# Брошенные диалоги удаляются через, сек
+FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', 86400))
+
+# Outgoing Messages (лимиты Telegram Bot API)
+# Сообщений в секунду на бота
+SEND_RATE_LIMIT = float(os.getenv('SEND_RATE_LIMIT', 30))
+# Секунд между сообщениями в один чат
+SEND_PER_CHAT_INTERVAL = float(os.getenv('SEND_PER_CHAT_INTERVAL', 1))
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', 8))
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', 5))
+# Уведомлений в одной пачке рассылки
+NOTIFICATION_BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', 200))
+
+# Broadcast Outbox (персистентная очередь рассылок)
+# Сообщений, забираемых воркером за раз
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 100))
+# Пауза при пустой очереди, сек
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 1))
+# Захват без продления дольше — брошен
+OUTBOX_CLAIM_TIMEOUT = int(os.getenv('OUTBOX_CLAIM_TIMEOUT', 120))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+
+# Identity Cache (telegram_id → пользователь/роли)
+IDENTITY_CACHE_SIZE = int(os.getenv('IDENTITY_CACHE_SIZE', 10000))
+IDENTITY_CACHE_TTL = int(os.getenv('IDENTITY_CACHE_TTL', 300))
+
+# Audience Segments (битовые множества id пользователей для рассылок)
+SEGMENT_CACHE_TTL = int(os.getenv('SEGMENT_CACHE_TTL', 300))
+
 # Notification Settings
+# Час доставки по местному времени отдела
 REMINDER_HOUR = int(os.getenv('REMINDER_HOUR', 10))
+# Час (по времени сервера), когда задачи готовят волну
+REMINDER_PLAN_HOUR = int(os.getenv('REMINDER_PLAN_HOUR', 6))
+# Волна растягивается на REMINDER_HOUR:00 + окно
+REMINDER_WINDOW_MINUTES = int(os.getenv('REMINDER_WINDOW_MINUTES', 30))
+# Шаг слотов доставки внутри окна
+REMINDER_SLOT_SECONDS = int(os.getenv('REMINDER_SLOT_SECONDS', 60))
+# Пусто — часовой пояс сервера
+REMINDER_DEFAULT_TIMEZONE = os.getenv('REMINDER_DEFAULT_TIMEZONE', '')
+# Часовые пояса отделов: "Отдел=Asia/Yekaterinburg;Другой отдел=Europe/Moscow"
+DEPARTMENT_TIMEZONES = dict(
+    item.split('=', 1) for item in os.getenv('DEPARTMENT_TIMEZONES', '').split(';') if '=' in item
+)
 BIRTHDAY_REMINDER_DAYS = int(os.getenv('BIRTHDAY_REMINDER_DAYS', 3))
+# Отметка «скоро» в списке именинников
+BIRTHDAY_LIST_SOON_DAYS = int(os.getenv('BIRTHDAY_LIST_SOON_DAYS', 7))
 FUND_REMINDER_DAYS = int(os.getenv('FUND_REMINDER_DAYS', 2))
 
+# Scheduler (задачи хранятся в БД и переживают перезапуск)
+# До скольких секунд опоздания пропущенная ежедневная задача ещё запускается
+DAILY_JOB_MISFIRE_GRACE_TIME = int(os.getenv('DAILY_JOB_MISFIRE_GRACE_TIME', 12 * 3600))
+# Предел опоздания уведомлений, запланированных другими экземплярами, сек
+SCHEDULED_DISPATCH_MAX_SLEEP = float(os.getenv('SCHEDULED_DISPATCH_MAX_SLEEP', 300))
+# Первый повтор неудачной отправки, сек; дальше интервал удваивается (до часа)
+SCHEDULED_RETRY_INTERVAL = float(os.getenv('SCHEDULED_RETRY_INTERVAL', 300))
+# После стольких неудачных попыток уведомление больше не отправляется
+SCHEDULED_MAX_ATTEMPTS = int(os.getenv('SCHEDULED_MAX_ATTEMPTS', 5))
+# Loop — работа с БД в задачах в event loop; thread — в пуле потоков
+SCHEDULER_EXECUTOR_MODE = os.getenv('SCHEDULER_EXECUTOR_MODE', 'loop')
+SCHEDULER_THREAD_POOL_SIZE = int(os.getenv('SCHEDULER_THREAD_POOL_SIZE', 2))
+# Порог предупреждения о блокировке event loop
+LOOP_STALL_WARNING_MS = float(os.getenv('LOOP_STALL_WARNING_MS', 500))
+# Сколько хранить телеметрию задач (job_runs)
+JOB_RUNS_RETENTION_DAYS = int(os.getenv('JOB_RUNS_RETENTION_DAYS', 90))
+# Срок аренды лидера планировщика, сек
+LEADER_LEASE_TTL = float(os.getenv('LEADER_LEASE_TTL', 15))
+# Продление/попытка захвата аренды, сек
+LEADER_HEARTBEAT_INTERVAL = float(os.getenv('LEADER_HEARTBEAT_INTERVAL', 5))
+
 # Security
 ALLOWED_CHAT_TYPES = os.getenv('ALLOWED_CHAT_TYPES', 'private,group').split(',')
 MAX_MESSAGE_LENGTH = int(os.getenv('MAX_MESSAGE_LENGTH', 4096))
-ALLOWED_FILE_TYPES = os.getenv('ALLOWED_FILE_TYPES', 'image/jpeg,image/png,application/pdf').split(',')
+ALLOWED_FILE_TYPES = os.getenv(
+    'ALLOWED_FILE_TYPES', 'image/jpeg,image/png,application/pdf'
+).split(',')
 
 # Roles Configuration
 ROLES = {
@@ -1,8 +1,14 @@
 # database.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.ext.declarative import declarative_base
-from config import DATABASE_URL
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from config import DATABASE_URL, ASYNC_DATABASE_URL
+from models import Base
 import logging
 from alembic.config import Config
 from alembic import command
@@ -18,8 +24,79 @@ engine = create_engine(DATABASE_URL, echo=True)
 session_factory = sessionmaker(bind=engine)
 SessionLocal = scoped_session(session_factory)
 
-# Базовый класс для моделей
-Base = declarative_base()
+# Движок хранилища задач APScheduler (SQLAlchemyJobStore): отдельный и без echo,
+# чтобы поиск задач к запуску не попадал в лог SQL
+jobstore_engine = create_engine(DATABASE_URL, echo=False)
+
+# Асинхронный движок для кода, работающего внутри event loop (хендлеры, планировщик).
+# Запросы идут через asyncpg/aiosqlite и не блокируют диспетчер aiogram.
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+
+# expire_on_commit=False: после commit атрибуты объектов остаются доступны
+# без повторного запроса (ленивая подгрузка в AsyncSession невозможна)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+class DbStats:
+    """Счётчики обращений к БД в рамках одного апдейта (см. DbSessionMiddleware)"""
+    __slots__ = ("sessions", "queries")
+
+    def __init__(self):
+        self.sessions = 0
+        self.queries = 0
+
+# Счётчики текущего апдейта; None — вне обработки апдейта
+current_db_stats: ContextVar[Optional[DbStats]] = ContextVar("current_db_stats", default=None)
+
+@event.listens_for(Pool, "checkout")
+def _count_session(dbapi_connection, connection_record, connection_proxy):
+    # Каждая сессия берёт из пула не более одного соединения
+    stats = current_db_stats.get()
+    if stats is not None:
+        stats.sessions += 1
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    stats = current_db_stats.get()
+    if stats is not None:
+        stats.queries += 1
+
+# INSERT с поддержкой ON CONFLICT для поддерживаемых СУБД
+_DIALECT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+def insert_or_ignore(db: Session, model, rows: List[Dict], index_elements: Sequence[str]) -> int:
+    """
+    Пакетная вставка строк с пропуском конфликтов по уникальному ключу.
+
+    PostgreSQL и SQLite: INSERT ... ON CONFLICT (index_elements) DO NOTHING.
+
+    Returns:
+        int: Количество реально вставленных строк
+    """
+    if not rows:
+        return 0
+    dialect_insert = _DIALECT_INSERTS[db.get_bind().dialect.name]
+    # Вставка по таблице (Core), а не ORM-модели: только так доступен rowcount
+    statement = dialect_insert(model.__table__).on_conflict_do_nothing(
+        index_elements=index_elements
+    )
+    return db.execute(statement, rows).rowcount
+
+def upsert_statement(bind, model, values: Dict, index_elements: Sequence[str]):
+    """
+    Вставка строки или обновление при конфликте по уникальному ключу.
+
+    PostgreSQL и SQLite: INSERT ... ON CONFLICT (index_elements) DO UPDATE,
+    обновляются только переданные в values столбцы.
+    """
+    dialect_insert = _DIALECT_INSERTS[bind.dialect.name]
+    statement = dialect_insert(model.__table__).values(**values)
+    return statement.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: value for column, value in values.items() if column not in index_elements}
+    )
 
 def get_db():
     """
@@ -32,6 +109,14 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    Асинхронный генератор для получения AsyncSession.
+    Гарантирует закрытие сессии после использования.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
     """
     Инициализация базы данных:
@@ -42,18 +127,18 @@ def init_db():
         # Создание директории для миграций, если её нет
         migrations_dir = Path("migrations")
         migrations_dir.mkdir(exist_ok=True)
-        
+
         # Настройка Alembic
         alembic_cfg = Config()
         alembic_cfg.set_main_option("script_location", str(migrations_dir))
         alembic_cfg.set_main_option("sqlalchemy.url", DATABASE_URL)
-        
+
         # Создание таблиц
         Base.metadata.create_all(bind=engine)
-        
+
         # Применение миграций
         command.upgrade(alembic_cfg, "head")
-        
+
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
@@ -64,3 +149,9 @@ def get_engine():
     Получение текущего движка базы данных
     """
     return engine
+
+def get_async_engine():
+    """
+    Получение асинхронного движка базы данных
+    """
+    return async_engine
@@ -1,11 +1,16 @@
 # handlers/admin.py
-from aiogram import Router, F, types
+from aiogram import Router, types
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from database import SessionLocal
-from models import User, Staff
-from keyboards import get_menu_by_role
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Staff
+from services import AsyncServiceAdapter
+from services.job_stats_service import JobStatsService
+from utils.identity_cache import UserIdentity
+from utils.birthday_index import birthday_index
 from utils import is_admin
 from utils import parse_date
 
@@ -22,86 +27,110 @@ class RemoveStaff(StatesGroup):
 # ---------- Добавить сотрудника ----------
 
 @router.message(Command("add_staff"))
-async def add_staff(message: types.Message, state: FSMContext):
-    session = SessionLocal()
-    try:
-        user = session.query(User).filter_by(telegram_id=message.from_user.id).first()
-        if not user or not is_admin(user.role):
-            await message.answer("⛔ Нет доступа.")
-            return
+async def add_staff(message: types.Message, state: FSMContext, user: Optional[UserIdentity]):
+    if not user or not is_admin(user.role):
+        await message.answer("⛔ Нет доступа.")
+        return
 
-        await message.answer(
-            "Введите данные сотрудника в формате:\n\n"
-            "`Табельный номер;Имя;Отчество;ДД.ММ.ГГГГ`\n\n"
-            "Пример: `12345;Иван;Иванович;15.06.1990`",
-            parse_mode="Markdown"
-        )
-        await state.set_state(AddStaff.waiting_for_staff_data)
-    finally:
-        session.close()
+    await message.answer(
+        "Введите данные сотрудника в формате:\n\n"
+        "`Табельный номер;Имя;Отчество;ДД.ММ.ГГГГ`\n\n"
+        "Пример: `12345;Иван;Иванович;15.06.1990`",
+        parse_mode="Markdown"
+    )
+    await state.set_state(AddStaff.waiting_for_staff_data)
 
 @router.message(AddStaff.waiting_for_staff_data)
-async def process_add_staff(message: types.Message, state: FSMContext):
-    session = SessionLocal()
+async def process_add_staff(message: types.Message, state: FSMContext, session: AsyncSession):
     try:
-        try:
-            personnel_number, first_name, patronymic, birthday_str = map(str.strip, message.text.split(";"))
-            birthday_date = parse_date(birthday_str)
-            if not birthday_date:
-                await message.answer("❌ Неверный формат даты! Используйте ДД.ММ.ГГГГ")
-                return
-        except Exception:
-            await message.answer("❌ Неверный формат! Используйте: `Табельный;Имя;Отчество;ДД.ММ.ГГГГ`",
-                                 parse_mode="Markdown")
-            return
-        if session.query(Staff).filter_by(personnel_number=personnel_number).first():
-            await message.answer("❌ Сотрудник с таким табельным номером уже существует.")
-            await state.clear()
+        personnel_number, first_name, patronymic, birthday_str = map(
+            str.strip, message.text.split(";")
+        )
+        birthday_date = parse_date(birthday_str)
+        if not birthday_date:
+            await message.answer("❌ Неверный формат даты! Используйте ДД.ММ.ГГГГ")
             return
+    except Exception:
+        await message.answer("❌ Неверный формат! Используйте: `Табельный;Имя;Отчество;ДД.ММ.ГГГГ`",
+                             parse_mode="Markdown")
+        return
 
-        new_staff = Staff(
-            personnel_number=personnel_number,
-            first_name=first_name,
-            patronymic=patronymic,
-            birthday=birthday_date
-        )
-        session.add(new_staff)
-        session.commit()
-        await message.answer(f"✅ Сотрудник {first_name} {patronymic} добавлен.")
+    if await session.scalar(select(Staff).filter_by(personnel_number=personnel_number)):
+        await message.answer("❌ Сотрудник с таким табельным номером уже существует.")
         await state.clear()
-    finally:
-        session.close()
+        return
+
+    new_staff = Staff(
+        personnel_number=personnel_number,
+        first_name=first_name,
+        patronymic=patronymic,
+        birthday=birthday_date
+    )
+    session.add(new_staff)
+    await session.commit()
+    birthday_index.add(new_staff.id, new_staff.birthday)
+    await message.answer(f"✅ Сотрудник {first_name} {patronymic} добавлен.")
+    await state.clear()
 
 # ---------- Удалить сотрудника ----------
 
 @router.message(Command("remove_staff"))
-async def remove_staff(message: types.Message, state: FSMContext):
-    session = SessionLocal()
-    try:
-        user = session.query(User).filter_by(telegram_id=message.from_user.id).first()
-        if not user or not is_admin(user.role):
-            await message.answer("⛔ Нет доступа.")
-            return
+async def remove_staff(message: types.Message, state: FSMContext, user: Optional[UserIdentity]):
+    if not user or not is_admin(user.role):
+        await message.answer("⛔ Нет доступа.")
+        return
 
-        await message.answer("Введите табельный номер сотрудника для удаления:")
-        await state.set_state(RemoveStaff.waiting_for_personnel_number)
-    finally:
-        session.close()
+    await message.answer("Введите табельный номер сотрудника для удаления:")
+    await state.set_state(RemoveStaff.waiting_for_personnel_number)
 
 @router.message(RemoveStaff.waiting_for_personnel_number)
-async def process_remove_staff(message: types.Message, state: FSMContext):
-    session = SessionLocal()
-    try:
-        personnel_number = message.text.strip()
-        staff = session.query(Staff).filter_by(personnel_number=personnel_number).first()
-        if not staff:
-            await message.answer("❌ Сотрудник с таким табельным номером не найден.")
-            await state.clear()
-            return
-
-        session.delete(staff)
-        session.commit()
-        await message.answer(f"✅ Сотрудник с табельным номером {personnel_number} удалён.")
+async def process_remove_staff(message: types.Message, state: FSMContext, session: AsyncSession):
+    personnel_number = message.text.strip()
+    staff = await session.scalar(select(Staff).filter_by(personnel_number=personnel_number))
+    if not staff:
+        await message.answer("❌ Сотрудник с таким табельным номером не найден.")
         await state.clear()
-    finally:
-        session.close()
+        return
+
+    await session.delete(staff)
+    await session.commit()
+    birthday_index.remove(staff.id)
+    await message.answer(f"✅ Сотрудник с табельным номером {personnel_number} удалён.")
+    await state.clear()
+
+# ---------- Телеметрия планировщика ----------
+
+@router.message(Command("job_stats"))
+async def job_stats(message: types.Message, session: AsyncSession, user: Optional[UserIdentity]):
+    if not user or user.role != "superadmin":
+        await message.answer("⛔ Нет доступа.")
+        return
+
+    jobs = AsyncServiceAdapter(JobStatsService, session)
+    runs = await jobs.get_last_runs(10)
+    trends = await jobs.get_trends(7)
+    if not runs:
+        await message.answer("Запусков задач пока не было.")
+        return
+
+    lines = ["🕒 Последние запуски:"]
+    for run in runs:
+        lines.append(
+            f"{run.started_at:%d.%m %H:%M} {run.job}: {run.duration_ms:.0f} мс, "
+            f"строк {run.rows_scanned}, создано {run.notifications_created}, "
+            f"отправлено {run.messages_sent}" + (f", ошибок {run.errors}" if run.errors else "")
+        )
+    lines.append("")
+    lines.append("📈 За 7 дней (к предыдущим 7):")
+    for trend in trends:
+        if not trend["runs"]:
+            continue
+        change = ""
+        if trend["previous_avg_ms"]:
+            change = f" ({(trend['avg_ms'] / trend['previous_avg_ms'] - 1) * 100:+.0f}%)"
+        lines.append(
+            f"{trend['job']}: {trend['runs']} запусков, "
+            f"в среднем {trend['avg_ms']:.0f} мс{change}, макс. {trend['max_ms']:.0f} мс, "
+            f"строк {trend['avg_rows']:.0f}, ошибок {trend['errors']}"
+        )
+    await message.answer("\n".join(lines))
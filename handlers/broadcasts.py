@@ -1,14 +1,18 @@
 # handlers/broadcasts.py
 
-from aiogram import Router, F, types
+from aiogram import Router, types
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 
-from database import SessionLocal
-from models import User, Fund, Donation, Staff
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Fund, Broadcast
+from services import AsyncServiceAdapter
+from services.audience_service import AudienceService
+from services.outbox_service import OutboxService
+from utils.segment_cache import segment_cache
+from utils.identity_cache import UserIdentity
 from utils import ensure_registered
-from datetime import datetime
 
 router = Router()
 
@@ -21,71 +25,130 @@ class FundReminder(StatesGroup):
 
 @router.message(Command("remind_fund"))
 @ensure_registered()
-async def remind_fund_entry(message: types.Message, state: FSMContext, user: User):
+async def remind_fund_entry(message: types.Message, state: FSMContext, session: AsyncSession,
+                            user: UserIdentity):
     args = message.text.strip().split()
     if len(args) != 2 or not args[1].isdigit():
-        await message.answer("❌ Укажите команду в формате `/remind_fund <id_сбора>`", parse_mode="Markdown")
+        await message.answer(
+            "❌ Укажите команду в формате `/remind_fund <id_сбора>`", parse_mode="Markdown"
+        )
         return
 
     fund_id = int(args[1])
-    session = SessionLocal()
-    try:
-        fund = session.query(Fund).filter_by(id=fund_id).first()
-        if not fund:
-            await message.answer("❌ Сбор не найден.")
-            return
-
-        if fund.is_closed:
-            await message.answer("⚠️ Сбор уже закрыт.")
-            return
-
-        if fund.treasurer_id != user.id:
-            await message.answer("⛔ Вы не казначей этого сбора.")
-            return
-
-        await state.update_data(fund_id=fund_id)
-        await message.answer("Введите текст напоминания:")
-        await state.set_state(FundReminder.waiting_for_text)
-    finally:
-        session.close()
+    fund = await session.get(Fund, fund_id)
+    if not fund:
+        await message.answer("❌ Сбор не найден.")
+        return
+
+    if not fund.is_active:
+        await message.answer("⚠️ Сбор уже закрыт.")
+        return
+
+    if fund.treasurer_id != user.id:
+        await message.answer("⛔ Вы не казначей этого сбора.")
+        return
+
+    # Предпросмотр аудитории по кэшу сегментов
+    unpaid = await session.run_sync(lambda db: AudienceService(db).unpaid_segment(fund))
+
+    await state.update_data(fund_id=fund_id)
+    await message.answer(
+        f"Напоминание получат {unpaid.bit_count()} участников, ещё не сдавших в сбор.\n"
+        f"Введите текст напоминания:"
+    )
+    await state.set_state(FundReminder.waiting_for_text)
 
 @router.message(FundReminder.waiting_for_text)
-async def process_fund_reminder(message: types.Message, state: FSMContext):
+async def process_fund_reminder(message: types.Message, state: FSMContext, session: AsyncSession,
+                                user: UserIdentity):
     text = message.text.strip()
-    session = SessionLocal()
-    try:
-        data = await state.get_data()
-        fund_id = data.get("fund_id")
-
-        fund = session.query(Fund).filter_by(id=fund_id).first()
-        if not fund:
-            await message.answer("❌ Сбор не найден.")
-            await state.clear()
-            return
-
-        # список всех участников
-        users = session.query(User).all()
-
-        # список сдавших
-        paid_user_ids = {don.user_id for don in session.query(Donation).filter_by(fund_id=fund_id).all()}
-
-        # исключаем именинника, если сбор на ДР
-        exclude_ids = set(paid_user_ids)
-        if fund.type == "birthday" and fund.staff_id:
-            birthday_user = session.query(User).filter_by(staff_id=fund.staff_id).first()
-            if birthday_user:
-                exclude_ids.add(birthday_user.id)
-
-        count = 0
-        for u in users:
-            if u.id not in exclude_ids:
-                try:
-                    await message.bot.send_message(u.telegram_id, f"💸 Напоминание от казначея:\n\n{text}")
-                    count += 1
-                except Exception:
-                    continue
-
-        await message.answer(f"✅ Рассылка выполнена. Отправлено: {count} сообщений.")
+    data = await state.get_data()
+    fund_id = data.get("fund_id")
+
+    fund = await session.get(Fund, fund_id)
+    if not fund:
+        await message.answer("❌ Сбор не найден.")
         await state.clear()
-    finally:
-        session.close()
+        return
+
+    await state.clear()
+
+    # Рассылка фиксируется в outbox и доставляется OutboxWorker'ом,
+    # поэтому переживает перезапуск бота
+    broadcast = Broadcast(
+        sender_id=user.id,
+        title=f"Напоминание по сбору №{fund.id}",
+        message=text,
+        broadcast_type="fund_reminder"
+    )
+    session.add(broadcast)
+    await session.commit()
+
+    # Не сдавшие читаются из БД потоком и сразу пишутся в outbox пачками
+    def enqueue_unpaid(db):
+        audience = AudienceService(db)
+        return OutboxService(db).enqueue_broadcast(
+            broadcast.id,
+            audience.iter_recipients(audience.unpaid_audience(fund)),
+            f"💸 Напоминание от казначея:\n\n{text}"
+        )
+
+    count = await session.run_sync(enqueue_unpaid)
+
+    await message.answer(
+        f"✅ Рассылка поставлена в очередь: {count} получателей.\n"
+        f"Прогресс: /broadcast_status {broadcast.id}"
+    )
+
+# ---------- Прогресс рассылки ----------
+
+@router.message(Command("broadcast_status"))
+@ensure_registered()
+async def broadcast_status(message: types.Message, session: AsyncSession, user: UserIdentity):
+    args = message.text.strip().split()
+    if len(args) != 2 or not args[1].isdigit():
+        await message.answer(
+            "❌ Укажите команду в формате `/broadcast_status <id_рассылки>`", parse_mode="Markdown"
+        )
+        return
+
+    broadcast = await session.get(Broadcast, int(args[1]))
+    if not broadcast:
+        await message.answer("❌ Рассылка не найдена.")
+        return
+
+    if broadcast.sender_id != user.id and user.role not in ("admin", "superadmin"):
+        await message.answer("⛔ Это не ваша рассылка.")
+        return
+
+    outbox_service = AsyncServiceAdapter(OutboxService, session)
+    progress = await outbox_service.get_broadcast_progress(broadcast.id)
+    await message.answer(
+        f"📊 Рассылка №{broadcast.id}\n"
+        f"Отправлено: {progress['sent']} из {progress['total']}\n"
+        f"В очереди: {progress['pending']}\n"
+        f"Заблокировали бота: {progress['blocked']}\n"
+        f"Ошибки: {progress['failed']}\n"
+        f"Скорость: {progress['throughput']:.1f} сообщ./с"
+    )
+
+# ---------- Размеры аудиторий ----------
+
+@router.message(Command("audience"))
+@ensure_registered()
+async def audience_sizes(message: types.Message, session: AsyncSession, user: UserIdentity):
+    if user.role not in ("admin", "superadmin"):
+        await message.answer("⛔ Нет доступа.")
+        return
+
+    sizes = await session.run_sync(segment_cache.sizes)
+    departments = [
+        f"  {name.split(':', 1)[1]}: {size}"
+        for name, size in sizes.items() if name.startswith("department:")
+    ]
+    await message.answer(
+        f"👥 Аудитории рассылок\n"
+        f"Все: {sizes['active']}\n"
+        f"Без именинников: {sizes['active'] - sizes['birthday_today']}\n"
+        f"По отделам:\n" + ("\n".join(departments) or "  —")
+    )
@@ -1,9 +1,12 @@
-from aiogram import Router, F, types
+from aiogram import Router, types
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from database import SessionLocal
-from models import User, Fund, Staff, FundType
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Fund, Staff, FundType
+from utils.identity_cache import UserIdentity
 from utils import is_admin
 from datetime import datetime
 
@@ -22,76 +25,62 @@ class CreateEventFund(StatesGroup):
 # ---------- Создание сбора на ДР ----------
 
 @router.message(Command("create_birthday_fund"))
-async def create_birthday_fund(message: types.Message, state: FSMContext):
-    session = SessionLocal()
-    try:
-        user = session.query(User).filter_by(telegram_id=message.from_user.id).first()
-        if not user or not is_admin(user.role):
-            await message.answer("Нет доступа.")
-            return
+async def create_birthday_fund(message: types.Message, state: FSMContext,
+                               user: Optional[UserIdentity]):
+    if not user or not is_admin(user.role):
+        await message.answer("Нет доступа.")
+        return
 
-        await message.answer("Введите табельный номер именинника для создания сбора:")
-        await state.set_state(CreateBirthdayFund.waiting_for_staff_id)
-    finally:
-        session.close()
+    await message.answer("Введите табельный номер именинника для создания сбора:")
+    await state.set_state(CreateBirthdayFund.waiting_for_staff_id)
 
 @router.message(CreateBirthdayFund.waiting_for_staff_id)
-async def process_birthday_fund_staff(message: types.Message, state: FSMContext):
+async def process_birthday_fund_staff(message: types.Message, state: FSMContext,
+                                      session: AsyncSession):
     staff_id = message.text.strip()
-    session = SessionLocal()
-    try:
-        staff = session.query(Staff).filter_by(personnel_number=staff_id).first()
-        if not staff:
-            await message.answer("❌ Сотрудник не найден.")
-            return
+    staff = await session.scalar(select(Staff).filter_by(personnel_number=staff_id))
+    if not staff:
+        await message.answer("❌ Сотрудник не найден.")
+        return
 
-        await state.update_data(staff_id=staff.id)
-        await message.answer("Введите дату дедлайна сбора в формате ДД.ММ.ГГГГ:")
-        await state.set_state(CreateBirthdayFund.waiting_for_deadline)
-    finally:
-        session.close()
+    await state.update_data(staff_id=staff.id)
+    await message.answer("Введите дату дедлайна сбора в формате ДД.ММ.ГГГГ:")
+    await state.set_state(CreateBirthdayFund.waiting_for_deadline)
 
 @router.message(CreateBirthdayFund.waiting_for_deadline)
-async def process_birthday_fund_deadline(message: types.Message, state: FSMContext):
+async def process_birthday_fund_deadline(message: types.Message, state: FSMContext,
+                                         session: AsyncSession):
     deadline_str = message.text.strip()
-    session = SessionLocal()
     try:
-        try:
-            day, month, year = map(int, deadline_str.split("."))
-            deadline = datetime(year, month, day).date()
-        except Exception:
-            await message.answer("❌ Неверный формат даты.")
-            return
-
-        data = await state.get_data()
-        new_fund = Fund(
-            type=FundType.birthday,
-            deadline=deadline,
-            staff_id=data["staff_id"]
-        )
-        session.add(new_fund)
-        session.commit()
-
-        await message.answer("✅ Сбор на ДР успешно создан.")
-        await state.clear()
-    finally:
-        session.close()
+        day, month, year = map(int, deadline_str.split("."))
+        deadline = datetime(year, month, day).date()
+    except Exception:
+        await message.answer("❌ Неверный формат даты.")
+        return
+
+    data = await state.get_data()
+    new_fund = Fund(
+        type=FundType.birthday,
+        deadline=deadline,
+        staff_id=data["staff_id"]
+    )
+    session.add(new_fund)
+    await session.commit()
+
+    await message.answer("✅ Сбор на ДР успешно создан.")
+    await state.clear()
 
 # ---------- Создание сбора на Событие ----------
 
 @router.message(Command("create_event_fund"))
-async def create_event_fund(message: types.Message, state: FSMContext):
-    session = SessionLocal()
-    try:
-        user = session.query(User).filter_by(telegram_id=message.from_user.id).first()
-        if not user or not is_admin(user.role):
-            await message.answer("Нет доступа.")
-            return
+async def create_event_fund(message: types.Message, state: FSMContext,
+                            user: Optional[UserIdentity]):
+    if not user or not is_admin(user.role):
+        await message.answer("Нет доступа.")
+        return
 
-        await message.answer("Введите название события:")
-        await state.set_state(CreateEventFund.waiting_for_event_name)
-    finally:
-        session.close()
+    await message.answer("Введите название события:")
+    await state.set_state(CreateEventFund.waiting_for_event_name)
 
 @router.message(CreateEventFund.waiting_for_event_name)
 async def process_event_name(message: types.Message, state: FSMContext):
@@ -100,27 +89,23 @@ async def process_event_name(message: types.Message, state: FSMContext):
     await state.set_state(CreateEventFund.waiting_for_deadline)
 
 @router.message(CreateEventFund.waiting_for_deadline)
-async def process_event_deadline(message: types.Message, state: FSMContext):
+async def process_event_deadline(message: types.Message, state: FSMContext, session: AsyncSession):
     deadline_str = message.text.strip()
-    session = SessionLocal()
     try:
-        try:
-            day, month, year = map(int, deadline_str.split("."))
-            deadline = datetime(year, month, day).date()
-        except Exception:
-            await message.answer("❌ Неверный формат даты.")
-            return
-
-        data = await state.get_data()
-        new_fund = Fund(
-            type=FundType.event,
-            deadline=deadline,
-            event_name=data["event_name"]
-        )
-        session.add(new_fund)
-        session.commit()
-
-        await message.answer("✅ Сбор на событие успешно создан.")
-        await state.clear()
-    finally:
-        session.close()
+        day, month, year = map(int, deadline_str.split("."))
+        deadline = datetime(year, month, day).date()
+    except Exception:
+        await message.answer("❌ Неверный формат даты.")
+        return
+
+    data = await state.get_data()
+    new_fund = Fund(
+        type=FundType.event,
+        deadline=deadline,
+        event_name=data["event_name"]
+    )
+    session.add(new_fund)
+    await session.commit()
+
+    await message.answer("✅ Сбор на событие успешно создан.")
+    await state.clear()
@@ -1,11 +1,16 @@
-from aiogram import Router, F, types
+from datetime import datetime
+from aiogram import Router, types
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
 
 from sqlalchemy.exc import SQLAlchemyError
-from database import SessionLocal
-from models import Staff, User, Log
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Staff, User, Role
+from utils.identity_cache import UserIdentity
+from utils.segment_cache import segment_cache
 from keyboards import get_menu_by_role
 from utils import set_commands_by_role
 
@@ -15,33 +20,37 @@ class Registration(StatesGroup):
     waiting_for_personnel_number = State()
 
 @router.message(Command("start"))
-async def cmd_start(message: types.Message, state: FSMContext):
-    session = SessionLocal()
-    try:
-        user = session.query(User).filter_by(telegram_id=message.from_user.id).first()
-        if user:
-            # динамическое popup меню
-            await set_commands_by_role(message.bot, message.from_user.id, user.role)
-            await message.answer("Вы уже зарегистрированы.", reply_markup=get_menu_by_role(user.role))
-            return
+async def cmd_start(message: types.Message, state: FSMContext, user: Optional[UserIdentity]):
+    if user:
+        # динамическое popup меню
+        await set_commands_by_role(message.bot, message.from_user.id, user.role)
+        await message.answer("Вы уже зарегистрированы.", reply_markup=get_menu_by_role(user.role))
+        return
 
-        await message.answer("Введите табельный номер для регистрации:")
-        await state.set_state(Registration.waiting_for_personnel_number)
-    finally:
-        session.close()
+    await message.answer("Введите табельный номер для регистрации:")
+    await state.set_state(Registration.waiting_for_personnel_number)
 
 @router.message(Registration.waiting_for_personnel_number)
-async def process_personnel_number(message: types.Message, state: FSMContext):
+async def process_personnel_number(message: types.Message, state: FSMContext,
+                                   session: AsyncSession):
     personnel_number = message.text.strip()
-    session = SessionLocal()
     try:
-        staff = session.query(Staff).filter_by(personnel_number=personnel_number).first()
+        staff = await session.scalar(select(Staff).filter_by(personnel_number=personnel_number))
         if not staff:
             await message.answer("Сотрудник с таким табельным номером не найден.")
             return
-        user = User(telegram_id=message.from_user.id, staff_id=staff.id, role="user")
+        user = User(
+            telegram_id=message.from_user.id,
+            staff_id=staff.id,
+            employee_id=str(staff.personnel_number),
+            full_name=f"{staff.first_name} {staff.patronymic}",
+            birthday=datetime.combine(staff.birthday, datetime.min.time())
+        )
+        user_role = await session.scalar(select(Role).filter_by(name="user"))
+        user.roles = [user_role] if user_role else []
         session.add(user)
-        session.commit()
+        await session.commit()
+        segment_cache.invalidate_users()
 
         # popup после регистрации
         await set_commands_by_role(message.bot, message.from_user.id, user.role)
@@ -49,5 +58,3 @@ async def process_personnel_number(message: types.Message, state: FSMContext):
         await state.clear()
     except SQLAlchemyError:
         await message.answer("Ошибка при регистрации.")
-    finally:
-        session.close()
@@ -1,43 +1,77 @@
+from typing import Optional
 from aiogram import Router, F, types
 from aiogram.filters import Command
-from database import SessionLocal
-from models import User
-from utils import get_birthday_staff_ids
-from keyboards import user_menu, get_menu_by_role
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Staff
+from utils.identity_cache import UserIdentity
+from services import AsyncServiceAdapter
+from services.fund_service import FundService
+from utils.birthday_index import birthday_index
+from config import BIRTHDAY_LIST_SOON_DAYS
+from keyboards import get_menu_by_role
+from clock import clock
 
 router = Router()
 
 @router.message(Command("menu"))
 @router.message(F.text == "📄 Мои данные")  # кнопка
-async def show_menu(message: types.Message):
-    session = SessionLocal()
-    try:
-        user = session.query(User).filter_by(telegram_id=message.from_user.id).first()
-        if user:
-            await message.answer("Меню:", reply_markup=get_menu_by_role(user.role))
-        else:
-            await message.answer("Вы не зарегистрированы.")
-    finally:
-        session.close()
+async def show_menu(message: types.Message, user: Optional[UserIdentity]):
+    if user:
+        await message.answer("Меню:", reply_markup=get_menu_by_role(user.role))
+    else:
+        await message.answer("Вы не зарегистрированы.")
 
 @router.message(Command("mydata"))
 @router.message(F.text == "📄 Мои данные")
-async def show_my_data(message: types.Message):
-    session = SessionLocal()
-    try:
-        user = session.query(User).filter_by(telegram_id=message.from_user.id).first()
-        if not user:
-            await message.answer("Вы не зарегистрированы.")
-            return
-
-        staff = user.staff
-        await message.answer(
-            f"👤 Ваши данные:\n"
-            f"Имя: {staff.first_name}\n"
-            f"Отчество: {staff.patronymic}\n"
-            f"Табельный номер: {staff.personnel_number}\n"
-            f"Дата рождения: {staff.birthday.strftime('%d.%m.%Y')}\n"
-            f"Роль: {user.role}"
-        )
-    finally:
-        session.close()
+async def show_my_data(message: types.Message, session: AsyncSession, user: Optional[UserIdentity]):
+    if not user:
+        await message.answer("Вы не зарегистрированы.")
+        return
+
+    staff = await session.get(Staff, user.staff_id)
+    await message.answer(
+        f"👤 Ваши данные:\n"
+        f"Имя: {staff.first_name}\n"
+        f"Отчество: {staff.patronymic}\n"
+        f"Табельный номер: {staff.personnel_number}\n"
+        f"Дата рождения: {staff.birthday.strftime('%d.%m.%Y')}\n"
+        f"Роль: {user.role}"
+    )
+
+@router.message(Command("active_funds"))
+@router.message(F.text == "💰 Активные сборы")
+async def show_active_funds(message: types.Message, session: AsyncSession):
+    funds = await AsyncServiceAdapter(FundService, session).get_active_funds()
+    if not funds:
+        await message.answer("Активных сборов нет.")
+        return
+
+    lines = [
+        f"№{fund.id} {fund.title}: {fund.current_amount:.0f} из {fund.target_amount:.0f} "
+        f"(до {fund.end_date.strftime('%d.%m.%Y')})"
+        for fund in funds
+    ]
+    await message.answer("💰 Активные сборы:\n\n" + "\n".join(lines))
+
+@router.message(Command("birthdays"))
+@router.message(F.text.in_({"🎉 Именинники", "🎂 Именинники"}))
+async def show_birthdays(message: types.Message, session: AsyncSession):
+    await birthday_index.ensure_loaded(session)
+    today = clock.today()
+    staff_ids = birthday_index.in_month(today.month)
+    if not staff_ids:
+        await message.answer("В этом месяце именинников нет.")
+        return
+
+    staff_by_id = {
+        staff.id: staff
+        for staff in await session.scalars(select(Staff).filter(Staff.id.in_(staff_ids)))
+    }
+    soon = set(birthday_index.within(BIRTHDAY_LIST_SOON_DAYS, today))
+    lines = [
+        f"{'🔜 ' if staff.id in soon else ''}{staff.birthday.strftime('%d.%m')} — "
+        f"{staff.first_name} {staff.patronymic}"
+        for staff in (staff_by_id.get(staff_id) for staff_id in staff_ids) if staff
+    ]
+    await message.answer("🎉 Именинники месяца:\n\n" + "\n".join(lines))
@@ -0,0 +1,120 @@
+"""birthday_md, delivery and reachability columns on existing tables
+
+Revision ID: 5f2c9a1d7e34
+Revises:
+Create Date: 2026-10-17 12:00:00
+
+Base.metadata.create_all (database.init_db) создаёт только недостающие
+таблицы и не добавляет столбцы в уже существующие. Ревизия доводит такие
+таблицы до текущих моделей: добавляет недостающие столбцы и индексы и
+заполняет birthday_md у существующих строк. На новой базе, созданной
+create_all, всё уже есть, и ревизия ничего не меняет.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2c9a1d7e34'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _inspector():
+    # Новый инспектор на каждый вызов: batch-режим SQLite пересоздаёт таблицы
+    return sa.inspect(op.get_bind())
+
+
+def _columns(table):
+    return {column['name'] for column in _inspector().get_columns(table)}
+
+
+def _indexes(table):
+    return {index['name'] for index in _inspector().get_indexes(table)}
+
+
+def _add_columns(table, columns):
+    """Добавление недостающих столбцов; возвращает имена добавленных"""
+    existing = _columns(table)
+    missing = [column for column in columns if column.name not in existing]
+    if missing:
+        # batch: SQLite не умеет ALTER TABLE ADD COLUMN с внешним ключом
+        with op.batch_alter_table(table) as batch:
+            for column in missing:
+                batch.add_column(column)
+    return {column.name for column in missing}
+
+
+def _create_index(name, table, columns, unique=False):
+    if name not in _indexes(table):
+        op.create_index(name, table, columns, unique=unique)
+
+
+def _backfill_birthday_md(table_name):
+    table = sa.table(table_name, sa.column('birthday'), sa.column('birthday_md', sa.Integer))
+    op.execute(
+        table.update()
+        .where(sa.and_(table.c.birthday.isnot(None), table.c.birthday_md.is_(None)))
+        .values(birthday_md=sa.extract('month', table.c.birthday) * 100
+                + sa.extract('day', table.c.birthday))
+    )
+
+
+def upgrade() -> None:
+    tables = set(_inspector().get_table_names())
+
+    # MMDD для поиска окна дней рождения по индексу (models.birthday_ordinal)
+    for table in ('users', 'staff'):
+        if table in tables:
+            _add_columns(table, [sa.Column('birthday_md', sa.Integer, nullable=True)])
+            _backfill_birthday_md(table)
+            _create_index(f'ix_{table}_birthday_md', table, ['birthday_md'])
+
+    if 'users' in tables:
+        _add_columns('users', [
+            sa.Column('staff_id', sa.Integer, sa.ForeignKey('staff.id', name='fk_users_staff_id'),
+                      nullable=True),
+            sa.Column('unreachable_since', sa.DateTime, nullable=True),
+        ])
+
+    if 'notifications' in tables:
+        added = _add_columns('notifications', [
+            sa.Column('delivered_at', sa.DateTime, nullable=True),
+            sa.Column('dedup_key', sa.String, nullable=True),
+        ])
+        if 'dedup_key' in added:
+            # Уникальный индекс вместо ограничения: ALTER TABLE в SQLite ограничений не добавляет
+            op.create_index('uq_notifications_dedup_key', 'notifications', ['dedup_key'],
+                            unique=True)
+        _create_index('ix_notifications_due', 'notifications', ['delivered_at', 'scheduled_for'])
+
+    if 'donations' in tables:
+        _create_index('ix_donations_fund_donor', 'donations', ['fund_id', 'donor_id'])
+
+
+def downgrade() -> None:
+    tables = set(_inspector().get_table_names())
+
+    if 'donations' in tables and 'ix_donations_fund_donor' in _indexes('donations'):
+        op.drop_index('ix_donations_fund_donor', table_name='donations')
+
+    drops = {
+        'notifications': (['uq_notifications_dedup_key', 'ix_notifications_due'],
+                          ['delivered_at', 'dedup_key']),
+        'users': (['ix_users_birthday_md'], ['birthday_md', 'staff_id', 'unreachable_since']),
+        'staff': (['ix_staff_birthday_md'], ['birthday_md']),
+    }
+    for table, (indexes, columns) in drops.items():
+        if table not in tables:
+            continue
+        existing_indexes = _indexes(table)
+        existing_columns = _columns(table)
+        with op.batch_alter_table(table) as batch:
+            for index in indexes:
+                if index in existing_indexes:
+                    batch.drop_index(index)
+            for column in columns:
+                if column in existing_columns:
+                    batch.drop_column(column)
@@ -0,0 +1,48 @@
+"""notification delivery attempts and final failure
+
+Revision ID: 8b41e6c03a9f
+Revises: 5f2c9a1d7e34
+Create Date: 2026-10-17 12:30:00
+
+Счётчик неудачных попыток отправки и отметка окончательного отказа
+(NotificationScheduler.send_scheduled_broadcasts). Как и предыдущая
+ревизия, добавляет только недостающие столбцы.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41e6c03a9f'
+down_revision = '5f2c9a1d7e34'
+branch_labels = None
+depends_on = None
+
+
+def _columns():
+    inspector = sa.inspect(op.get_bind())
+    if 'notifications' not in inspector.get_table_names():
+        return None
+    return {column['name'] for column in inspector.get_columns('notifications')}
+
+
+def upgrade() -> None:
+    columns = _columns()
+    if columns is None:
+        return
+    if 'attempts' not in columns:
+        op.add_column('notifications', sa.Column('attempts', sa.Integer, nullable=False,
+                                                 server_default='0'))
+    if 'failed_at' not in columns:
+        op.add_column('notifications', sa.Column('failed_at', sa.DateTime, nullable=True))
+
+
+def downgrade() -> None:
+    columns = _columns()
+    if columns is None:
+        return
+    with op.batch_alter_table('notifications') as batch:
+        for column in ('attempts', 'failed_at'):
+            if column in columns:
+                batch.drop_column(column)
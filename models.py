@@ -1,9 +1,14 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Date, DateTime, Float, Boolean, ForeignKey, Text, Enum, JSON, Table
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import (
+    Column, Integer, String, Date, DateTime, Float, Boolean, ForeignKey, Text, Enum, JSON, Table,
+    Index, UniqueConstraint
+)
+from sqlalchemy.orm import relationship, declarative_base, validates
 from sqlalchemy.sql import func
 import enum
 from datetime import datetime
+from typing import Optional
+from config import ROLES
 
 Base = declarative_base()
 
@@ -17,6 +22,26 @@ class UserRole(enum.Enum):
     ADMIN = 3
     SUPERADMIN = 4
 
+def highest_role(role_names) -> str:
+    """Старшая роль из набора имён (по весу из ROLES)"""
+    names = [name for name in role_names if name in ROLES]
+    return max(names, key=ROLES.get, default='user')
+
+def birthday_ordinal(value) -> Optional[int]:
+    """День рождения как число MMDD (месяц * 100 + день) для индексного поиска по окну дат"""
+    return value.month * 100 + value.day if value else None
+
+def notification_dedup_key(kind: str, subject_id: int, user_id: int, day) -> str:
+    """
+    Ключ идемпотентности уведомления: одно уведомление вида kind о subject_id
+    получателю в день day
+    """
+    return f"{kind}:{subject_id}:{user_id}:{day:%Y-%m-%d}"
+
+def _birthday_ordinal_default(context):
+    # Для вставок через Core (insert(Staff), [...]) без ORM-валидатора
+    return birthday_ordinal(context.get_current_parameters().get('birthday'))
+
 # Таблица для связи many-to-many между пользователями и ролями
 user_roles = Table(
     'user_roles',
@@ -31,9 +56,16 @@ class Staff(Base):
     first_name = Column(String, nullable=False)
     patronymic = Column(String, nullable=False)
     birthday = Column(Date, nullable=False)
+    # MMDD, см. birthday_ordinal
+    birthday_md = Column(Integer, index=True, default=_birthday_ordinal_default)
     personnel_number = Column(Integer, unique=True, nullable=False)
     user = relationship("User", back_populates="staff", uselist=False)
 
+    @validates('birthday')
+    def _sync_birthday_md(self, key, value):
+        self.birthday_md = birthday_ordinal(value)
+        return value
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
@@ -43,13 +75,32 @@ class User(Base):
     full_name = Column(String)
     department = Column(String)
     birthday = Column(DateTime)
+    # MMDD, см. birthday_ordinal
+    birthday_md = Column(Integer, index=True, default=_birthday_ordinal_default)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=func.now())
+    staff_id = Column(Integer, ForeignKey('staff.id'), nullable=True)
+    # Пользователь заблокировал бота; NULL — доступен
+    unreachable_since = Column(DateTime, nullable=True)
     
     # Отношения
-    roles = relationship('Role', secondary=user_roles, back_populates='users')
-    managed_funds = relationship('Fund', back_populates='treasurer')
+    # Роли подгружаются вместе с пользователем: ленивая загрузка недоступна в AsyncSession
+    roles = relationship('Role', secondary=user_roles, back_populates='users', lazy='selectin')
+    managed_funds = relationship('Fund', back_populates='treasurer',
+                                 foreign_keys='Fund.treasurer_id')
     donations = relationship('Donation', back_populates='donor')
+    staff = relationship('Staff', back_populates='user')
+    logs = relationship('Log', back_populates='user')
+
+    @validates('birthday')
+    def _sync_birthday_md(self, key, value):
+        self.birthday_md = birthday_ordinal(value)
+        return value
+
+    @property
+    def role(self) -> str:
+        """Старшая роль пользователя (по весу из ROLES)"""
+        return highest_role(role.name for role in self.roles)
 
 class Role(Base):
     __tablename__ = 'roles'
@@ -103,7 +154,7 @@ class Fund(Base):
     treasurer_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     
     # Отношения
-    treasurer = relationship('User', back_populates='managed_funds')
+    treasurer = relationship('User', back_populates='managed_funds', foreign_keys=[treasurer_id])
     donations = relationship('Donation', back_populates='fund')
     birthday_person = relationship('User', foreign_keys=[birthday_person_id])
 
@@ -120,6 +171,11 @@ class Donation(Base):
     fund = relationship('Fund', back_populates='donations')
     donor = relationship('User', back_populates='donations')
 
+    __table_args__ = (
+        # Проверка «уже сдал»: NOT EXISTS по (fund_id, donor_id) в напоминаниях неплательщикам
+        Index('ix_donations_fund_donor', 'fund_id', 'donor_id'),
+    )
+
 class Notification(Base):
     __tablename__ = "notifications"
     
@@ -131,10 +187,22 @@ class Notification(Base):
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=func.now())
     scheduled_for = Column(DateTime)
+    # Время отправки получателю; NULL — ещё не отправлено
+    delivered_at = Column(DateTime, nullable=True)
+    # Неудачные попытки отправки; после SCHEDULED_MAX_ATTEMPTS — failed_at
+    attempts = Column(Integer, nullable=False, default=0)
+    failed_at = Column(DateTime, nullable=True)
+    # См. notification_dedup_key; NULL — без дедупликации
+    dedup_key = Column(String, unique=True, nullable=True)
     
     # Отношения
     user = relationship('User')
 
+    __table_args__ = (
+        # Выборка «к отправке»: delivered_at IS NULL AND scheduled_for <= now
+        Index('ix_notifications_due', 'delivered_at', 'scheduled_for'),
+    )
+
 class Broadcast(Base):
     __tablename__ = "broadcasts"
     
@@ -148,4 +216,67 @@ class Broadcast(Base):
     scheduled_for = Column(DateTime, nullable=True)
     
     # Отношения
-    sender = relationship('User')
\ No newline at end of file
+    sender = relationship('User')
+
+class OutboxMessage(Base):
+    """Исходящее сообщение рассылки: одна строка на получателя"""
+    __tablename__ = "outbox_messages"
+
+    id = Column(Integer, primary_key=True)
+    broadcast_id = Column(Integer, ForeignKey('broadcasts.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    chat_id = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default='pending')  # pending, sent, failed, blocked
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=func.now())
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+    claimed_by = Column(String, nullable=True)     # воркер, отправляющий сообщение (см. claim_due)
+    claimed_at = Column(DateTime, nullable=True)   # последнее продление захвата
+
+    # Отношения
+    broadcast = relationship('Broadcast')
+    user = relationship('User')
+
+    __table_args__ = (
+        # Повторная постановка рассылки не дублирует получателей
+        UniqueConstraint('broadcast_id', 'user_id', name='uq_outbox_broadcast_user'),
+        Index('ix_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+class FsmRecord(Base):
+    __tablename__ = "fsm_states"
+
+    key = Column(String, primary_key=True)  # ключ DefaultKeyBuilder
+    state = Column(String, nullable=True)
+    data = Column(JSON, default=dict)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class Lease(Base):
+    """Аренда роли (например, лидера планировщика) одним процессом до expires_at"""
+    __tablename__ = "leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)  # хост:pid:случайный суффикс процесса
+    expires_at = Column(DateTime, nullable=False)
+    acquired_at = Column(DateTime, default=func.now())
+
+class JobRun(Base):
+    """Запуск задачи планировщика: длительность и объём работы"""
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True)
+    job = Column(String, nullable=False)  # id задачи в планировщике
+    started_at = Column(DateTime, nullable=False)
+    duration_ms = Column(Float, nullable=False)
+    rows_scanned = Column(Integer, nullable=False, default=0)
+    notifications_created = Column(Integer, nullable=False, default=0)
+    messages_sent = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index('ix_job_runs_job_started', 'job', 'started_at'),
+    )
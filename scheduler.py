@@ -8,19 +8,40 @@
 - Управление запланированными рассылками
 """
 
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 from aiogram import Bot
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from services.birthday_service import get_upcoming_birthdays
-from services.fund_service import get_funds_near_deadline
-from services.user_service import get_admins
-from database import SessionLocal
-from models import User, Fund, Notification, Donation
+from services.birthday_service import birthday_window, days_until_birthday
+from services.fund_service import FundService
+from services.job_stats_service import JobStatsService, job_run, track_job
+from services.user_service import UserService
+from database import (
+    AsyncSessionLocal, insert_or_ignore, jobstore_engine as default_jobstore_engine,
+    session_factory as sync_session_factory
+)
+from utils.birthday_index import birthday_index
+from utils.delivery_planner import delivery_planner
+from utils.due_timer import due_timer
+from utils.send_queue import DELIVERY_BLOCKED, DELIVERY_FAILED, DELIVERY_SENT, get_send_queue
+from models import User, Fund, Notification, Donation, Role, Staff, notification_dedup_key
 from datetime import datetime, timedelta
 from apscheduler.triggers.cron import CronTrigger
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from config import REMINDER_HOUR, BIRTHDAY_REMINDER_DAYS, FUND_REMINDER_DAYS
+from sqlalchemy import and_, or_, select, true, update
+from config import (
+    DAILY_JOB_MISFIRE_GRACE_TIME, JOB_RUNS_RETENTION_DAYS, NOTIFICATION_BATCH_SIZE,
+    REMINDER_PLAN_HOUR, SCHEDULER_EXECUTOR_MODE, SCHEDULER_THREAD_POOL_SIZE,
+    SCHEDULED_DISPATCH_MAX_SLEEP, SCHEDULED_MAX_ATTEMPTS, SCHEDULED_RETRY_INTERVAL,
+    BIRTHDAY_REMINDER_DAYS, BIRTHDAY_REMINDER_DAYS_BEFORE, FUND_REMINDER_DAYS,
+    FUND_REMINDER_DAYS_BEFORE
+)
 import logging
+from clock import clock
 
 logger = logging.getLogger(__name__)
 
@@ -30,55 +51,152 @@ class NotificationScheduler:
     
     Attributes:
         scheduler (AsyncIOScheduler): Экземпляр планировщика задач
+        bot (Optional[Bot]): Бот для доставки уведомлений
+        session_factory: Фабрика асинхронных сессий БД
     """
     
-    def __init__(self):
-        """Инициализация планировщика и настройка задач."""
-        self.scheduler = AsyncIOScheduler()
-        self.setup_jobs()
+    def __init__(
+        self,
+        bot: Optional[Bot] = None,
+        session_factory=AsyncSessionLocal,
+        jobstore_engine=default_jobstore_engine,
+        sync_session_factory=sync_session_factory,
+        executor_mode: str = SCHEDULER_EXECUTOR_MODE
+    ):
+        """
+        Инициализация планировщика и настройка задач.
+
+        Args:
+            executor_mode (str): "loop" (по умолчанию) — синхронная работа с БД
+                в задачах идёт через AsyncSession.run_sync в самом event loop;
+                "thread" — в пуле потоков на своих сессиях. Замер
+                benchmarks/bench_scheduler_stall.py выигрыша по задержке
+                event loop у "thread" не показал (GIL), поэтому он не по умолчанию
+        """
+        self.bot = bot
+        self.session_factory = session_factory
+        self.sync_session_factory = sync_session_factory
+        self.executor_mode = executor_mode
+        self.executor = ThreadPoolExecutor(
+            max_workers=SCHEDULER_THREAD_POOL_SIZE, thread_name_prefix="scheduler-db"
+        )
+        # SQLAlchemyJobStore синхронный намеренно: асинхронного хранилища в APScheduler 3
+        # нет, а обращается он к БД редко (добавление задач и выбор следующей к запуску)
+        # и лёгкими запросами по первичному ключу и next_run_time
+        self.scheduler = AsyncIOScheduler(
+            jobstores={'default': SQLAlchemyJobStore(engine=jobstore_engine)}
+        )
+        self.jobs = self.setup_jobs()
+        self._dispatch_task: Optional[asyncio.Task] = None
 
-    def setup_jobs(self):
+    def setup_jobs(self) -> List[Dict]:
         """
-        Настройка всех запланированных задач.
+        Описание всех запланированных задач.
         
         Добавляет следующие периодические задачи:
         - Проверка предстоящих дней рождения (ежедневно)
         - Проверка дедлайнов сборов (ежедневно)
         - Напоминания неплательщикам (ежедневно)
-        - Отправка запланированных рассылок (каждые 5 минут)
+        - Перестройка индекса дней рождения (в полночь)
+        - Очистка телеметрии задач старше JOB_RUNS_RETENTION_DAYS (ежедневно)
+
+        Каждый запуск задачи записывается в job_runs (см. track_job); у диспетчера
+        запланированных уведомлений — только запуски, которые что-то отправляли.
+
+        Ежедневные задачи запускаются в REMINDER_PLAN_HOUR и только готовят
+        уведомления: каждому получателю delivery_planner назначает слот
+        в окне REMINDER_HOUR + REMINDER_WINDOW_MINUTES по часовому поясу
+        его отдела, а отправляет их диспетчер по мере наступления слотов.
+
+        Запланированные уведомления отправляет не периодическая задача,
+        а диспетчер dispatch_scheduled по таймеру due_timer.
+
+        Задачи хранятся в БД (SQLAlchemyJobStore) и ссылаются на функцию
+        модуля run_job по имени метода. Пропущенный за время простоя запуск
+        выполняется один раз (coalesce), если опоздание не больше misfire_grace_time.
         """
-        # Ежедневные напоминания о днях рождения
-        self.scheduler.add_job(
-            self.check_upcoming_birthdays,
-            CronTrigger(hour=REMINDER_HOUR),
-            id='birthday_check',
-            replace_existing=True
-        )
+        daily = {'coalesce': True, 'misfire_grace_time': DAILY_JOB_MISFIRE_GRACE_TIME}
+        return [
+            # Ежедневные напоминания о днях рождения
+            {'id': 'birthday_check', 'method': 'check_upcoming_birthdays',
+             'trigger': CronTrigger(hour=REMINDER_PLAN_HOUR), **daily},
+            # Напоминания о сборах
+            {'id': 'fund_check', 'method': 'check_fund_deadlines',
+             'trigger': CronTrigger(hour=REMINDER_PLAN_HOUR), **daily},
+            # Напоминания неплательщикам
+            {'id': 'unpaid_reminder', 'method': 'remind_unpaid_participants',
+             'trigger': CronTrigger(hour=REMINDER_PLAN_HOUR), **daily},
+            # Сверка индекса дней рождения с БД
+            {'id': 'birthday_index_rebuild', 'method': 'rebuild_birthday_index',
+             'trigger': CronTrigger(hour=0, minute=0), **daily},
+            # Очистка старой телеметрии задач
+            {'id': 'job_runs_cleanup', 'method': 'cleanup_job_runs',
+             'trigger': CronTrigger(hour=0, minute=30), **daily},
+        ]
+
+    def _sync_jobs(self):
+        """
+        Сверка задач из БД с описанием в setup_jobs.
 
-        # Напоминания о сборах
-        self.scheduler.add_job(
-            self.check_fund_deadlines,
-            CronTrigger(hour=REMINDER_HOUR),
-            id='fund_check',
-            replace_existing=True
-        )
+        У сохранённой задачи не пересчитывается next_run_time (иначе пропущенный
+        запуск потерялся бы): меняются только параметры, а при смене расписания
+        задача переносится на новое время. Просроченные задачи планировщик
+        запускает сам сразу после старта — по одному разу.
+        """
+        now = datetime.now(self.scheduler.timezone)
+        known = {spec['id'] for spec in self.jobs}
+        for job in self.scheduler.get_jobs():
+            if job.id not in known:
+                # Задача убрана из setup_jobs, но осталась в БД с прошлых версий
+                job.remove()
+        for spec in self.jobs:
+            options = {key: value for key, value in spec.items()
+                       if key not in ('id', 'method', 'trigger')}
+            job = self.scheduler.get_job(spec['id'])
+            if job is None:
+                self.scheduler.add_job(run_job, spec['trigger'], args=[spec['method']],
+                                       id=spec['id'], **options)
+                continue
+            job.modify(func=run_job, args=[spec['method']], **options)
+            if str(job.trigger) != str(spec['trigger']):
+                job.reschedule(spec['trigger'])
+            elif job.next_run_time and job.next_run_time <= now:
+                logger.info(f"Catching up missed job {spec['id']} (was due {job.next_run_time})")
 
-        # Напоминания неплательщикам
-        self.scheduler.add_job(
-            self.remind_unpaid_participants,
-            CronTrigger(hour=REMINDER_HOUR),
-            id='unpaid_reminder',
-            replace_existing=True
-        )
+    async def _run_db_job(self, job: Callable[[Session], None]):
+        """
+        Выполнение синхронной части задачи с отдельной сессией.
+
+        В режиме "thread" ORM-работа (запросы, построение строк, пакетные
+        INSERT) идёт в пуле потоков и не задерживает обработку апдейтов;
+        отправка сообщений остаётся в event loop.
+        """
+        if self.executor_mode != "thread":
+            async with self.session_factory() as db:
+                await db.run_sync(job)
+            return
+
+        def run():
+            with self.sync_session_factory() as db:
+                job(db)
+
+        # Контекст (в т.ч. current_db_stats) переносится в поток
+        context = contextvars.copy_context()
+        await asyncio.get_running_loop().run_in_executor(self.executor, context.run, run)
+
+    @track_job('birthday_index_rebuild')
+    async def rebuild_birthday_index(self):
+        """Полная перестройка birthday_index по таблице staff."""
+        await self._run_db_job(birthday_index.rebuild_from)
+        job_run().rows_scanned = len(birthday_index)
 
-        # Отправка запланированных рассылок
-        self.scheduler.add_job(
-            self.send_scheduled_broadcasts,
-            CronTrigger(minute='*/5'),  # Каждые 5 минут
-            id='scheduled_broadcasts',
-            replace_existing=True
+    async def cleanup_job_runs(self):
+        """Удаление записей job_runs старше JOB_RUNS_RETENTION_DAYS."""
+        await self._run_db_job(
+            lambda db: JobStatsService(db).delete_older_than(JOB_RUNS_RETENTION_DAYS)
         )
 
+    @track_job('birthday_check')
     async def check_upcoming_birthdays(self):
         """
         Проверка предстоящих дней рождения и отправка уведомлений.
@@ -90,32 +208,45 @@ class NotificationScheduler:
         Raises:
             Exception: При ошибках доступа к БД или отправки уведомлений
         """
-        try:
-            db = SessionLocal()
-            today = datetime.now()
-            future_date = today + timedelta(days=BIRTHDAY_REMINDER_DAYS)
-
-            upcoming_birthdays = db.query(User).filter(
-                and_(
-                    User.birthday.isnot(None),
-                    User.is_active == True
-                )
-            ).all()
-
-            for user in upcoming_birthdays:
-                birthday_this_year = user.birthday.replace(year=today.year)
-                if birthday_this_year < today:
-                    birthday_this_year = birthday_this_year.replace(year=today.year + 1)
-
-                days_until = (birthday_this_year - today).days
-                if 0 <= days_until <= BIRTHDAY_REMINDER_DAYS:
-                    self._create_birthday_notification(db, user, days_until)
-
-        except Exception as e:
-            logger.error(f"Error in birthday check: {e}")
-        finally:
-            db.close()
+        await self._run_db_job(self._check_upcoming_birthdays)
+
+    def _check_upcoming_birthdays(self, db: Session):
+        """Синхронная часть проверки дней рождения (см. _run_db_job)."""
+        now = clock.now()
+        today = now.date()
+
+        # Окно дат отбирается в БД по индексу birthday_md, включая переход через Новый год
+        upcoming_birthdays = db.query(User).filter(
+            and_(
+                birthday_window(User.birthday_md, today, BIRTHDAY_REMINDER_DAYS),
+                User.is_active == True,
+                User.unreachable_since.is_(None)
+            )
+        ).all()
+        # Уведомления получают администраторы, кроме самого именинника: сбор — сюрприз
+        admins = db.query(User).join(User.roles).filter(
+            and_(
+                Role.name.in_(('admin', 'superadmin')),
+                User.is_active == True,
+                User.unreachable_since.is_(None)
+            )
+        ).distinct().all() if upcoming_birthdays else []
+
+        rows = [
+            self._birthday_notification(
+                user, admin, days_until_birthday(user.birthday, today), today, now
+            )
+            for user in upcoming_birthdays
+            for admin in admins
+            if admin.id != user.id
+        ]
+        created = insert_or_ignore(db, Notification, rows, index_elements=["dedup_key"])
+        db.commit()
+        _plan_delivery(row["scheduled_for"] for row in rows)
+        _count_job_rows(len(upcoming_birthdays), created)
+        logger.info(f"Created {created} birthday notifications")
 
+    @track_job('fund_check')
     async def check_fund_deadlines(self):
         """
         Проверка дедлайнов сборов и отправка уведомлений.
@@ -127,28 +258,33 @@ class NotificationScheduler:
         Raises:
             Exception: При ошибках доступа к БД или отправки уведомлений
         """
-        try:
-            db = SessionLocal()
-            today = datetime.now()
-            deadline_date = today + timedelta(days=FUND_REMINDER_DAYS)
-
-            upcoming_deadlines = db.query(Fund).filter(
-                and_(
-                    Fund.is_active == True,
-                    Fund.end_date <= deadline_date,
-                    Fund.end_date > today
-                )
-            ).all()
-
-            for fund in upcoming_deadlines:
-                days_until = (fund.end_date - today).days
-                self._create_fund_deadline_notification(db, fund, days_until)
-
-        except Exception as e:
-            logger.error(f"Error in fund deadline check: {e}")
-        finally:
-            db.close()
+        await self._run_db_job(self._check_fund_deadlines)
+
+    def _check_fund_deadlines(self, db: Session):
+        """Синхронная часть проверки дедлайнов (см. _run_db_job)."""
+        today = clock.now()
+        deadline_date = today + timedelta(days=FUND_REMINDER_DAYS)
+
+        upcoming_deadlines = db.query(Fund).filter(
+            and_(
+                Fund.is_active == True,
+                Fund.end_date <= deadline_date,
+                Fund.end_date > today,
+                Fund.treasurer.has(User.unreachable_since.is_(None))
+            )
+        ).all()
+
+        rows = [
+            self._fund_deadline_notification(fund, (fund.end_date - today).days, today)
+            for fund in upcoming_deadlines
+        ]
+        created = insert_or_ignore(db, Notification, rows, index_elements=["dedup_key"])
+        db.commit()
+        _plan_delivery(row["scheduled_for"] for row in rows)
+        _count_job_rows(len(upcoming_deadlines), created)
+        logger.info(f"Created {created} fund deadline notifications")
 
+    @track_job('unpaid_reminder')
     async def remind_unpaid_participants(self):
         """
         Отправка напоминаний неплательщикам.
@@ -160,140 +296,304 @@ class NotificationScheduler:
         Raises:
             Exception: При ошибках доступа к БД или отправки уведомлений
         """
-        try:
-            db = SessionLocal()
-            active_funds = db.query(Fund).filter(Fund.is_active == True).all()
+        await self._run_db_job(self._remind_unpaid_participants)
 
-            for fund in active_funds:
-                paid_users = db.query(Donation.donor_id).filter(
-                    Donation.fund_id == fund.id
-                ).distinct().all()
-                paid_user_ids = [user[0] for user in paid_users]
+    def _remind_unpaid_participants(self, db: Session):
+        """
+        Синхронная часть напоминаний неплательщикам (см. _run_db_job).
 
-                unpaid_users = db.query(User).filter(
-                    and_(
-                        User.is_active == True,
-                        ~User.id.in_(paid_user_ids)
-                    )
-                ).all()
+        Пары (сбор, неплательщик) по всем активным сборам отбираются одним запросом
+        с NOT EXISTS по взносам, читаются потоком (yield_per) и записываются
+        пакетными INSERT в одной транзакции. Повторный запуск в тот же день
+        ничего не добавляет (ключ dedup_key).
+        """
+        now = clock.now()
+        today = now.date()
+        paid = select(Donation.id).where(
+            and_(
+                Donation.fund_id == Fund.id,
+                Donation.donor_id == User.id
+            )
+        ).exists()
+
+        unpaid_pairs = db.execute(
+            select(Fund.id, Fund.title, User.id, User.department)
+            .select_from(Fund)
+            .join(User, true())
+            .filter(
+                and_(
+                    Fund.is_active == True,
+                    User.is_active == True,
+                    User.unreachable_since.is_(None),
+                    # именинник не сдаёт на свой подарок
+                    or_(Fund.birthday_person_id.is_(None), Fund.birthday_person_id != User.id),
+                    ~paid
+                )
+            )
+            .execution_options(yield_per=NOTIFICATION_BATCH_SIZE)
+        )
 
-                for user in unpaid_users:
-                    self._create_unpaid_notification(db, fund, user)
+        created = 0
+        scanned = 0
+        slots = set()
+        for chunk in unpaid_pairs.partitions():
+            scanned += len(chunk)
+            rows = [
+                {
+                    "user_id": user_id,
+                    "title": "Напоминание о сборе",
+                    "message": f"Не забудьте внести средства в сбор '{fund_title}'",
+                    "type": "fund",
+                    "is_read": False,
+                    "scheduled_for": delivery_planner.slot(user_id, department, today, now),
+                    "dedup_key": notification_dedup_key("fund_unpaid", fund_id, user_id, today)
+                }
+                for fund_id, fund_title, user_id, department in chunk
+            ]
+            created += insert_or_ignore(db, Notification, rows, index_elements=["dedup_key"])
+            slots.update(row["scheduled_for"] for row in rows)
+        db.commit()
+        _plan_delivery(slots)
+        _count_job_rows(scanned, created)
+        logger.info(f"Created {created} unpaid reminders")
 
-        except Exception as e:
-            logger.error(f"Error in unpaid reminder check: {e}")
-        finally:
-            db.close()
+    async def dispatch_scheduled(self):
+        """
+        Диспетчер запланированных уведомлений.
 
-    async def send_scheduled_broadcasts(self):
+        Спит до ближайшего scheduled_for из due_timer (или новой более ранней
+        записи) и отправляет наступившие уведомления. Повторы неудачных
+        отправок send_scheduled_broadcasts сам ставит в due_timer.
+
+        Куча локальна для процесса: уведомления, запланированные хендлерами
+        других экземпляров, сюда не попадают. Поэтому не реже чем раз
+        в SCHEDULED_DISPATCH_MAX_SLEEP диспетчер проверяет БД и заново
+        подгружает кучу — такие уведомления уходят с опозданием не больше
+        этого интервала, а запланированные на более позднее время — вовремя.
+        """
+        loaded_at = None
+        while True:
+            if loaded_at is None or time.monotonic() - loaded_at >= SCHEDULED_DISPATCH_MAX_SLEEP:
+                try:
+                    async with self.session_factory() as db:
+                        await db.run_sync(due_timer.load)
+                except Exception as e:
+                    # Без кучи диспетчер всё равно проверит БД через SCHEDULED_DISPATCH_MAX_SLEEP
+                    logger.error(f"Error loading due timer: {e}")
+                loaded_at = time.monotonic()
+            await due_timer.wait(SCHEDULED_DISPATCH_MAX_SLEEP)
+            await self.send_scheduled_broadcasts()
+
+    @track_job('scheduled_broadcasts', skip_idle=True)
+    async def send_scheduled_broadcasts(self) -> int:
         """
         Отправка запланированных рассылок.
         
-        Находит все неотправленные уведомления, время отправки
-        которых уже наступило, и отправляет их получателям.
+        Уведомления, время отправки которых наступило, читаются пачками
+        по NOTIFICATION_BATCH_SIZE (по возрастанию id). Пачка отправляется
+        параллельно через очередь отправки, после чего её строки помечаются
+        delivered_at и фиксируются отдельной транзакцией. При падении посреди
+        прогона повторно уйдёт не больше одной пачки.
+
+        Неудачная отправка переносит scheduled_for на SCHEDULED_RETRY_INTERVAL
+        с удвоением на каждой попытке; после SCHEDULED_MAX_ATTEMPTS попыток
+        уведомление получает failed_at и больше не отправляется.
+        
+        Returns:
+            int: Количество неудачных отправок
         
         Raises:
             Exception: При ошибках доступа к БД или отправки уведомлений
         """
-        try:
-            db = SessionLocal()
-            now = datetime.now()
+        if self.bot is None:
+            logger.warning("Scheduled broadcasts skipped: bot is not set")
+            return 0
 
-            scheduled_notifications = db.query(Notification).filter(
-                and_(
-                    Notification.scheduled_for <= now,
-                    Notification.is_read == False
-                )
-            ).all()
-
-            for notification in scheduled_notifications:
-                await self._send_notification(notification)
-                notification.is_read = True
-
-            db.commit()
+        failed = 0
+        stats = job_run()
+        try:
+            now = clock.now()
+            last_id = 0
+            while True:
+                async with self.session_factory() as db:
+                    batch = (await db.execute(
+                        select(Notification.id, Notification.title, Notification.message,
+                               User.telegram_id)
+                        .join(User, User.id == Notification.user_id)
+                        .filter(
+                            and_(
+                                Notification.delivered_at.is_(None),
+                                Notification.failed_at.is_(None),
+                                Notification.scheduled_for <= now,
+                                Notification.id > last_id
+                            )
+                        )
+                        .order_by(Notification.id)
+                        .limit(NOTIFICATION_BATCH_SIZE)
+                    )).all()
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                statuses = await asyncio.gather(*(self._send_notification(n) for n in batch))
+                await _mark_blocked([n.telegram_id for n in batch], statuses, self.session_factory)
+
+                delivered_ids, failed_ids = [], []
+                for n, status in zip(batch, statuses):
+                    (failed_ids if status == DELIVERY_FAILED else delivered_ids).append(n.id)
+                failed += len(failed_ids)
+                stats.rows_scanned += len(batch)
+                stats.messages_sent += statuses.count(DELIVERY_SENT)
+                stats.errors += len(failed_ids)
+                if failed_ids:
+                    await _postpone_failed(failed_ids, self.session_factory)
+                if delivered_ids:
+                    async with self.session_factory() as db:
+                        await db.execute(
+                            update(Notification)
+                            .where(Notification.id.in_(delivered_ids))
+                            .values(delivered_at=clock.now())
+                        )
+                        await db.commit()
 
         except Exception as e:
             logger.error(f"Error in scheduled broadcasts: {e}")
-        finally:
-            db.close()
-
-    def _create_birthday_notification(self, db: Session, birthday_person: User, days_until: int):
+            failed += 1
+            stats.errors += 1
+            stats.last_error = str(e)[:500]
+            # Строки не помечены: следующий проход через SCHEDULED_RETRY_INTERVAL
+            due_timer.push(datetime.now() + timedelta(seconds=SCHEDULED_RETRY_INTERVAL))
+        return failed
+
+    def _birthday_notification(self, birthday_person: User, recipient: User, days_until: int,
+                               today, now: datetime) -> dict:
         """
-        Создание уведомления о предстоящем дне рождения.
+        Строка уведомления администратору о предстоящем дне рождения.
         
         Args:
-            db (Session): Сессия базы данных
             birthday_person (User): Пользователь, у которого скоро день рождения
+            recipient (User): Администратор, получающий уведомление
             days_until (int): Количество дней до дня рождения
+            today (date): Дата запуска проверки (часть ключа дедупликации)
+            now (datetime): Время запуска (слот доставки не раньше него)
         """
-        notification = Notification(
-            user_id=birthday_person.id,
-            title="Предстоящий день рождения",
-            message=f"Через {days_until} дней день рождения у {birthday_person.full_name}",
-            type="birthday",
-            is_read=False
-        )
-        db.add(notification)
-        db.commit()
-
-    def _create_fund_deadline_notification(self, db: Session, fund: Fund, days_until: int):
+        return {
+            "user_id": recipient.id,
+            "title": "Предстоящий день рождения",
+            "message": f"Через {days_until} дней день рождения у {birthday_person.full_name}",
+            "type": "birthday",
+            "is_read": False,
+            "scheduled_for": delivery_planner.slot(
+                recipient.id, recipient.department, today, now
+            ),
+            "dedup_key": notification_dedup_key(
+                "birthday", birthday_person.id, recipient.id, today
+            )
+        }
+
+    def _fund_deadline_notification(self, fund: Fund, days_until: int, today) -> dict:
         """
-        Создание уведомления о дедлайне сбора.
+        Строка уведомления о дедлайне сбора.
         
         Args:
-            db (Session): Сессия базы данных
             fund (Fund): Сбор, у которого приближается дедлайн
             days_until (int): Количество дней до дедлайна
+            today (datetime): Время запуска проверки (часть ключа дедупликации)
         """
-        notification = Notification(
-            user_id=fund.treasurer_id,
-            title="Дедлайн сбора",
-            message=f"Через {days_until} дней заканчивается сбор '{fund.title}'",
-            type="fund",
-            is_read=False
-        )
-        db.add(notification)
-        db.commit()
-
-    def _create_unpaid_notification(self, db: Session, fund: Fund, user: User):
+        return {
+            "user_id": fund.treasurer_id,
+            "title": "Дедлайн сбора",
+            "message": f"Через {days_until} дней заканчивается сбор '{fund.title}'",
+            "type": "fund",
+            "is_read": False,
+            "scheduled_for": delivery_planner.slot(
+                fund.treasurer_id, fund.treasurer.department, today.date(), today
+            ),
+            "dedup_key": notification_dedup_key("fund_deadline", fund.id, fund.treasurer_id, today)
+        }
+
+    async def _send_notification(self, notification) -> str:
         """
-        Создание уведомления о необходимости внести средства.
+        Отправка уведомления пользователю через очередь отправки.
         
         Args:
-            db (Session): Сессия базы данных
-            fund (Fund): Сбор, в который нужно внести средства
-            user (User): Пользователь, которому нужно напомнить о взносе
+            notification: Строка с полями title, message и telegram_id получателя
+        
+        Returns:
+            str: Статус доставки (DELIVERY_SENT, DELIVERY_FAILED, DELIVERY_BLOCKED)
         """
-        notification = Notification(
-            user_id=user.id,
-            title="Напоминание о сборе",
-            message=f"Не забудьте внести средства в сбор '{fund.title}'",
-            type="fund",
-            is_read=False
+        return await get_send_queue(self.bot).send_message(
+            notification.telegram_id,
+            f"📬 {notification.title}\n\n{notification.message}"
         )
-        db.add(notification)
-        db.commit()
 
-    async def _send_notification(self, notification: Notification):
+    def start(self, paused: bool = False):
         """
-        Отправка уведомления пользователю.
-        
+        Запуск планировщика задач.
+
         Args:
-            notification (Notification): Уведомление для отправки
-        
-        Note:
-            В текущей версии метод не реализован
+            paused (bool): Запустить без выполнения задач до resume()
+                (резервный экземпляр, ожидающий аренду лидера)
         """
-        # TODO: Реализовать отправку через бота
-        pass
-
-    def start(self):
-        """Запуск планировщика задач."""
-        self.scheduler.start()
+        global _active_scheduler
+        _active_scheduler = self
+        self.scheduler.start(paused=paused)
+        self._sync_jobs()
+        if not paused:
+            self._start_dispatcher()
+
+    def resume(self):
+        """Начало выполнения задач (экземпляр стал лидером)."""
+        self.scheduler.resume()
+        self._start_dispatcher()
+        logger.info("Scheduler jobs resumed")
+
+    def pause(self):
+        """Приостановка выполнения задач (экземпляр потерял лидерство)."""
+        self.scheduler.pause()
+        self._stop_dispatcher()
+        logger.info("Scheduler jobs paused")
+
+    def _start_dispatcher(self):
+        if self.bot is not None and (self._dispatch_task is None or self._dispatch_task.done()):
+            self._dispatch_task = asyncio.create_task(self.dispatch_scheduled())
+
+    def _stop_dispatcher(self):
+        if self._dispatch_task is not None:
+            self._dispatch_task.cancel()
+            self._dispatch_task = None
 
     def shutdown(self):
         """Остановка планировщика задач."""
+        self._stop_dispatcher()
         self.scheduler.shutdown()
+        self.executor.shutdown(wait=False)
+
+def _count_job_rows(scanned: int, created: int):
+    """Учёт объёма работы в телеметрии текущей задачи (job_runs)"""
+    stats = job_run()
+    stats.rows_scanned += scanned
+    stats.notifications_created += created
+
+def _plan_delivery(slots):
+    """Передача слотов доставки диспетчеру (будит его, если слот раньше ожидаемого)"""
+    for when in set(slots):
+        due_timer.push(when)
+
+# Экземпляр, чьи методы выполняют задачи из хранилища (см. run_job)
+_active_scheduler: Optional[NotificationScheduler] = None
+
+async def run_job(method: str):
+    """
+    Точка входа сохранённых в БД задач.
+
+    В хранилище задача ссылается на эту функцию и имя метода, поскольку
+    связанный метод экземпляра (с ботом и фабрикой сессий) не сериализуется.
+    """
+    if _active_scheduler is None:
+        logger.warning(f"Job {method} skipped: scheduler is not started")
+        return
+    await getattr(_active_scheduler, method)()
 
 async def birthday_reminder(bot: Bot):
     """
@@ -302,21 +602,27 @@ async def birthday_reminder(bot: Bot):
     Args:
         bot (Bot): Экземпляр бота для отправки сообщений
     """
-    session = SessionLocal()
-    try:
-        birthdays = get_upcoming_birthdays()
-        if not birthdays:
+    async with AsyncSessionLocal() as session:
+        await birthday_index.ensure_loaded(session)
+        staff_ids = birthday_index.on_date(
+            clock.today() + timedelta(days=BIRTHDAY_REMINDER_DAYS_BEFORE)
+        )
+        if not staff_ids:
             return
-        admins = get_admins()
-        for staff in birthdays:
-            text = f"🎂 Внимание! Через 10 дней день рождения: {staff.first_name} {staff.patronymic} ({staff.birthday.strftime('%d.%m.%Y')})"
-            for admin in admins:
-                try:
-                    await bot.send_message(admin.telegram_id, text)
-                except:
-                    continue
-    finally:
-        session.close()
+        birthdays = (await session.scalars(select(Staff).filter(Staff.id.in_(staff_ids)))).all()
+        admins = await session.run_sync(lambda db: UserService(db).get_admins())
+    admin_ids = [admin.telegram_id for admin in admins if admin.unreachable_since is None]
+    send_queue = get_send_queue(bot)
+    deliveries, chat_ids = [], []
+    for staff in birthdays:
+        text = (
+            f"🎂 Внимание! Через 10 дней день рождения: {staff.first_name} {staff.patronymic} "
+            f"({staff.birthday.strftime('%d.%m.%Y')})"
+        )
+        for admin_id in admin_ids:
+            deliveries.append(send_queue.enqueue(admin_id, text))
+            chat_ids.append(admin_id)
+    await _mark_blocked(chat_ids, await asyncio.gather(*deliveries))
 
 async def fund_deadline_reminder(bot: Bot):
     """
@@ -325,22 +631,55 @@ async def fund_deadline_reminder(bot: Bot):
     Args:
         bot (Bot): Экземпляр бота для отправки сообщений
     """
-    session = SessionLocal()
-    try:
-        funds = get_funds_near_deadline()
+    async with AsyncSessionLocal() as session:
+        funds = await session.run_sync(
+            lambda db: FundService(db).get_funds_near_deadline(FUND_REMINDER_DAYS_BEFORE)
+        )
         if not funds:
             return
+        send_queue = get_send_queue(bot)
+        deliveries, chat_ids = [], []
         for fund in funds:
-            treasurer: User = session.query(User).get(fund.treasury_user_id)
-            if not treasurer:
-                continue
-            try:
-                await bot.send_message(treasurer.telegram_id,
-                    f"⏰ Напоминание: через {3} дня дедлайн по сбору №{fund.id}")
-            except:
+            treasurer = await session.get(User, fund.treasurer_id)
+            if not treasurer or treasurer.unreachable_since is not None:
                 continue
-    finally:
-        session.close()
+            deliveries.append(send_queue.enqueue(
+                treasurer.telegram_id,
+                f"⏰ Напоминание: через {FUND_REMINDER_DAYS_BEFORE} дня дедлайн по сбору №{fund.id}"
+            ))
+            chat_ids.append(treasurer.telegram_id)
+    await _mark_blocked(chat_ids, await asyncio.gather(*deliveries))
+
+async def _postpone_failed(notification_ids, session_factory=AsyncSessionLocal):
+    """
+    Учёт неудачной отправки уведомлений: повтор с удвоением интервала
+    или, после SCHEDULED_MAX_ATTEMPTS попыток, окончательный отказ (failed_at).
+    """
+    now = clock.now()
+    retries = []
+    async with session_factory() as session:
+        notifications = await session.scalars(
+            select(Notification).filter(Notification.id.in_(notification_ids))
+        )
+        for notification in notifications:
+            notification.attempts = (notification.attempts or 0) + 1
+            if notification.attempts >= SCHEDULED_MAX_ATTEMPTS:
+                notification.failed_at = now
+                logger.warning(f"Giving up notification {notification.id} "
+                               f"after {notification.attempts} attempts")
+            else:
+                delay = min(SCHEDULED_RETRY_INTERVAL * 2 ** (notification.attempts - 1), 3600)
+                notification.scheduled_for = now + timedelta(seconds=delay)
+                retries.append(notification.scheduled_for)
+        await session.commit()
+    _plan_delivery(retries)
+
+async def _mark_blocked(chat_ids, statuses, session_factory=AsyncSessionLocal):
+    """Отметка получателей, заблокировавших бота, по результатам рассылки"""
+    blocked = [chat_id for chat_id, status in zip(chat_ids, statuses) if status == DELIVERY_BLOCKED]
+    if blocked:
+        async with session_factory() as session:
+            await session.run_sync(lambda db: UserService(db).mark_unreachable(blocked))
 
 def setup_scheduler(bot: Bot):
     """
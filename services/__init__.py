@@ -0,0 +1 @@
+from .async_adapter import AsyncServiceAdapter
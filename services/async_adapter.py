@@ -0,0 +1,31 @@
+# services/async_adapter.py
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Callable, Type
+
+
+class AsyncServiceAdapter:
+    """
+    Асинхронная обёртка над синхронным сервисом (UserService, FundService, BroadcastService).
+
+    Каждый вызов метода выполняется через AsyncSession.run_sync: бизнес-логика сервиса
+    остаётся единой, а ввод-вывод идёт через асинхронный драйвер и не блокирует event loop.
+
+    Пример:
+        users = AsyncServiceAdapter(UserService, session)
+        user = await users.get_user_by_telegram_id(telegram_id)
+    """
+
+    def __init__(self, service_cls: Type, session: AsyncSession):
+        self._service_cls = service_cls
+        self._session = session
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        # Проверяем наличие метода сразу, а не при первом await
+        getattr(self._service_cls, name)
+
+        async def call(*args, **kwargs):
+            return await self._session.run_sync(
+                lambda sync_session: getattr(self._service_cls(sync_session), name)(*args, **kwargs)
+            )
+
+        return call
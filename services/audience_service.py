@@ -0,0 +1,89 @@
+# services/audience_service.py
+from typing import Iterator, List, Optional, Tuple
+from sqlalchemy import Select, and_, or_, select
+from sqlalchemy.orm import Session
+from models import User, Fund, Donation
+from services.birthday_service import birthday_window
+from utils.segment_cache import segment_cache
+import logging
+from clock import clock
+
+logger = logging.getLogger(__name__)
+
+# Получателей в одной пачке потокового чтения
+AUDIENCE_CHUNK_SIZE = 1000
+
+Recipient = Tuple[int, int]  # (user_id, telegram_id)
+
+class AudienceService:
+    """
+    Аудитории рассылок в виде потока лёгких пар (user_id, telegram_id).
+
+    Запросы выбирают только две колонки и читаются через yield_per
+    (серверный курсор в PostgreSQL), поэтому память на рассылку не зависит
+    от размера организации. В базовую аудиторию входят только активные
+    пользователи, не заблокировавшие бота.
+
+    Для предпросмотра напоминания по сбору не сдавшие доступны как битовое
+    множество из utils.segment_cache — его размер считается без запроса к БД.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def reachable_users(self) -> Select:
+        """Все активные пользователи, которым можно написать"""
+        return select(User.id, User.telegram_id).filter(
+            and_(
+                User.is_active == True,
+                User.unreachable_since.is_(None)
+            )
+        )
+
+    def broadcast_audience(self, broadcast_type: str,
+                           target_department: Optional[str] = None) -> Select:
+        """Аудитория рассылки по Broadcast.broadcast_type (all, no_birthday, department)"""
+        query = self.reachable_users()
+        if broadcast_type == "department" and target_department:
+            query = query.filter(User.department == target_department)
+        elif broadcast_type == "no_birthday":
+            query = query.filter(
+                or_(
+                    User.birthday_md.is_(None),
+                    ~birthday_window(User.birthday_md, clock.today(), 0)
+                )
+            )
+        return query
+
+    def unpaid_audience(self, fund: Fund) -> Select:
+        """Участники, ещё не сдавшие в сбор (без именинника сбора на ДР)"""
+        paid = select(Donation.id).where(
+            and_(
+                Donation.fund_id == fund.id,
+                Donation.donor_id == User.id
+            )
+        ).exists()
+        query = self.reachable_users().filter(~paid)
+        if fund.fund_type == "birthday" and fund.birthday_person_id:
+            query = query.filter(User.id != fund.birthday_person_id)
+        return query
+
+    def unpaid_segment(self, fund: Fund) -> int:
+        """Не сдавшие в сбор из кэша сегментов (битовое множество id)"""
+        bits = segment_cache.active(self.db) & ~segment_cache.paid(self.db, fund.id)
+        if fund.fund_type == "birthday" and fund.birthday_person_id:
+            bits &= ~(1 << fund.birthday_person_id)
+        return bits
+
+    def iter_chunks(self, query: Select,
+                    chunk_size: int = AUDIENCE_CHUNK_SIZE) -> Iterator[List[Recipient]]:
+        """Поток пачек получателей по chunk_size"""
+        result = self.db.execute(query.order_by(User.id).execution_options(yield_per=chunk_size))
+        for partition in result.partitions():
+            yield [(user_id, telegram_id) for user_id, telegram_id in partition]
+
+    def iter_recipients(self, query: Select,
+                        chunk_size: int = AUDIENCE_CHUNK_SIZE) -> Iterator[Recipient]:
+        """Поток получателей по одному"""
+        for chunk in self.iter_chunks(query, chunk_size):
+            yield from chunk
@@ -1,18 +1,58 @@
 # services/birthday_service.py
-from datetime import datetime, timedelta
-from database import SessionLocal
-from models import Staff, User
+import calendar
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from models import Staff, birthday_ordinal
 from config import BIRTHDAY_REMINDER_DAYS_BEFORE
+from clock import clock
 
-def get_upcoming_birthdays():
-    session = SessionLocal()
-    try:
-        today = datetime.today().date()
-        target_date = today + timedelta(days=BIRTHDAY_REMINDER_DAYS_BEFORE)
-        return session.query(Staff).filter(
-            Staff.birthday != None,
-            Staff.birthday.month == target_date.month,
-            Staff.birthday.day == target_date.day
-        ).all()
-    finally:
-        session.close()
+def _ordinal_upper(day: date) -> int:
+    # В невисокосный год родившиеся 29 февраля отмечают 28-го
+    if day.month == 2 and day.day == 28 and not calendar.isleap(day.year):
+        return 229
+    return birthday_ordinal(day)
+
+def birthday_ranges(start: date, days: int) -> List[Tuple[int, int]]:
+    """
+    Диапазоны MMDD для окна дат [start, start + days].
+
+    Без перехода через Новый год — один диапазон, с переходом — два.
+    """
+    if days >= 365:
+        return [(101, 1231)]
+    end = start + timedelta(days=days)
+    lower, upper = birthday_ordinal(start), _ordinal_upper(end)
+    if lower <= upper:
+        return [(lower, upper)]
+    return [(lower, 1231), (101, upper)]
+
+def month_range(month: int) -> Tuple[int, int]:
+    """Диапазон MMDD для календарного месяца"""
+    return month * 100 + 1, month * 100 + 31
+
+def birthday_window(column, start: date, days: int):
+    """
+    Условие «день рождения в окне [start, start + days]» по колонке MMDD.
+
+    Каждый диапазон — BETWEEN, то есть range scan по индексу.
+    """
+    return or_(*(column.between(lower, upper) for lower, upper in birthday_ranges(start, days)))
+
+def days_until_birthday(birthday, today: date) -> Optional[int]:
+    """Количество дней до ближайшего дня рождения (0 — сегодня)"""
+    if not birthday:
+        return None
+    for year in (today.year, today.year + 1):
+        day = birthday.day
+        if birthday.month == 2 and day == 29 and not calendar.isleap(year):
+            day = 28
+        next_birthday = date(year, birthday.month, day)
+        if next_birthday >= today:
+            return (next_birthday - today).days
+
+def get_upcoming_birthdays(session: Session, days_before: int = BIRTHDAY_REMINDER_DAYS_BEFORE):
+    """Сотрудники, у которых день рождения ровно через days_before дней"""
+    target_date = clock.today() + timedelta(days=days_before)
+    return session.query(Staff).filter(birthday_window(Staff.birthday_md, target_date, 0)).all()
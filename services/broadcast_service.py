@@ -1,12 +1,20 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from models import User, Broadcast, Notification
-from typing import List, Optional
+from sqlalchemy import and_, insert
+from models import Broadcast, Notification
+from services.audience_service import AudienceService
+from services.outbox_service import OutboxService
+from utils.due_timer import due_timer
+from typing import Iterable, List, Optional
 from datetime import datetime, timedelta
+from itertools import islice
 import logging
+from clock import clock
 
 logger = logging.getLogger(__name__)
 
+# Строк в одном пакетном INSERT
+NOTIFICATION_INSERT_CHUNK = 1000
+
 class BroadcastService:
     def __init__(self, db: Session):
         self.db = db
@@ -45,7 +53,7 @@ class BroadcastService:
 
     def get_pending_broadcasts(self) -> List[Broadcast]:
         """Получение всех ожидающих отправки рассылок"""
-        now = datetime.now()
+        now = clock.now()
         return self.db.query(Broadcast).filter(
             and_(
                 Broadcast.scheduled_for <= now,
@@ -73,6 +81,8 @@ class BroadcastService:
             )
             self.db.add(notification)
             self.db.commit()
+            if scheduled_for:
+                due_timer.push(scheduled_for)
             self.db.refresh(notification)
             return notification
         except Exception as e:
@@ -80,6 +90,59 @@ class BroadcastService:
             self.db.rollback()
             raise
 
+    def bulk_create_notifications(
+        self,
+        user_ids: Iterable[int],
+        title: str,
+        message: str,
+        notification_type: str,
+        scheduled_for: Optional[datetime] = None,
+        chunk_size: int = NOTIFICATION_INSERT_CHUNK,
+        commit: bool = True
+    ) -> List[int]:
+        """
+        Пакетное создание одинаковых уведомлений для многих получателей.
+
+        Строки вставляются пачками по chunk_size (executemany с RETURNING id)
+        в одной транзакции — без add/commit/refresh на каждую строку.
+        commit=False оставляет фиксацию вызывающему коду.
+
+        Returns:
+            List[int]: ID созданных уведомлений в порядке user_ids
+        """
+        try:
+            now = clock.now()
+            statement = insert(Notification).returning(
+                Notification.id, sort_by_parameter_order=True
+            )
+            notification_ids: List[int] = []
+            user_ids = iter(user_ids)
+            while True:
+                chunk = list(islice(user_ids, chunk_size))
+                if not chunk:
+                    break
+                notification_ids.extend(self.db.scalars(statement, [
+                    {
+                        "user_id": user_id,
+                        "title": title,
+                        "message": message,
+                        "type": notification_type,
+                        "scheduled_for": scheduled_for,
+                        "is_read": False,
+                        "created_at": now
+                    }
+                    for user_id in chunk
+                ]))
+            if commit:
+                self.db.commit()
+            if scheduled_for and notification_ids:
+                due_timer.push(scheduled_for)
+            return notification_ids
+        except Exception as e:
+            logger.error(f"Error creating notifications: {e}")
+            self.db.rollback()
+            raise
+
     def get_user_notifications(self, user_id: int, unread_only: bool = False) -> List[Notification]:
         """Получение уведомлений пользователя"""
         query = self.db.query(Notification).filter(Notification.user_id == user_id)
@@ -103,46 +166,45 @@ class BroadcastService:
             self.db.rollback()
             return False
 
-    def send_broadcast_to_users(self, broadcast: Broadcast) -> List[Notification]:
-        """Отправка рассылки пользователям"""
-        try:
-            notifications = []
-            users_query = self.db.query(User).filter(User.is_active == True)
-
-            # Фильтрация пользователей в зависимости от типа рассылки
-            if broadcast.broadcast_type == "department" and broadcast.target_department:
-                users_query = users_query.filter(User.department == broadcast.target_department)
-            elif broadcast.broadcast_type == "no_birthday":
-                today = datetime.now()
-                users_query = users_query.filter(
-                    or_(
-                        User.birthday.is_(None),
-                        User.birthday != today
-                    )
-                )
+    def send_broadcast_to_users(self, broadcast: Broadcast) -> int:
+        """
+        Отправка рассылки пользователям.
+
+        Аудитория читается потоком пар (user_id, telegram_id); на каждую пачку
+        пишутся уведомления и строки outbox, всё в одной транзакции.
+        Доставку в Telegram выполняет OutboxWorker.
 
-            users = users_query.all()
-            
-            # Создание уведомлений для каждого пользователя
-            for user in users:
-                notification = self.create_notification(
-                    user_id=user.id,
+        Returns:
+            int: Количество получателей
+        """
+        try:
+            audience = AudienceService(self.db)
+            outbox = OutboxService(self.db)
+            text = f"📢 {broadcast.title}\n\n{broadcast.message}"
+            recipients = 0
+            for chunk in audience.iter_chunks(
+                audience.broadcast_audience(broadcast.broadcast_type, broadcast.target_department)
+            ):
+                self.bulk_create_notifications(
+                    (user_id for user_id, _ in chunk),
                     title=broadcast.title,
                     message=broadcast.message,
-                    notification_type="broadcast"
+                    notification_type="broadcast",
+                    commit=False
                 )
-                notifications.append(notification)
-
-            return notifications
+                outbox.enqueue_broadcast(broadcast.id, chunk, text, commit=False)
+                recipients += len(chunk)
+            self.db.commit()
+            return recipients
         except Exception as e:
             logger.error(f"Error sending broadcast: {e}")
             self.db.rollback()
-            return []
+            return 0
 
     def delete_old_notifications(self, days: int = 30) -> int:
         """Удаление старых уведомлений"""
         try:
-            cutoff_date = datetime.now() - timedelta(days=days)
+            cutoff_date = clock.now() - timedelta(days=days)
             deleted = self.db.query(Notification).filter(
                 Notification.created_at < cutoff_date
             ).delete()
@@ -1,10 +1,12 @@
 # services/fund_service.py
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, update
 from models import Fund, User, Donation
+from utils.segment_cache import segment_cache
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta
 import logging
+from clock import clock
 
 logger = logging.getLogger(__name__)
 
@@ -73,6 +75,17 @@ class FundService:
             )
         ).all()
 
+    def get_funds_near_deadline(self, days: int) -> List[Fund]:
+        """Получение активных сборов, дедлайн которых наступит в ближайшие days дней"""
+        now = clock.now()
+        return self.db.query(Fund).filter(
+            and_(
+                Fund.is_active == True,
+                Fund.end_date > now,
+                Fund.end_date <= now + timedelta(days=days)
+            )
+        ).all()
+
     def close_fund(self, fund_id: int) -> bool:
         """Закрытие сбора"""
         try:
@@ -80,6 +93,8 @@ class FundService:
             if fund:
                 fund.is_active = False
                 self.db.commit()
+                # Взносов в закрытый сбор больше не будет — сдавшие не нужны
+                segment_cache.invalidate_fund(fund_id)
                 return True
             return False
         except Exception as e:
@@ -88,10 +103,23 @@ class FundService:
             return False
 
     def add_donation(self, fund_id: int, donor_id: int, amount: float) -> Optional[Donation]:
-        """Добавление взноса в сбор"""
+        """
+        Добавление взноса в сбор.
+
+        Сумма сбора увеличивается на стороне БД (current_amount = current_amount + amount)
+        в одной транзакции со вставкой взноса, поэтому одновременные взносы
+        от разных казначеев или экземпляров бота не теряются. В PostgreSQL
+        UPDATE блокирует строку сбора до фиксации, и условие is_active
+        перепроверяется после ожидания блокировки.
+        """
         try:
-            fund = self.get_fund(fund_id)
-            if not fund or not fund.is_active:
+            updated = self.db.execute(
+                update(Fund)
+                .where(and_(Fund.id == fund_id, Fund.is_active == True))
+                .values(current_amount=Fund.current_amount + amount)
+            ).rowcount
+            if not updated:
+                self.db.rollback()
                 return None
 
             donation = Donation(
@@ -100,11 +128,8 @@ class FundService:
                 amount=amount
             )
             self.db.add(donation)
-            
-            # Обновляем текущую сумму сбора
-            fund.current_amount = fund.current_amount + amount
-            
             self.db.commit()
+            segment_cache.invalidate_fund(fund_id)
             self.db.refresh(donation)
             return donation
         except Exception as e:
@@ -128,7 +153,7 @@ class FundService:
             "remaining_amount": fund.target_amount - fund.current_amount,
             "donors_count": len(donors),
             "is_active": fund.is_active,
-            "days_left": (fund.end_date - datetime.now()).days
+            "days_left": (fund.end_date - clock.now()).days
         }
 
     def get_unpaid_users(self, fund_id: int) -> List[User]:
@@ -0,0 +1,166 @@
+# services/job_stats_service.py
+import logging
+import time
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.orm import Session
+
+from models import JobRun
+from clock import clock
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunStats:
+    """Счётчики текущего запуска задачи (см. track_job)"""
+    __slots__ = ("rows_scanned", "notifications_created", "messages_sent", "errors", "last_error")
+
+    def __init__(self):
+        self.rows_scanned = 0
+        self.notifications_created = 0
+        self.messages_sent = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+
+# Счётчики выполняемой задачи; вне задачи — None. В пул потоков
+# переносятся вместе с контекстом (NotificationScheduler._run_db_job)
+current_job_run: ContextVar[Optional[JobRunStats]] = ContextVar("current_job_run", default=None)
+
+
+def job_run() -> JobRunStats:
+    """Счётчики текущей задачи (вне задачи — временный объект, который никуда не пишется)"""
+    return current_job_run.get() or JobRunStats()
+
+
+def track_job(name: str, skip_idle: bool = False):
+    """
+    Замер запуска задачи NotificationScheduler и запись его в job_runs.
+
+    Исключение задачи логируется и учитывается в errors, наружу не выходит.
+    Запись делается через session_factory экземпляра планировщика.
+
+    skip_idle — не записывать запуски, которые не просмотрели ни одной строки
+    и прошли без ошибок. Для задач, запускаемых по событию (диспетчер
+    просыпается по каждому таймеру), иначе job_runs растёт на пустых запусках.
+    """
+    def decorator(method):
+        @wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            stats = JobRunStats()
+            token = current_job_run.set(stats)
+            started_at = clock.now()
+            started = time.perf_counter()
+            result = None
+            try:
+                result = await method(self, *args, **kwargs)
+            except Exception as e:
+                logger.error(f"Error in job {name}: {e}")
+                stats.errors += 1
+                stats.last_error = str(e)[:500]
+            finally:
+                current_job_run.reset(token)
+            duration_ms = (time.perf_counter() - started) * 1000
+            if skip_idle and not stats.rows_scanned and not stats.errors:
+                return result
+            try:
+                async with self.session_factory() as db:
+                    await db.run_sync(
+                        lambda s: JobStatsService(s).record(name, started_at, duration_ms, stats)
+                    )
+            except Exception as e:
+                logger.error(f"Error recording job run {name}: {e}")
+            return result
+        return wrapper
+    return decorator
+
+
+class JobStatsService:
+    """Телеметрия задач планировщика"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record(self, job: str, started_at: datetime, duration_ms: float,
+               stats: JobRunStats) -> JobRun:
+        """Запись одного запуска"""
+        try:
+            run = JobRun(
+                job=job,
+                started_at=started_at,
+                duration_ms=duration_ms,
+                rows_scanned=stats.rows_scanned,
+                notifications_created=stats.notifications_created,
+                messages_sent=stats.messages_sent,
+                errors=stats.errors,
+                last_error=stats.last_error
+            )
+            self.db.add(run)
+            self.db.commit()
+            return run
+        except Exception as e:
+            logger.error(f"Error recording job run: {e}")
+            self.db.rollback()
+            raise
+
+    def get_last_runs(self, limit: int = 10) -> List[JobRun]:
+        """Последние запуски всех задач"""
+        return list(self.db.scalars(select(JobRun).order_by(JobRun.started_at.desc()).limit(limit)))
+
+    def get_trends(self, days: int = 7) -> List[Dict]:
+        """
+        Сравнение задач за последние days дней с предыдущим периодом той же длины.
+
+        Returns:
+            List[Dict]: По задаче: число запусков, средняя и максимальная
+                длительность, просмотрено строк за запуск и ошибки — за текущий
+                период, и средняя длительность за предыдущий
+        """
+        now = clock.now()
+        current_from = now - timedelta(days=days)
+        previous_from = current_from - timedelta(days=days)
+        is_current = JobRun.started_at >= current_from
+
+        rows = self.db.execute(
+            select(
+                JobRun.job,
+                func.count(case((is_current, 1))),
+                func.avg(case((is_current, JobRun.duration_ms))),
+                func.max(case((is_current, JobRun.duration_ms))),
+                func.avg(case((is_current, JobRun.rows_scanned))),
+                func.coalesce(func.sum(case((is_current, JobRun.errors))), 0),
+                func.avg(case((~is_current, JobRun.duration_ms))),
+            )
+            .filter(JobRun.started_at >= previous_from)
+            .group_by(JobRun.job)
+            .order_by(JobRun.job)
+        ).all()
+        return [
+            {
+                "job": job,
+                "runs": runs,
+                "avg_ms": avg_ms,
+                "max_ms": max_ms,
+                "avg_rows": avg_rows,
+                "errors": errors,
+                "previous_avg_ms": previous_avg_ms,
+            }
+            for job, runs, avg_ms, max_ms, avg_rows, errors, previous_avg_ms in rows
+        ]
+
+    def delete_older_than(self, days: int) -> int:
+        """Удаление запусков старше days дней"""
+        try:
+            deleted = self.db.execute(
+                delete(JobRun).where(JobRun.started_at < clock.now() - timedelta(days=days))
+            ).rowcount
+            self.db.commit()
+            return deleted
+        except Exception as e:
+            logger.error(f"Error deleting old job runs: {e}")
+            self.db.rollback()
+            return 0
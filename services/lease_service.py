@@ -0,0 +1,164 @@
+# services/lease_service.py
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.orm import Session
+
+from config import LEADER_HEARTBEAT_INTERVAL, LEADER_LEASE_TTL
+from database import AsyncSessionLocal, insert_or_ignore
+from models import Lease
+
+logger = logging.getLogger(__name__)
+
+# Аренда, которой владеет экземпляр, выполняющий задачи планировщика
+SCHEDULER_LEASE = "scheduler"
+
+
+def process_holder_id() -> str:
+    """Уникальный идентификатор процесса для поля Lease.holder"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaseService:
+    """
+    Аренды в таблице leases.
+
+    Захват и продление — один условный UPDATE (или INSERT ... ON CONFLICT DO
+    NOTHING для новой аренды), поэтому из нескольких процессов аренду получает
+    ровно один и на SQLite, и на PostgreSQL. Предполагается, что часы
+    экземпляров синхронизированы с точностью много меньше срока аренды.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def try_acquire(self, name: str, holder: str, ttl: float) -> bool:
+        """Захват свободной или просроченной аренды либо продление своей"""
+        try:
+            now = datetime.now()
+            expires_at = now + timedelta(seconds=ttl)
+            acquired = self.db.execute(
+                update(Lease)
+                .where(and_(Lease.name == name,
+                            or_(Lease.holder == holder, Lease.expires_at < now)))
+                .values(holder=holder, expires_at=expires_at)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not acquired:
+                acquired = insert_or_ignore(self.db, Lease, [
+                    {"name": name, "holder": holder, "expires_at": expires_at, "acquired_at": now}
+                ], index_elements=["name"])
+            self.db.commit()
+            return bool(acquired)
+        except Exception as e:
+            logger.error(f"Error acquiring lease {name}: {e}")
+            self.db.rollback()
+            raise
+
+    def release(self, name: str, holder: str) -> bool:
+        """Досрочное освобождение своей аренды (резервный экземпляр забирает её сразу)"""
+        try:
+            released = self.db.execute(
+                update(Lease)
+                .where(and_(Lease.name == name, Lease.holder == holder))
+                .values(expires_at=datetime.now() - timedelta(seconds=1))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            self.db.commit()
+            return bool(released)
+        except Exception as e:
+            logger.error(f"Error releasing lease {name}: {e}")
+            self.db.rollback()
+            return False
+
+
+class LeaderLease:
+    """
+    Фоновое удержание аренды: каждые heartbeat_interval секунд процесс
+    продлевает свою аренду или пытается захватить освободившуюся.
+
+    При получении аренды вызывается on_acquired, при потере — on_lost.
+    Если продлить аренду не удаётся (например, недоступна БД), процесс
+    отказывается от неё за heartbeat_interval до истечения срока, отсчитанного
+    от начала последнего успешного продления: следующей проверки может уже
+    не быть до того, как аренду заберёт другой экземпляр.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        on_acquired: Callable[[], None],
+        on_lost: Callable[[], None],
+        session_factory=AsyncSessionLocal,
+        ttl: float = LEADER_LEASE_TTL,
+        heartbeat_interval: float = LEADER_HEARTBEAT_INTERVAL,
+        holder: Optional[str] = None
+    ):
+        self.name = name
+        self.on_acquired = on_acquired
+        self.on_lost = on_lost
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.holder = holder or process_holder_id()
+        self.is_leader = False
+        self._renewed_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def heartbeat(self) -> bool:
+        """Одна попытка захвата/продления; возвращает, является ли процесс лидером"""
+        # Отметка до UPDATE: срок аренды в БД отсчитывается не раньше этого момента,
+        # а ожидание ответа и commit могли занять заметное время
+        attempted_at = datetime.now()
+        try:
+            async with self.session_factory() as db:
+                held = await db.run_sync(
+                    lambda s: LeaseService(s).try_acquire(self.name, self.holder, self.ttl)
+                )
+            if held:
+                self._renewed_at = attempted_at
+        except Exception:
+            # Без связи с БД аренда считается своей до срока минус интервал проверки
+            held = (self.is_leader and self._renewed_at is not None
+                    and datetime.now() < self._renewed_at
+                    + timedelta(seconds=self.ttl - self.heartbeat_interval))
+
+        if held and not self.is_leader:
+            logger.info(f"Lease {self.name} acquired by {self.holder}")
+            self.is_leader = True
+            self.on_acquired()
+        elif not held and self.is_leader:
+            logger.warning(f"Lease {self.name} lost by {self.holder}")
+            self.is_leader = False
+            self.on_lost()
+        return self.is_leader
+
+    async def _run(self):
+        while True:
+            await self.heartbeat()
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def close(self):
+        """Остановка heartbeat и освобождение аренды"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            self.is_leader = False
+            self.on_lost()
+            async with self.session_factory() as db:
+                await db.run_sync(lambda s: LeaseService(s).release(self.name, self.holder))
@@ -0,0 +1,358 @@
+# services/outbox_service.py
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aiogram import Bot
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from config import (
+    OUTBOX_BATCH_SIZE, OUTBOX_CLAIM_TIMEOUT, OUTBOX_MAX_ATTEMPTS, OUTBOX_POLL_INTERVAL
+)
+from database import AsyncSessionLocal
+from models import Broadcast, OutboxMessage
+from services.lease_service import process_holder_id
+from services.user_service import UserService
+from utils.send_queue import DELIVERY_BLOCKED, DELIVERY_FAILED, DELIVERY_SENT, get_send_queue
+from clock import clock
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PENDING = "pending"
+
+
+class OutboxService:
+    """
+    Персистентная очередь рассылок.
+
+    На каждого получателя рассылки заводится строка outbox_messages со статусом
+    pending/sent/failed/blocked, числом попыток и временем следующей попытки.
+    Отправкой занимается OutboxWorker, поэтому перезапуск бота посреди рассылки
+    не теряет и не дублирует получателей (повторно может уйти не больше одной пачки).
+
+    Пачка в отправке помечена claimed_by/claimed_at захватившего её воркера.
+    Пока воркер жив, он продлевает захват (renew_claim), и другие экземпляры
+    эти строки не берут, сколько бы ни шла отправка (лимиты, RetryAfter).
+    Захват, не продлённый дольше OUTBOX_CLAIM_TIMEOUT, считается брошенным.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def enqueue_broadcast(
+        self,
+        broadcast_id: int,
+        recipients: Iterable[Tuple[int, int]],
+        text: str,
+        commit: bool = True
+    ) -> int:
+        """
+        Постановка рассылки в очередь.
+
+        Получатели читаются и вставляются пачками, поэтому recipients может быть
+        потоком из AudienceService любого размера.
+
+        Args:
+            broadcast_id (int): ID рассылки
+            recipients: Пары (user_id, telegram_id) получателей
+            text (str): Текст сообщения
+            commit (bool): Зафиксировать транзакцию (False — при записи в составе внешней)
+
+        Returns:
+            int: Количество новых получателей (уже поставленные пропускаются)
+        """
+        try:
+            now = clock.now()
+            created = 0
+            recipients = iter(recipients)
+            while True:
+                chunk = dict(islice(recipients, OUTBOX_BATCH_SIZE * 10))
+                if not chunk:
+                    break
+                queued = set(self.db.scalars(
+                    select(OutboxMessage.user_id).filter(
+                        OutboxMessage.broadcast_id == broadcast_id,
+                        OutboxMessage.user_id.in_(list(chunk))
+                    )
+                ))
+                rows = [
+                    {"broadcast_id": broadcast_id, "user_id": user_id, "chat_id": chat_id,
+                     "text": text, "status": OUTBOX_PENDING, "attempts": 0,
+                     "next_attempt_at": now, "created_at": now}
+                    for user_id, chat_id in chunk.items() if user_id not in queued
+                ]
+                if rows:
+                    self.db.execute(insert(OutboxMessage), rows)
+                created += len(rows)
+            if commit:
+                self.db.commit()
+            return created
+        except Exception as e:
+            logger.error(f"Error enqueueing broadcast {broadcast_id}: {e}")
+            self.db.rollback()
+            raise
+
+    def _claimable(self, now: datetime):
+        """Строка свободна или её захват брошен (не продлевался OUTBOX_CLAIM_TIMEOUT)"""
+        return or_(
+            OutboxMessage.claimed_by.is_(None),
+            OutboxMessage.claimed_at <= now - timedelta(seconds=OUTBOX_CLAIM_TIMEOUT)
+        )
+
+    def claim_due(self, claimed_by: str,
+                  limit: int = OUTBOX_BATCH_SIZE) -> List[Tuple[int, int, str]]:
+        """
+        Захват пачки сообщений, готовых к отправке.
+
+        Строки помечаются claimed_by условным UPDATE, поэтому при гонке двух
+        экземпляров каждую строку получает один. Если воркер упадёт до записи
+        результата, захват перестанет продлеваться и пачку возьмут повторно.
+
+        Args:
+            claimed_by (str): Идентификатор воркера
+
+        Returns:
+            List[Tuple[int, int, str]]: Тройки (id, chat_id, text) захваченных сообщений
+        """
+        now = clock.now()
+        ids = self.db.scalars(
+            select(OutboxMessage.id)
+            .filter(
+                OutboxMessage.status == OUTBOX_PENDING,
+                OutboxMessage.next_attempt_at <= now,
+                self._claimable(now)
+            )
+            .order_by(OutboxMessage.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+        rows = []
+        if ids:
+            self.db.execute(
+                update(OutboxMessage)
+                .where(and_(OutboxMessage.id.in_(ids),
+                            OutboxMessage.status == OUTBOX_PENDING,
+                            self._claimable(now)))
+                .values(claimed_by=claimed_by, claimed_at=now)
+            )
+            # Строки, которые успел перехватить другой экземпляр, сюда не попадут
+            rows = self.db.execute(
+                select(OutboxMessage.id, OutboxMessage.chat_id, OutboxMessage.text)
+                .filter(
+                    OutboxMessage.id.in_(ids),
+                    OutboxMessage.claimed_by == claimed_by,
+                    OutboxMessage.claimed_at == now
+                )
+                .order_by(OutboxMessage.id)
+            ).all()
+        self.db.commit()
+        return [tuple(row) for row in rows]
+
+    def renew_claim(self, message_ids: Iterable[int], claimed_by: str) -> int:
+        """Продление захвата строк, которые воркер ещё отправляет; возвращает число продлённых"""
+        renewed = self.db.execute(
+            update(OutboxMessage)
+            .where(and_(OutboxMessage.id.in_(list(message_ids)),
+                        OutboxMessage.claimed_by == claimed_by))
+            .values(claimed_at=clock.now())
+        ).rowcount
+        self.db.commit()
+        return renewed
+
+    def record_results(self, results: Iterable[Tuple[int, str]], claimed_by: str):
+        """
+        Запись итогов отправки пачки и снятие захвата.
+
+        Учитываются только строки, которые всё ещё захвачены этим воркером:
+        если захват был признан брошенным и строку взял другой экземпляр,
+        её судьбу решает он. Неудачная отправка откладывается с экспоненциальной
+        задержкой и после OUTBOX_MAX_ATTEMPTS попыток получает статус failed.
+
+        Args:
+            results: Пары (id сообщения, статус доставки из SendQueue)
+            claimed_by (str): Идентификатор воркера (см. claim_due)
+        """
+        now = clock.now()
+        results = list(results)
+        owned = set(self.db.scalars(
+            select(OutboxMessage.id).filter(
+                OutboxMessage.id.in_([message_id for message_id, _ in results]),
+                OutboxMessage.claimed_by == claimed_by
+            )
+        ))
+        if len(owned) < len(results):
+            logger.warning(f"Outbox claim lost for {len(results) - len(owned)} messages")
+        by_status: Dict[str, List[int]] = {}
+        for message_id, status in results:
+            if message_id in owned:
+                by_status.setdefault(status, []).append(message_id)
+        blocked_chat_ids: List[int] = []
+        released = {"claimed_by": None, "claimed_at": None}
+
+        if by_status.get(DELIVERY_SENT):
+            self.db.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_(by_status[DELIVERY_SENT]))
+                .values(status=DELIVERY_SENT, attempts=OutboxMessage.attempts + 1,
+                        sent_at=now, **released)
+            )
+        if by_status.get(DELIVERY_BLOCKED):
+            self.db.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_(by_status[DELIVERY_BLOCKED]))
+                .values(status=DELIVERY_BLOCKED, attempts=OutboxMessage.attempts + 1,
+                        last_error="bot was blocked by the user", **released)
+            )
+            blocked_chat_ids = self.db.scalars(
+                select(OutboxMessage.chat_id)
+                .filter(OutboxMessage.id.in_(by_status[DELIVERY_BLOCKED]))
+            ).all()
+        failed_ids = by_status.get(DELIVERY_FAILED, [])
+        if failed_ids:
+            failed = self.db.scalars(
+                select(OutboxMessage).filter(OutboxMessage.id.in_(failed_ids))
+            )
+            for message in failed:
+                message.attempts += 1
+                message.last_error = "send failed"
+                message.claimed_by = message.claimed_at = None
+                if message.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    message.status = DELIVERY_FAILED
+                else:
+                    delay = min(30 * 2 ** message.attempts, 3600)
+                    message.next_attempt_at = now + timedelta(seconds=delay)
+        self.db.commit()
+
+        # Заблокировавшие бота исключаются из следующих рассылок
+        if blocked_chat_ids:
+            UserService(self.db).mark_unreachable(blocked_chat_ids)
+
+    def get_broadcast_progress(self, broadcast_id: int) -> Optional[Dict]:
+        """
+        Прогресс рассылки.
+
+        Returns:
+            Optional[Dict]: total, pending, sent, failed, blocked, started_at,
+            last_sent_at и throughput (сообщений в секунду) или None,
+            если рассылка не найдена
+        """
+        broadcast = self.db.get(Broadcast, broadcast_id)
+        if not broadcast:
+            return None
+
+        progress = {OUTBOX_PENDING: 0, DELIVERY_SENT: 0, DELIVERY_FAILED: 0, DELIVERY_BLOCKED: 0}
+        last_sent_at = None
+        rows = self.db.execute(
+            select(OutboxMessage.status, func.count(), func.max(OutboxMessage.sent_at))
+            .filter(OutboxMessage.broadcast_id == broadcast_id)
+            .group_by(OutboxMessage.status)
+        ).all()
+        for status, count, max_sent_at in rows:
+            progress[status] = count
+            if status == DELIVERY_SENT:
+                last_sent_at = max_sent_at
+
+        throughput = 0.0
+        if last_sent_at and broadcast.created_at:
+            elapsed = (last_sent_at - broadcast.created_at).total_seconds()
+            sent = progress[DELIVERY_SENT]
+            throughput = sent / elapsed if elapsed > 0 else float(sent)
+
+        progress.update(
+            total=sum(count for _, count, _ in rows),
+            started_at=broadcast.created_at,
+            last_sent_at=last_sent_at,
+            throughput=throughput
+        )
+        return progress
+
+
+class OutboxWorker:
+    """
+    Фоновый воркер, разбирающий outbox_messages.
+
+    Забирает готовые к отправке сообщения пачками, отправляет их через
+    SendQueue и записывает результат. Пока пачка отправляется, захват её строк
+    продлевается каждые OUTBOX_CLAIM_TIMEOUT / 4 секунд. При старте сразу
+    продолжает рассылки, прерванные перезапуском (после истечения их захвата).
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        session_factory=AsyncSessionLocal,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL
+    ):
+        self.bot = bot
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.worker_id = process_holder_id()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def process_batch(self) -> int:
+        """Отправка одной пачки; возвращает число обработанных сообщений"""
+        async with self.session_factory() as db:
+            batch = await db.run_sync(
+                lambda s: OutboxService(s).claim_due(self.worker_id, self.batch_size)
+            )
+        if not batch:
+            return 0
+
+        send_queue = get_send_queue(self.bot)
+        message_ids = [message_id for message_id, _, _ in batch]
+        heartbeat = asyncio.create_task(self._renew_claim(message_ids))
+        try:
+            statuses = await asyncio.gather(
+                *(send_queue.enqueue(chat_id, text) for _, chat_id, text in batch)
+            )
+        finally:
+            heartbeat.cancel()
+
+        async with self.session_factory() as db:
+            await db.run_sync(
+                lambda s: OutboxService(s).record_results(
+                    zip(message_ids, statuses),
+                    self.worker_id
+                )
+            )
+        return len(batch)
+
+    async def _renew_claim(self, message_ids: List[int]):
+        """Продление захвата пачки, пока идёт её отправка"""
+        while True:
+            await asyncio.sleep(OUTBOX_CLAIM_TIMEOUT / 4)
+            try:
+                async with self.session_factory() as db:
+                    await db.run_sync(
+                        lambda s: OutboxService(s).renew_claim(message_ids, self.worker_id)
+                    )
+            except Exception as e:
+                logger.error(f"Error renewing outbox claim: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.process_batch()
+            except Exception as e:
+                logger.error(f"Error processing outbox: {e}")
+                processed = 0
+            if not processed:
+                await asyncio.sleep(self.poll_interval)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,10 +1,8 @@
 # services/registration_service.py
-from database import SessionLocal
+from sqlalchemy import select
+from database import AsyncSessionLocal
 from models import User, Staff
 
-def is_registered(telegram_id: int) -> bool:
-    session = SessionLocal()
-    try:
-        return session.query(User).filter_by(telegram_id=telegram_id).first() is not None
-    finally:
-        session.close()
+async def is_registered(telegram_id: int) -> bool:
+    async with AsyncSessionLocal() as session:
+        return await session.scalar(select(User.id).filter_by(telegram_id=telegram_id)) is not None
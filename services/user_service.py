@@ -1,9 +1,12 @@
 # services/user_service.py
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, update
 from models import User, Role, UserRole
-from typing import List, Optional
+from utils.identity_cache import identity_cache
+from utils.segment_cache import segment_cache
+from typing import Iterable, List, Optional
 import logging
+from clock import clock
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +24,7 @@ class UserService:
             )
             self.db.add(user)
             self.db.commit()
+            segment_cache.invalidate_users()
             self.db.refresh(user)
             return user
         except Exception as e:
@@ -53,6 +57,7 @@ class UserService:
             if user and role and role not in user.roles:
                 user.roles.append(role)
                 self.db.commit()
+                identity_cache.invalidate(user.telegram_id)
                 return True
             return False
         except Exception as e:
@@ -69,6 +74,7 @@ class UserService:
             if user and role and role in user.roles:
                 user.roles.remove(role)
                 self.db.commit()
+                identity_cache.invalidate(user.telegram_id)
                 return True
             return False
         except Exception as e:
@@ -81,9 +87,13 @@ class UserService:
         try:
             user = self.db.query(User).filter(User.id == user_id).first()
             if user:
+                old_telegram_id = user.telegram_id
                 for key, value in kwargs.items():
                     setattr(user, key, value)
                 self.db.commit()
+                identity_cache.invalidate(old_telegram_id)
+                identity_cache.invalidate(user.telegram_id)
+                segment_cache.invalidate_users()
                 self.db.refresh(user)
                 return user
             return None
@@ -99,6 +109,8 @@ class UserService:
             if user:
                 user.is_active = False
                 self.db.commit()
+                identity_cache.invalidate(user.telegram_id)
+                segment_cache.invalidate_users()
                 return True
             return False
         except Exception as e:
@@ -106,6 +118,34 @@ class UserService:
             self.db.rollback()
             return False
 
+    def mark_unreachable(self, telegram_ids: Iterable[int]) -> int:
+        """
+        Отметка пользователей, заблокировавших бота.
+
+        Такие пользователи исключаются из рассылок и напоминаний,
+        пока снова не напишут боту (см. DbSessionMiddleware).
+        """
+        telegram_ids = list(set(telegram_ids))
+        if not telegram_ids:
+            return 0
+        try:
+            marked = self.db.execute(
+                update(User)
+                .where(and_(User.telegram_id.in_(telegram_ids), User.unreachable_since.is_(None)))
+                .values(unreachable_since=clock.now())
+            ).rowcount
+            self.db.commit()
+            for telegram_id in telegram_ids:
+                identity_cache.invalidate(telegram_id)
+            if marked:
+                segment_cache.invalidate_users()
+                logger.info(f"Marked {marked} users as unreachable")
+            return marked
+        except Exception as e:
+            logger.error(f"Error marking users unreachable: {e}")
+            self.db.rollback()
+            return 0
+
     def get_user_roles(self, user_id: int) -> List[str]:
         """Получение списка ролей пользователя"""
         user = self.db.query(User).filter(User.id == user_id).first()
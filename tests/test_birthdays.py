@@ -0,0 +1,99 @@
+import pytest
+from datetime import date
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import sessionmaker
+from models import Base, Staff, birthday_ordinal
+from services.birthday_service import birthday_window, days_until_birthday
+from utils.birthday_index import BirthdayIndex
+
+BIRTHDAYS = [
+    date(1990, 12, 30), date(1985, 1, 2), date(1992, 2, 29), date(1988, 3, 1), date(1991, 6, 15)
+]
+
+
+def _staff_in_window(session, start, days):
+    query = select(Staff.birthday).filter(birthday_window(Staff.birthday_md, start, days))
+    return sorted(session.scalars(query).all())
+
+
+@pytest.fixture
+def testing_session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/test_birthdays.db")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_birthday_window_by_ordinal_index(testing_session_factory):
+    with testing_session_factory() as session:
+        session.add(Staff(first_name="Орм", patronymic="Тест", birthday=BIRTHDAYS[0],
+                          personnel_number=1))
+        # Вставка через Core тоже заполняет birthday_md
+        session.execute(insert(Staff), [
+            {"first_name": f"Имя{i}", "patronymic": "Тест", "birthday": birthday,
+             "personnel_number": i + 2}
+            for i, birthday in enumerate(BIRTHDAYS[1:])
+        ])
+        session.commit()
+        assert session.scalar(select(Staff.birthday_md).filter_by(personnel_number=1)) == 1230
+
+        # Переход через Новый год
+        assert _staff_in_window(session, date(2023, 12, 28), 7) == [
+            date(1985, 1, 2), date(1990, 12, 30)
+        ]
+        # 29 февраля в невисокосный год попадает в окно, заканчивающееся 28-го
+        assert _staff_in_window(session, date(2023, 2, 25), 3) == [date(1992, 2, 29)]
+        assert _staff_in_window(session, date(2024, 2, 25), 3) == []
+        assert _staff_in_window(session, date(2023, 3, 1), 0) == [date(1988, 3, 1)]
+
+        plan = session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM staff WHERE birthday_md BETWEEN 101 AND 131"
+        )).all()
+        assert "ix_staff_birthday_md" in " ".join(str(row) for row in plan)
+
+
+def test_days_until_birthday_handles_leap_day():
+    assert days_until_birthday(date(1992, 2, 29), date(2023, 2, 27)) == 1
+    assert days_until_birthday(date(1992, 2, 29), date(2024, 2, 27)) == 2
+    assert days_until_birthday(date(1990, 1, 2), date(2023, 12, 30)) == 3
+    assert days_until_birthday(date(1990, 6, 15), date(2023, 6, 15)) == 0
+
+
+def test_birthday_index_range_queries():
+    index = BirthdayIndex()
+    index.rebuild([(i + 1, birthday_ordinal(birthday)) for i, birthday in enumerate(BIRTHDAYS)])
+
+    assert index.within(7, date(2023, 12, 28)) == [1, 2]
+    assert index.on_date(date(2023, 2, 28)) == [3]
+    assert index.on_date(date(2024, 2, 28)) == []
+    assert index.in_month(6) == [5]
+
+    # Точечные изменения без перестройки
+    index.add(6, date(1999, 6, 1))
+    index.remove(5)
+    index.add(4, date(1988, 6, 20))
+    assert index.in_month(6) == [6, 4]
+    assert index.in_month(3) == []
+    assert len(index) == 5
+
+
+def test_birthday_index_keeps_changes_made_during_rebuild():
+    index = BirthdayIndex()
+    index.rebuild([(1, 1230), (2, 102)])
+
+    class RacingSession:
+        """Сессия, во время запроса которой хендлер добавляет и удаляет сотрудников"""
+
+        def execute(self, query):
+            index.add(3, date(1990, 3, 1))
+            index.remove(1)
+            # Снимок БД сделан до этих изменений
+            return type("Result", (), {"all": lambda self: [(1, 1230), (2, 102)]})()
+
+    reader_view = index.on_date(date(2026, 12, 30))
+    index.rebuild_from(RacingSession())
+
+    assert reader_view == [1]
+    assert index.on_date(date(2026, 3, 1)) == [3]
+    assert index.on_date(date(2026, 12, 30)) == []
+    assert len(index) == 2
@@ -0,0 +1,36 @@
+import pytest
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from benchmarks.fake_bot_api import FakeBotApi, ScriptedUpdates
+
+PORT = 18081
+
+
+@pytest.mark.asyncio
+async def test_fake_bot_api_serves_updates_and_injects_errors():
+    api = FakeBotApi(blocked_chat_ids=[13])
+    runner = await api.start(port=PORT)
+    api_server = TelegramAPIServer.from_base(f"http://127.0.0.1:{PORT}")
+    bot = Bot(token="42:TEST", session=AiohttpSession(api=api_server))
+    try:
+        await ScriptedUpdates([1001, 1002], script=["/menu"]).feed(api, 3)
+        updates = await bot.get_updates(timeout=1)
+        assert [u.message.from_user.id for u in updates] == [1001, 1002, 1001]
+        # Подтверждённые апдейты больше не возвращаются
+        assert await bot.get_updates(offset=updates[-1].update_id + 1, timeout=0) == []
+
+        message = await bot.send_message(1001, "hi")
+        assert message.chat.id == 1001
+
+        with pytest.raises(TelegramForbiddenError):
+            await bot.send_message(13, "hi")
+
+        api.error_429_rate = 1.0
+        with pytest.raises(TelegramRetryAfter):
+            await bot.send_message(1001, "hi")
+        assert api.errors == {403: 1, 429: 1}
+    finally:
+        await bot.session.close()
+        await runner.cleanup()
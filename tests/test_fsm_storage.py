@@ -0,0 +1,105 @@
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from models import Base, FsmRecord
+from utils.fsm_storage import SQLAlchemyStorage
+
+# Базы создаются во временном каталоге теста (tmp_path)
+TEST_DATABASE_URL = "sqlite:///{}/test_fsm.db"
+TEST_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///{}/test_fsm.db"
+
+KEY = StorageKey(bot_id=42, chat_id=1001, user_id=1001)
+
+
+@pytest.fixture
+def async_session_factory(tmp_path):
+    engine = create_engine(TEST_DATABASE_URL.format(tmp_path))
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(TEST_ASYNC_DATABASE_URL.format(tmp_path))
+    yield async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_state_survives_restart(async_session_factory):
+    storage = SQLAlchemyStorage(session_factory=async_session_factory, flush_interval=60)
+    await storage.set_state(KEY, "AddStaff:waiting_for_staff_data")
+    await storage.update_data(KEY, {"fund_id": 7})
+    # До flush запись живёт только в памяти
+    async with async_session_factory() as session:
+        assert await session.get(FsmRecord, storage.key_builder.build(KEY)) is None
+    await storage.close()
+
+    restarted = SQLAlchemyStorage(session_factory=async_session_factory)
+    assert await restarted.get_state(KEY) == "AddStaff:waiting_for_staff_data"
+    assert await restarted.get_data(KEY) == {"fund_id": 7}
+
+    # После state.clear() строка удаляется
+    await restarted.set_state(KEY, None)
+    await restarted.set_data(KEY, {})
+    await restarted.close()
+    async with async_session_factory() as session:
+        assert await session.get(FsmRecord, storage.key_builder.build(KEY)) is None
+
+
+@pytest.mark.asyncio
+async def test_idle_state_expires(async_session_factory):
+    storage = SQLAlchemyStorage(session_factory=async_session_factory, state_ttl=0)
+    await storage.set_state(KEY, "Registration:waiting_for_personnel_number")
+    await storage.flush()
+    await storage.expire()
+
+    assert await storage.get_state(KEY) is None
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_active_unchanged_state_survives_expiry(async_session_factory):
+    storage = SQLAlchemyStorage(session_factory=async_session_factory, flush_interval=60,
+                                state_ttl=3600)
+    await storage.set_state(KEY, "AddStaff:waiting_for_staff_data")
+    await storage.flush()
+    storage_key = storage.key_builder.build(KEY)
+
+    # Состояние не менялось дольше TTL, но диалог продолжается (только чтения)
+    async with async_session_factory() as session:
+        two_hours_ago = datetime.utcnow() - timedelta(hours=2)
+        await session.execute(update(FsmRecord).values(updated_at=two_hours_ago))
+        await session.commit()
+    assert await storage.get_state(KEY) == "AddStaff:waiting_for_staff_data"
+    await storage.flush()
+    await storage.expire()
+    await storage.close()
+
+    restarted = SQLAlchemyStorage(session_factory=async_session_factory)
+    assert await restarted.get_state(KEY) == "AddStaff:waiting_for_staff_data"
+    await restarted.close()
+    async with async_session_factory() as session:
+        assert await session.get(FsmRecord, storage_key) is not None
+
+
+@pytest.mark.asyncio
+async def test_write_through_instances_share_state(async_session_factory):
+    # Два экземпляра бота за балансировщиком (BOT_MODE=webhook)
+    first = SQLAlchemyStorage(session_factory=async_session_factory, write_through=True)
+    second = SQLAlchemyStorage(session_factory=async_session_factory, write_through=True)
+
+    await first.set_state(KEY, "AddStaff:waiting_for_staff_data")
+    await first.update_data(KEY, {"fund_id": 7})
+    assert await second.get_state(KEY) == "AddStaff:waiting_for_staff_data"
+
+    # Смена состояния на втором экземпляре не затирается данными первого
+    await second.set_state(KEY, "AddStaff:confirm")
+    await first.update_data(KEY, {"amount": 500})
+    assert await first.get_state(KEY) == "AddStaff:confirm"
+    assert await second.get_data(KEY) == {"fund_id": 7, "amount": 500}
+
+    await second.set_state(KEY, None)
+    await second.set_data(KEY, {})
+    assert await first.get_state(KEY) is None
+    await first.close()
+    await second.close()
+    async with async_session_factory() as session:
+        assert await session.get(FsmRecord, first.key_builder.build(KEY)) is None
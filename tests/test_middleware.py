@@ -0,0 +1,100 @@
+import pytest
+from datetime import datetime
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Update
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from models import Base, User
+from utils.identity_cache import identity_cache
+from utils.middleware import DbSessionMiddleware
+
+# Базы создаются во временном каталоге теста (tmp_path)
+TEST_DATABASE_URL = "sqlite:///{}/test_middleware.db"
+TEST_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///{}/test_middleware.db"
+
+
+def make_update(update_id: int, telegram_id: int, text: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": telegram_id, "type": "private"},
+            "from": {"id": telegram_id, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    })
+
+
+@pytest.fixture
+def async_session_factory(tmp_path):
+    engine = create_engine(TEST_DATABASE_URL.format(tmp_path))
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), {"telegram_id": 1001, "employee_id": "1001"})
+    async_engine = create_async_engine(TEST_ASYNC_DATABASE_URL.format(tmp_path))
+    identity_cache.clear()
+    yield async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_db_session_middleware_resolves_user_once(async_session_factory):
+    seen = {}
+    router = Router()
+
+    @router.message()
+    async def handler(message, session, user, db_stats):
+        seen["user"] = user
+        seen["session"] = session
+        seen["queries"] = db_stats.queries
+
+    middleware = DbSessionMiddleware(session_factory=async_session_factory)
+    dp = Dispatcher()
+    dp.update.outer_middleware(middleware)
+    dp.include_router(router)
+    bot = Bot(token="42:TEST")
+
+    await dp.feed_update(bot, make_update(1, 1001, "/menu"))
+
+    assert seen["user"].telegram_id == 1001
+    # Пользователь и его роли — единственные запросы за апдейт
+    assert seen["queries"] == 2
+    stats = middleware.get_stats()
+    assert stats["updates"] == 1
+    assert stats["sessions_per_update"] == 1
+
+    # Повторный апдейт обслуживается из identity_cache без запросов к БД
+    await dp.feed_update(bot, make_update(2, 1001, "/menu"))
+    assert seen["user"].telegram_id == 1001
+    assert seen["queries"] == 0
+    assert identity_cache.stats()["hits"] == 1
+    await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_interaction_restores_unreachable_user(async_session_factory):
+    async with async_session_factory() as session:
+        user = await session.scalar(select(User).filter_by(telegram_id=1001))
+        user.unreachable_since = datetime.now()
+        await session.commit()
+
+    seen = {}
+    router = Router()
+
+    @router.message()
+    async def handler(message, user):
+        seen["user"] = user
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(DbSessionMiddleware(session_factory=async_session_factory))
+    dp.include_router(router)
+    bot = Bot(token="42:TEST")
+
+    await dp.feed_update(bot, make_update(1, 1001, "/menu"))
+
+    assert seen["user"].is_reachable
+    async with async_session_factory() as session:
+        user = await session.scalar(select(User).filter_by(telegram_id=1001))
+    assert user.unreachable_since is None
+    await bot.session.close()
@@ -0,0 +1,50 @@
+from datetime import date
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.orm import Session
+
+from models import Staff, User
+from services.birthday_service import birthday_window
+
+# Таблицы в том виде, в каком они были до birthday_md и полей доставки
+OLD_SCHEMA = [
+    "CREATE TABLE staff (id INTEGER PRIMARY KEY, first_name VARCHAR NOT NULL, "
+    "patronymic VARCHAR NOT NULL, birthday DATE NOT NULL, personnel_number INTEGER NOT NULL)",
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, telegram_id INTEGER, username VARCHAR, "
+    "employee_id VARCHAR, full_name VARCHAR, department VARCHAR, birthday DATETIME, "
+    "is_active BOOLEAN, created_at DATETIME)",
+    "CREATE TABLE notifications (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+    "title VARCHAR NOT NULL, message VARCHAR NOT NULL, type VARCHAR NOT NULL, "
+    "is_read BOOLEAN, created_at DATETIME, scheduled_for DATETIME)",
+]
+
+
+def test_migration_backfills_birthday_md_on_existing_tables(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path}/old.db"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        for statement in OLD_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text(
+            "INSERT INTO users (telegram_id, employee_id, birthday, is_active) "
+            "VALUES (1, 'a', '1990-12-30 00:00:00', 1), (2, 'b', NULL, 1)"
+        ))
+        connection.execute(text(
+            "INSERT INTO staff (first_name, patronymic, birthday, personnel_number) "
+            "VALUES ('Имя', 'Тест', '1985-01-02', 1)"
+        ))
+
+    # env.py берёт адрес базы из config
+    monkeypatch.setattr("config.DATABASE_URL", url)
+    alembic_cfg = Config()
+    alembic_cfg.set_main_option("script_location", "migrations")
+    command.upgrade(alembic_cfg, "head")
+
+    columns = {column["name"] for column in inspect(engine).get_columns("notifications")}
+    assert {"delivered_at", "dedup_key", "attempts", "failed_at"} <= columns
+    with Session(engine) as session:
+        assert session.scalars(select(User.birthday_md).order_by(User.id)).all() == [1230, None]
+        window = birthday_window(Staff.birthday_md, date(2023, 12, 28), 7)
+        assert session.scalars(select(Staff.personnel_number).filter(window)).all() == [1]
@@ -0,0 +1,116 @@
+import pytest
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from models import Base, Broadcast, OutboxMessage, User
+from services.outbox_service import OutboxService, OutboxWorker
+from utils.send_queue import DELIVERY_SENT, get_send_queue
+
+# Базы создаются во временном каталоге теста (tmp_path)
+TEST_DATABASE_URL = "sqlite:///{}/test_outbox.db"
+TEST_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///{}/test_outbox.db"
+
+
+class FakeBot:
+    """Имитация bot.send_message: пользователь с chat_id=1003 заблокировал бота"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id == 1003:
+            raise TelegramForbiddenError(method=SendMessage(chat_id=chat_id, text=text),
+                                         message="Forbidden: bot was blocked by the user")
+        self.sent.append(chat_id)
+
+
+@pytest.fixture
+def async_session_factory(tmp_path):
+    engine = create_engine(TEST_DATABASE_URL.format(tmp_path))
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(TEST_ASYNC_DATABASE_URL.format(tmp_path))
+    yield async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    engine.dispose()
+
+
+async def _outbox(db, method, *args):
+    """Вызов метода OutboxService в синхронной сессии"""
+    return await db.run_sync(lambda s: getattr(OutboxService(s), method)(*args))
+
+
+async def _add_broadcast(db, users):
+    db.add_all(users)
+    await db.flush()
+    broadcast = Broadcast(sender_id=users[0].id, title="Сбор", message="Текст",
+                          broadcast_type="fund_reminder")
+    db.add(broadcast)
+    await db.commit()
+    return broadcast, [(u.id, u.telegram_id) for u in users]
+
+
+@pytest.mark.asyncio
+async def test_outbox_resumes_after_crash(async_session_factory, monkeypatch):
+    async with async_session_factory() as db:
+        broadcast, recipients = await _add_broadcast(db, [
+            User(telegram_id=1000 + i, employee_id=f"E{i}", full_name=f"User {i}")
+            for i in range(6)
+        ])
+
+        assert await _outbox(db, "enqueue_broadcast", broadcast.id, recipients, "hi") == 6
+        # Повторная постановка не дублирует получателей
+        assert await _outbox(db, "enqueue_broadcast", broadcast.id, recipients, "hi") == 0
+
+        # «Падение» после захвата пачки: результат не записан
+        monkeypatch.setattr("services.outbox_service.OUTBOX_CLAIM_TIMEOUT", 0)
+        assert len(await _outbox(db, "claim_due", "crashed-worker", 3)) == 3
+
+    bot = FakeBot()
+    worker = OutboxWorker(bot, session_factory=async_session_factory, batch_size=4)
+    while await worker.process_batch():
+        pass
+    await get_send_queue(bot).close()
+
+    assert sorted(bot.sent) == [1000, 1001, 1002, 1004, 1005]
+    async with async_session_factory() as db:
+        progress = await _outbox(db, "get_broadcast_progress", broadcast.id)
+    assert progress["total"] == 6
+    assert progress["sent"] == 5
+    assert progress["blocked"] == 1
+    assert progress["pending"] == 0
+
+    # Заблокировавший бота исключается из следующих рассылок
+    async with async_session_factory() as db:
+        blocked = await db.scalar(select(User).filter_by(telegram_id=1003))
+    assert blocked.unreachable_since is not None
+
+
+@pytest.mark.asyncio
+async def test_in_flight_batch_is_not_reclaimed(async_session_factory, monkeypatch):
+    async with async_session_factory() as db:
+        broadcast, recipients = await _add_broadcast(db, [
+            User(telegram_id=2000 + i, employee_id=f"F{i}", full_name=f"User {i}")
+            for i in range(3)
+        ])
+        await _outbox(db, "enqueue_broadcast", broadcast.id, recipients, "hi")
+
+        claimed = await _outbox(db, "claim_due", "worker-a", 10)
+        assert len(claimed) == 3
+        # Отправка идёт дольше OUTBOX_CLAIM_TIMEOUT, но захват продлевается
+        an_hour_ago = datetime.now() - timedelta(hours=1)
+        await db.execute(update(OutboxMessage).values(claimed_at=an_hour_ago))
+        await db.commit()
+        assert await _outbox(db, "renew_claim", [m[0] for m in claimed], "worker-a") == 3
+        assert await _outbox(db, "claim_due", "worker-b", 10) == []
+
+        # Брошенный захват переходит другому воркеру, поздний результат первого не учитывается
+        monkeypatch.setattr("services.outbox_service.OUTBOX_CLAIM_TIMEOUT", 0)
+        assert len(await _outbox(db, "claim_due", "worker-b", 10)) == 3
+        results = [(message_id, DELIVERY_SENT) for message_id, _, _ in claimed]
+        await _outbox(db, "record_results", results, "worker-a")
+        progress = await _outbox(db, "get_broadcast_progress", broadcast.id)
+        assert progress["pending"] == 3
+        await _outbox(db, "record_results", results, "worker-b")
+        progress = await _outbox(db, "get_broadcast_progress", broadcast.id)
+        assert progress["sent"] == 3
@@ -0,0 +1,433 @@
+import asyncio
+import time
+import pytest
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from clock import SimulatedClock, clock
+from database import DbStats, current_db_stats
+from models import Base, Donation, Fund, JobRun, Notification, Role, User
+from scheduler import NotificationScheduler
+from services.lease_service import SCHEDULER_LEASE, LeaderLease
+from utils.delivery_planner import DeliveryPlanner
+from utils.due_timer import due_timer
+from utils.send_queue import get_send_queue
+
+# Базы создаются во временном каталоге теста (tmp_path)
+TEST_DATABASE_URL = "sqlite:///{}/test_scheduler.db"
+TEST_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///{}/test_scheduler.db"
+
+
+class FakeBot:
+    """Имитация bot.send_message: для chat_id=1003 отправка падает"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id == 1003:
+            raise ValueError("Bad Request: chat not found")
+        self.sent.append(chat_id)
+
+
+@pytest.fixture
+def async_session_factory(tmp_path):
+    engine = create_engine(TEST_DATABASE_URL.format(tmp_path))
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(TEST_ASYNC_DATABASE_URL.format(tmp_path))
+    yield async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def sync_session_factory(tmp_path):
+    # Сессии для задач, выполняемых в пуле потоков (executor_mode="thread")
+    return sessionmaker(bind=create_engine(TEST_DATABASE_URL.format(tmp_path)))
+
+
+@pytest.fixture
+def server_utc(monkeypatch):
+    """Часовой пояс сервера — UTC"""
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.asyncio
+async def test_scheduled_notifications_delivered_once(async_session_factory, monkeypatch):
+    monkeypatch.setattr("scheduler.NOTIFICATION_BATCH_SIZE", 2)
+    now = datetime.now()
+    async with async_session_factory() as db:
+        users = [User(telegram_id=1000 + i, employee_id=f"E{i}", full_name=f"User {i}")
+                 for i in range(5)]
+        db.add_all(users)
+        await db.flush()
+        for user in users:
+            db.add(Notification(user_id=user.id, title="Сбор", message="Текст", type="fund",
+                                scheduled_for=now - timedelta(minutes=1)))
+        # Ещё не наступившее уведомление не отправляется
+        db.add(Notification(user_id=users[0].id, title="Позже", message="Текст", type="fund",
+                            scheduled_for=now + timedelta(hours=1)))
+        await db.commit()
+
+    bot = FakeBot()
+    scheduler = NotificationScheduler(bot, session_factory=async_session_factory)
+    await scheduler.send_scheduled_broadcasts()
+    await scheduler.send_scheduled_broadcasts()
+    await get_send_queue(bot).close()
+
+    # Повторный запуск не дублирует отправленное, неудачная отправка повторяется
+    assert sorted(bot.sent) == [1000, 1001, 1002, 1004]
+    async with async_session_factory() as db:
+        pending = (await db.scalars(
+            select(Notification.user_id).filter(Notification.delivered_at.is_(None))
+        )).all()
+    assert len(pending) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_notification_gives_up_after_max_attempts(async_session_factory,
+                                                               monkeypatch):
+    monkeypatch.setattr("scheduler.SCHEDULED_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr("scheduler.SCHEDULED_RETRY_INTERVAL", 60)
+    simulated = SimulatedClock(datetime(2030, 1, 1, 12))
+    async with async_session_factory() as db:
+        user = User(telegram_id=1003, employee_id="F1", full_name="Нет чата")
+        db.add(user)
+        await db.flush()
+        db.add(Notification(user_id=user.id, title="Сбор", message="Текст", type="fund",
+                            scheduled_for=simulated.now()))
+        await db.commit()
+
+    bot = FakeBot()
+    scheduler = NotificationScheduler(bot, session_factory=async_session_factory)
+    retries = []
+    with clock.use(simulated):
+        for _ in range(5):
+            await scheduler.send_scheduled_broadcasts()
+            async with async_session_factory() as db:
+                notification = (await db.scalars(select(Notification))).one()
+            retries.append(notification.scheduled_for)
+            simulated.set(notification.scheduled_for)
+    await get_send_queue(bot).close()
+    due_timer.clear()
+
+    # Повторы через 60 и 120 секунд, третья неудача — окончательная
+    start = datetime(2030, 1, 1, 12)
+    assert retries[:2] == [start + timedelta(seconds=60), start + timedelta(seconds=180)]
+    assert (notification.attempts, notification.failed_at, notification.delivered_at) == \
+        (3, start + timedelta(seconds=180), None)
+    async with async_session_factory() as db:
+        runs = (await db.scalars(select(JobRun))).all()
+    assert [run.errors for run in runs] == [1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_idle_dispatcher_wakes_are_not_recorded(async_session_factory):
+    bot = FakeBot()
+    scheduler = NotificationScheduler(bot, session_factory=async_session_factory)
+    await scheduler.send_scheduled_broadcasts()
+    async with async_session_factory() as db:
+        user = User(telegram_id=4200, employee_id="I1", full_name="Получатель")
+        db.add(user)
+        await db.flush()
+        db.add(Notification(user_id=user.id, title="Сбор", message="Текст", type="fund",
+                            scheduled_for=datetime.now() - timedelta(minutes=1)))
+        await db.commit()
+    await scheduler.send_scheduled_broadcasts()
+    await scheduler.send_scheduled_broadcasts()
+    await get_send_queue(bot).close()
+
+    # Записан только запуск, который отправил уведомление
+    async with async_session_factory() as db:
+        runs = (await db.scalars(select(JobRun))).all()
+    assert [(run.job, run.rows_scanned, run.messages_sent) for run in runs] == \
+        [("scheduled_broadcasts", 1, 1)]
+
+
+@pytest.mark.asyncio
+async def test_unpaid_reminders_single_pass(async_session_factory, sync_session_factory,
+                                            monkeypatch):
+    monkeypatch.setattr("scheduler.NOTIFICATION_BATCH_SIZE", 2)
+    async with async_session_factory() as db:
+        users = [User(telegram_id=2000 + i, employee_id=f"U{i}", full_name=f"User {i}")
+                 for i in range(4)]
+        db.add_all(users)
+        await db.flush()
+        end_date = datetime.now() + timedelta(days=7)
+        event = Fund(title="Корпоратив", target_amount=1000, end_date=end_date, fund_type="event",
+                     treasurer_id=users[0].id)
+        birthday = Fund(title="ДР", target_amount=1000, end_date=end_date, fund_type="birthday",
+                        treasurer_id=users[0].id, birthday_person_id=users[3].id)
+        closed = Fund(title="Закрыт", target_amount=1000, end_date=end_date, fund_type="event",
+                      treasurer_id=users[0].id, is_active=False)
+        db.add_all([event, birthday, closed])
+        await db.flush()
+        db.add_all([Donation(fund_id=event.id, donor_id=users[1].id, amount=100),
+                    Donation(fund_id=birthday.id, donor_id=users[2].id, amount=100)])
+        await db.commit()
+        user_ids = [u.id for u in users]
+
+    scheduler = NotificationScheduler(session_factory=async_session_factory,
+                                      sync_session_factory=sync_session_factory)
+    stats = DbStats()
+    token = current_db_stats.set(stats)
+    try:
+        await scheduler.remind_unpaid_participants()
+    finally:
+        current_db_stats.reset(token)
+
+    async with async_session_factory() as db:
+        reminders = (await db.execute(select(Notification.user_id, Notification.message))).all()
+    assert sorted(reminders) == sorted([
+        (user_ids[0], "Не забудьте внести средства в сбор 'Корпоратив'"),
+        (user_ids[2], "Не забудьте внести средства в сбор 'Корпоратив'"),
+        (user_ids[3], "Не забудьте внести средства в сбор 'Корпоратив'"),
+        (user_ids[0], "Не забудьте внести средства в сбор 'ДР'"),
+        (user_ids[1], "Не забудьте внести средства в сбор 'ДР'"),
+    ])
+    # Один SELECT и по одному пакетному INSERT на пачку, независимо от числа сборов,
+    # плюс запись о запуске в job_runs
+    assert 0 < stats.queries <= 1 + 3 + 1
+    async with async_session_factory() as db:
+        run = await db.scalar(select(JobRun))
+    assert (run.job, run.rows_scanned, run.notifications_created, run.errors) == \
+        ("unpaid_reminder", 5, 5, 0)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("executor_mode", ["thread", "loop"])
+async def test_scheduler_jobs_are_idempotent(async_session_factory, sync_session_factory,
+                                             executor_mode):
+    async with async_session_factory() as db:
+        admin_role = Role(name="admin")
+        # Именинник сам администратор, но о своём дне рождения не узнаёт
+        treasurer = User(telegram_id=3000, employee_id="T1", full_name="Казначей",
+                         birthday=datetime.now() + timedelta(days=1), roles=[admin_role])
+        payer = User(telegram_id=3001, employee_id="T2", full_name="Участник")
+        admin = User(telegram_id=3002, employee_id="T3", full_name="Админ", roles=[admin_role])
+        db.add_all([treasurer, payer, admin])
+        await db.flush()
+        db.add(Fund(title="Сбор", target_amount=1000,
+                    end_date=datetime.now() + timedelta(days=1, hours=1),
+                    fund_type="event", treasurer_id=treasurer.id))
+        await db.commit()
+
+    scheduler = NotificationScheduler(session_factory=async_session_factory,
+                                      sync_session_factory=sync_session_factory,
+                                      executor_mode=executor_mode)
+    for _ in range(2):
+        await scheduler.check_upcoming_birthdays()
+        await scheduler.check_fund_deadlines()
+        await scheduler.remind_unpaid_participants()
+
+    async with async_session_factory() as db:
+        kinds = (await db.scalars(select(Notification.dedup_key))).all()
+        birthday_recipients = (await db.scalars(
+            select(Notification.user_id).filter(Notification.type == "birthday")
+        )).all()
+    # Повторный прогон в тот же день ничего не добавляет
+    assert sorted(key.split(":")[0] for key in kinds) == \
+        ["birthday", "fund_deadline", "fund_unpaid", "fund_unpaid", "fund_unpaid"]
+    assert birthday_recipients == [admin.id]
+
+@pytest.mark.asyncio
+async def test_missed_daily_job_runs_once_after_restart(tmp_path, monkeypatch):
+    jobstore_engine = create_engine(f"sqlite:///{tmp_path}/jobs.db")
+    first = NotificationScheduler(jobstore_engine=jobstore_engine)
+    first.start()
+    first.scheduler.pause()
+    # Процесс лежал в REMINDER_HOUR: сохранённый запуск остался в прошлом
+    an_hour_ago = datetime.now(first.scheduler.timezone) - timedelta(hours=1)
+    first.scheduler.modify_job("birthday_check", next_run_time=an_hour_ago)
+    first.shutdown()
+
+    calls = []
+
+    async def check_upcoming_birthdays(self):
+        calls.append(self)
+
+    monkeypatch.setattr(NotificationScheduler, "check_upcoming_birthdays", check_upcoming_birthdays)
+    second = NotificationScheduler(jobstore_engine=jobstore_engine)
+    second.start()
+    await asyncio.sleep(0.3)
+    next_run = second.scheduler.get_job("birthday_check").next_run_time
+    second.shutdown()
+
+    assert calls == [second]
+    assert next_run > datetime.now(next_run.tzinfo)
+
+@pytest.mark.asyncio
+async def test_dispatcher_wakes_for_new_earlier_notification(async_session_factory):
+    bot = FakeBot()
+    scheduler = NotificationScheduler(bot, session_factory=async_session_factory)
+    dispatcher = asyncio.create_task(scheduler.dispatch_scheduled())
+    try:
+        await asyncio.sleep(0.1)
+        due = datetime.now() + timedelta(seconds=0.2)
+        async with async_session_factory() as db:
+            user = User(telegram_id=4000, employee_id="D1", full_name="Получатель")
+            db.add(user)
+            await db.flush()
+            db.add(Notification(user_id=user.id, title="Сбор", message="Текст", type="fund",
+                                scheduled_for=due))
+            await db.commit()
+        # Диспетчер спит без ограничения по опросу БД и просыпается по push
+        due_timer.push(due)
+        await asyncio.sleep(0.5)
+    finally:
+        dispatcher.cancel()
+        await get_send_queue(bot).close()
+
+    assert bot.sent == [4000]
+    assert len(due_timer) == 0
+
+@pytest.mark.asyncio
+async def test_dispatcher_picks_up_notifications_from_other_instances(async_session_factory,
+                                                                      monkeypatch):
+    monkeypatch.setattr("scheduler.SCHEDULED_DISPATCH_MAX_SLEEP", 0.3)
+    bot = FakeBot()
+    scheduler = NotificationScheduler(bot, session_factory=async_session_factory)
+    dispatcher = asyncio.create_task(scheduler.dispatch_scheduled())
+    try:
+        await asyncio.sleep(0.1)
+        # Уведомления записал другой экземпляр: в куче этого процесса их нет
+        now = datetime.now()
+        async with async_session_factory() as db:
+            users = [User(telegram_id=4100 + i, employee_id=f"O{i}", full_name="Получатель")
+                     for i in range(2)]
+            db.add_all(users)
+            await db.flush()
+            db.add(Notification(user_id=users[0].id, title="Сейчас", message="Текст", type="fund",
+                                scheduled_for=now))
+            db.add(Notification(user_id=users[1].id, title="Позже", message="Текст", type="fund",
+                                scheduled_for=now + timedelta(seconds=1)))
+            await db.commit()
+        await asyncio.sleep(0.5)
+        assert bot.sent == [4100]
+        await asyncio.sleep(0.8)
+    finally:
+        dispatcher.cancel()
+        await get_send_queue(bot).close()
+
+    assert bot.sent == [4100, 4101]
+
+@pytest.mark.asyncio
+async def test_only_one_instance_holds_scheduler_lease(async_session_factory):
+    events = []
+
+    def instance(name):
+        return LeaderLease(SCHEDULER_LEASE, session_factory=async_session_factory, ttl=0.3,
+                           holder=name,
+                           on_acquired=lambda: events.append(f"{name}+"),
+                           on_lost=lambda: events.append(f"{name}-"))
+
+    first, second = instance("first"), instance("second")
+    assert await first.heartbeat()
+    assert not await second.heartbeat()
+    assert await first.heartbeat()
+
+    # Лидер перестал продлевать аренду: после истечения срока её забирает резерв
+    await asyncio.sleep(0.4)
+    assert await second.heartbeat()
+    assert not await first.heartbeat()
+
+    # Штатная остановка освобождает аренду сразу
+    await second.close()
+    assert await first.heartbeat()
+    assert events == ["first+", "second+", "first-", "second-", "first+"]
+
+@pytest.mark.asyncio
+async def test_leader_steps_down_before_lease_expires(async_session_factory):
+    events = []
+    lease = LeaderLease(SCHEDULER_LEASE, session_factory=async_session_factory, ttl=1.0,
+                        heartbeat_interval=0.4, on_acquired=lambda: events.append("+"),
+                        on_lost=lambda: events.append("-"))
+    assert await lease.heartbeat()
+
+    def unavailable():
+        raise ConnectionError("database is unavailable")
+
+    # БД недоступна: аренда своя, пока до её истечения больше интервала проверки
+    lease.session_factory = unavailable
+    assert await lease.heartbeat()
+    await asyncio.sleep(0.7)
+    assert not await lease.heartbeat()
+    assert events == ["+", "-"]
+
+@pytest.mark.asyncio
+async def test_scheduler_jobs_follow_simulated_clock(async_session_factory, sync_session_factory):
+    async with async_session_factory() as db:
+        user = User(telegram_id=3500, employee_id="S1", full_name="Именинник",
+                    birthday=datetime(1990, 7, 2))
+        admin = User(telegram_id=3501, employee_id="S2", full_name="Админ",
+                     roles=[Role(name="admin")])
+        db.add_all([user, admin])
+        await db.commit()
+
+    scheduler = NotificationScheduler(session_factory=async_session_factory,
+                                      sync_session_factory=sync_session_factory)
+    simulated = SimulatedClock(datetime(2030, 6, 25, 6))
+    with clock.use(simulated):
+        await scheduler.check_upcoming_birthdays()  # до ДР неделя — вне окна
+        simulated.advance(timedelta(days=6))
+        await scheduler.check_upcoming_birthdays()
+    assert clock.now().year < 2030
+
+    async with async_session_factory() as db:
+        notification = (await db.scalars(select(Notification))).one()
+        runs = (await db.scalars(
+            select(JobRun.started_at).filter(JobRun.job == "birthday_check")
+        )).all()
+    assert notification.user_id == admin.id
+    assert notification.dedup_key.endswith(":2030-07-01")
+    assert notification.scheduled_for.date() == date(2030, 7, 1)
+    assert sorted(run.date() for run in runs) == [date(2030, 6, 25), date(2030, 7, 1)]
+
+
+def test_delivery_planner_spreads_wave_by_department_timezone(server_utc):
+    planner = DeliveryPlanner(hour=10, window_minutes=30, slot_seconds=60,
+                              department_timezones={"Екатеринбург": "Asia/Yekaterinburg"},
+                              default_timezone="Europe/Moscow", plan_hour=3)
+    day = date(2026, 3, 2)
+    # 10:00 по Москве в UTC
+    start = datetime(2026, 3, 2, 7)
+
+    slots = [planner.slot(user_id, "Бухгалтерия", day) for user_id in range(1, 301)]
+    assert all(start <= slot < start + timedelta(minutes=30) for slot in slots)
+    assert len(set(slots)) == 30
+    assert slots == [planner.slot(user_id, "Бухгалтерия", day) for user_id in range(1, 301)]
+
+    # В Екатеринбурге 10:00 наступает на два часа раньше
+    moscow = planner.slot(7, "Бухгалтерия", day)
+    assert planner.slot(7, "Екатеринбург", day) == moscow - timedelta(hours=2)
+
+    # Опоздавшая волна растягивается на окно от момента запуска
+    late = start + timedelta(hours=3)
+    late_slot = planner.slot(7, "Бухгалтерия", day, not_before=late)
+    assert late <= late_slot < late + timedelta(minutes=30)
+
+
+def test_delivery_planner_uses_next_local_window_ahead_of_server(server_utc):
+    planner = DeliveryPlanner(hour=10, window_minutes=30, slot_seconds=60,
+                              department_timezones={"Владивосток": "Asia/Vladivostok"},
+                              default_timezone="Europe/Moscow", plan_hour=6)
+    day = date(2026, 3, 2)
+    # В 06:00 UTC во Владивостоке уже 16:00: волна уходит в 10:00 следующего местного дня
+    now = datetime(2026, 3, 2, 6)
+    start = datetime(2026, 3, 3, 0)
+    for user_id in range(1, 101):
+        slot = planner.slot(user_id, "Владивосток", day, not_before=now)
+        assert start <= slot < start + timedelta(minutes=30)
+        local = slot.replace(tzinfo=ZoneInfo("UTC")).astimezone(ZoneInfo("Asia/Vladivostok"))
+        assert (local.date(), local.hour) == (date(2026, 3, 3), 10)
+
+    # Опоздавшая волна того же дня попадает в то же окно, а не сдвигается от not_before
+    late = datetime(2026, 3, 2, 13)
+    on_time = planner.slot(7, "Владивосток", day)
+    assert planner.slot(7, "Владивосток", day, not_before=late) == on_time
+    # Москва в 06:00 UTC — 09:00, окно этих суток ещё впереди
+    assert planner.slot(7, "Бухгалтерия", day, not_before=now).date() == day
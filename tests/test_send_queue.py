@@ -0,0 +1,54 @@
+import asyncio
+import time
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+from utils.send_queue import DELIVERY_BLOCKED, DELIVERY_SENT, SendQueue
+
+
+class FakeBot:
+    """Имитация bot.send_message: 403 для chat_id=13, один RetryAfter для chat_id=7"""
+
+    def __init__(self):
+        self.sent = []
+        self.flooded = False
+
+    async def send_message(self, chat_id, text, **kwargs):
+        method = SendMessage(chat_id=chat_id, text=text)
+        if chat_id == 13:
+            raise TelegramForbiddenError(method=method,
+                                         message="Forbidden: bot was blocked by the user")
+        if chat_id == 7 and not self.flooded:
+            self.flooded = True
+            raise TelegramRetryAfter(method=method, message="Flood control exceeded", retry_after=1)
+        self.sent.append((chat_id, time.monotonic()))
+
+
+@pytest.mark.asyncio
+async def test_send_queue_retries_and_reports_blocked():
+    bot = FakeBot()
+    queue = SendQueue(bot, rate=100, per_chat_interval=0, workers=4)
+
+    results = await asyncio.gather(*(queue.enqueue(chat_id, "hi") for chat_id in range(1, 21)))
+    await queue.close()
+
+    assert results[12] == DELIVERY_BLOCKED
+    assert results.count(DELIVERY_SENT) == 19
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [c for c in range(1, 21) if c != 13]
+    assert queue.stats["retried"] == 1
+
+
+@pytest.mark.asyncio
+async def test_send_queue_respects_rate_and_chat_pacing():
+    bot = FakeBot()
+    queue = SendQueue(bot, rate=50, per_chat_interval=0.2, workers=8)
+
+    started = time.monotonic()
+    await asyncio.gather(*(queue.enqueue(100 + i, "hi") for i in range(100)))
+    # 100 сообщений при 50/с (с начальным запасом 50 токенов) — не быстрее ~1 с
+    assert time.monotonic() - started >= 0.9
+
+    await asyncio.gather(*(queue.enqueue(1, "same chat") for _ in range(3)))
+    same_chat = [ts for chat_id, ts in bot.sent if chat_id == 1]
+    assert all(b - a >= 0.19 for a, b in zip(same_chat, same_chat[1:]))
+    await queue.close()
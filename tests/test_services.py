@@ -1,25 +1,38 @@
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from models import Base, User, Role, Fund, Donation
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from models import Base, User, Role, Fund, Donation, Notification
+from services import AsyncServiceAdapter
 from services.user_service import UserService
 from services.fund_service import FundService
+from services.audience_service import AudienceService
+from services.broadcast_service import BroadcastService
+from services.job_stats_service import JobRunStats, JobStatsService
+from utils.identity_cache import UserIdentity, identity_cache
+from utils.segment_cache import iter_bitset, segment_cache
+from clock import SimulatedClock, clock
 from datetime import datetime, timedelta
 
-# Настройка тестовой БД
-TEST_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(TEST_DATABASE_URL)
-TestingSessionLocal = sessionmaker(bind=engine)
+# Настройка тестовой БД во временном каталоге теста (tmp_path)
+TEST_DATABASE_URL = "sqlite:///{}/test.db"
+TEST_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///{}/test.db"
 
 @pytest.fixture
-def db_session():
+def testing_session_factory(tmp_path):
+    engine = create_engine(TEST_DATABASE_URL.format(tmp_path))
     Base.metadata.create_all(bind=engine)
-    session = TestingSessionLocal()
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+@pytest.fixture
+def db_session(testing_session_factory):
+    session = testing_session_factory()
     try:
         yield session
     finally:
         session.close()
-        Base.metadata.drop_all(bind=engine)
 
 @pytest.fixture
 def user_service(db_session):
@@ -82,4 +95,136 @@ def test_add_donation(fund_service, user_service):
     
     assert donation is not None
     assert donation.amount == 500.0
-    assert donation.donor_id == donor.id 
\ No newline at end of file
+    assert donation.donor_id == donor.id
+
+def test_concurrent_donations_are_not_lost(fund_service, user_service, db_session,
+                                           testing_session_factory):
+    treasurer = user_service.create_user(telegram_id=123456, employee_id="123456")
+    donors = [user_service.create_user(telegram_id=200000 + i, employee_id=f"D{i}").id
+              for i in range(20)]
+    fund = fund_service.create_fund(
+        title="Test Fund",
+        target_amount=100000.0,
+        end_date=datetime.now() + timedelta(days=7),
+        treasurer_id=treasurer.id,
+        fund_type="event"
+    )
+
+    def donate(i):
+        # Каждый поток — отдельная сессия, как параллельные апдейты казначеев
+        with testing_session_factory() as session:
+            donation = FundService(session).add_donation(fund.id, donors[i % len(donors)], 10.0)
+            return donation is not None
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(donate, range(300)))
+
+    assert all(results)
+    db_session.refresh(fund)
+    assert fund.current_amount == 3000.0
+    assert db_session.query(Donation).filter(Donation.fund_id == fund.id).count() == 300
+
+    # В закрытый сбор взнос не проходит, сумма не меняется
+    fund_service.close_fund(fund.id)
+    assert fund_service.add_donation(fund.id, donors[0], 10.0) is None
+    db_session.refresh(fund)
+    assert fund.current_amount == 3000.0
+def test_role_change_invalidates_identity_cache(user_service, db_session):
+    db_session.add(Role(name="admin"))
+    db_session.commit()
+    user = user_service.create_user(telegram_id=424242, employee_id="424242")
+    identity_cache.set(UserIdentity.from_user(user))
+
+    assert user_service.add_role_to_user(user.id, "admin")
+    assert identity_cache.get(424242) is None
+
+@pytest.mark.asyncio
+async def test_async_service_adapter(db_session, tmp_path):
+    # Сервис работает поверх AsyncSession (aiosqlite) без дублирования логики
+    async_engine = create_async_engine(TEST_ASYNC_DATABASE_URL.format(tmp_path))
+    try:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            users = AsyncServiceAdapter(UserService, session)
+            created = await users.create_user(telegram_id=555, employee_id="555")
+            found = await users.get_user_by_telegram_id(555)
+        assert found.id == created.id
+        assert found.role == "user"
+    finally:
+        await async_engine.dispose()
+
+def test_unreachable_users_excluded_from_broadcast(user_service, db_session):
+    sender = user_service.create_user(telegram_id=1, employee_id="1")
+    blocked = user_service.create_user(telegram_id=2, employee_id="2")
+    broadcast = BroadcastService(db_session).create_broadcast(
+        sender_id=sender.id, title="Новости", message="Текст", broadcast_type="all"
+    )
+
+    assert user_service.mark_unreachable([blocked.telegram_id]) == 1
+    assert BroadcastService(db_session).send_broadcast_to_users(broadcast) == 1
+
+    assert [n.user_id for n in db_session.query(Notification)] == [sender.id]
+
+def test_audience_streams_in_chunks(user_service, db_session):
+    users = [user_service.create_user(telegram_id=100 + i, employee_id=str(i)) for i in range(5)]
+    audience = AudienceService(db_session)
+
+    chunks = list(audience.iter_chunks(audience.reachable_users(), chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [pair for chunk in chunks for pair in chunk] == [(u.id, u.telegram_id) for u in users]
+
+def test_no_birthday_audience_matches_segments_on_feb_28(user_service, db_session):
+    segment_cache.clear()
+    leap = user_service.create_user(telegram_id=400, employee_id="l1",
+                                    birthday=datetime(1992, 2, 29))
+    other = user_service.create_user(telegram_id=401, employee_id="l2",
+                                     birthday=datetime(1990, 3, 1))
+    audience = AudienceService(db_session)
+
+    # В невисокосный год родившиеся 29 февраля празднуют 28-го
+    with clock.use(SimulatedClock(datetime(2023, 2, 28, 12))):
+        query = audience.broadcast_audience("no_birthday")
+        assert [user_id for user_id, _ in db_session.execute(query)] == [other.id]
+        assert list(iter_bitset(segment_cache.birthday_on(db_session))) == [leap.id]
+
+def test_segment_cache_audiences(user_service, fund_service, db_session):
+    segment_cache.clear()
+    sales = [
+        user_service.create_user(telegram_id=200 + i, employee_id=f"s{i}", department="Продажи")
+        for i in range(3)
+    ]
+    other = user_service.create_user(telegram_id=300, employee_id="o1", department="Склад")
+    fund = fund_service.create_fund(
+        title="Сбор", target_amount=1000.0, end_date=datetime.now() + timedelta(days=7),
+        treasurer_id=other.id, fund_type="birthday",
+        birthday_person_id=sales[0].id
+    )
+    audience = AudienceService(db_session)
+
+    assert segment_cache.sizes(db_session)["department:Продажи"] == 3
+    unpaid = sorted(iter_bitset(audience.unpaid_segment(fund)))
+    assert unpaid == [sales[1].id, sales[2].id, other.id]
+
+    # Взнос и блокировка бота инвалидируют сегменты
+    fund_service.add_donation(fund.id, sales[1].id, 100.0)
+    user_service.mark_unreachable([other.telegram_id])
+    assert list(iter_bitset(audience.unpaid_segment(fund))) == [sales[2].id]
+
+    # Закрытый сбор вытесняется из кэша сдавших
+    assert fund.id in segment_cache._paid
+    fund_service.close_fund(fund.id)
+    assert fund.id not in segment_cache._paid
+
+def test_job_stats_trends(db_session):
+    jobs = JobStatsService(db_session)
+    now = datetime.now()
+    stats = JobRunStats()
+    stats.rows_scanned = 100
+    jobs.record("unpaid_reminder", now - timedelta(days=10), 100.0, stats)
+    jobs.record("unpaid_reminder", now - timedelta(days=1), 150.0, stats)
+    jobs.record("unpaid_reminder", now, 250.0, stats)
+
+    assert [run.duration_ms for run in jobs.get_last_runs(2)] == [250.0, 150.0]
+    [trend] = jobs.get_trends(7)
+    assert (trend["job"], trend["runs"], trend["avg_ms"], trend["max_ms"],
+            trend["previous_avg_ms"]) == ("unpaid_reminder", 2, 200.0, 250.0, 100.0)
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from aiogram import Bot, Dispatcher, Router
+from webhook import create_webhook_app, webhook_url
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 1001, "type": "private"},
+        "from": {"id": 1001, "is_bot": False, "first_name": "Test"},
+        "text": "/menu",
+    },
+}
+
+
+@pytest.mark.asyncio
+async def test_webhook_acknowledges_and_feeds_dispatcher():
+    handled = asyncio.Event()
+    release = asyncio.Event()
+    router = Router()
+
+    @router.message()
+    async def handler(message):
+        handled.set()
+        # Ответ вебхука не должен ждать завершения хендлера
+        await release.wait()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="42:TEST")
+    app = create_webhook_app(dp, bot, secret_token="s3cret", max_concurrency=2)
+
+    async with TestClient(TestServer(app)) as client:
+        response = await client.post("/webhook", json=UPDATE)
+        assert response.status == 401
+
+        response = await client.post(
+            "/webhook", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+        )
+        assert response.status == 200
+        await asyncio.wait_for(handled.wait(), timeout=5)
+        release.set()
+
+
+def test_webhook_url_requires_https_base_url():
+    assert webhook_url("https://bot.example.com/", "/webhook") == "https://bot.example.com/webhook"
+    for base_url in ("", "bot.example.com", "http://bot.example.com"):
+        with pytest.raises(ValueError, match="WEBHOOK_BASE_URL"):
+            webhook_url(base_url, "/webhook")
@@ -0,0 +1,136 @@
+# utils/birthday_index.py
+import logging
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import Staff, birthday_ordinal
+from services.birthday_service import birthday_ranges, month_range
+from clock import clock
+
+logger = logging.getLogger(__name__)
+
+
+class BirthdayIndex:
+    """
+    Календарь дней рождения сотрудников в памяти процесса.
+
+    Сотрудники хранятся в двух параллельных массивах, отсортированных по MMDD
+    (см. models.birthday_ordinal), поэтому запросы «в ближайшие N дней»,
+    «в этом месяце» и «в дату D» отвечают бинарным поиском за O(log n + k).
+
+    Индекс перестраивается из БД раз в сутки (задача планировщика в полночь,
+    в пуле потоков) и обновляется точечно при добавлении и удалении сотрудников.
+    Массивы не изменяются на месте: каждое изменение публикует новый снимок
+    одной заменой атрибута, поэтому читатели в event loop всегда видят
+    согласованную пару массивов. Изменения, сделанные во время перестройки,
+    применяются и к новому снимку.
+    """
+
+    def __init__(self):
+        # (MMDD, staff_id, {staff_id: MMDD}) — заменяется целиком
+        self._snapshot: Tuple[array, array, Dict[int, int]] = (array("H"), array("l"), {})
+        self._lock = threading.Lock()
+        # Изменения, пришедшие во время rebuild_from (None — перестройки нет)
+        self._changes_during_rebuild: Optional[List[Tuple[int, Optional[int]]]] = None
+        self.loaded = False
+        self.built_at: Optional[datetime] = None
+
+    def rebuild(self, rows: Iterable[Tuple[int, int]]):
+        """Полная перестройка из пар (staff_id, MMDD)"""
+        pairs = sorted((ordinal, staff_id) for staff_id, ordinal in rows if ordinal)
+        snapshot = (
+            array("H", (ordinal for ordinal, _ in pairs)),
+            array("l", (staff_id for _, staff_id in pairs)),
+            {staff_id: ordinal for ordinal, staff_id in pairs}
+        )
+        with self._lock:
+            for staff_id, ordinal in self._changes_during_rebuild or []:
+                snapshot = _changed(snapshot, staff_id, ordinal)
+            self._changes_during_rebuild = None
+            self._snapshot = snapshot
+            self.loaded = True
+            self.built_at = datetime.now()
+        logger.info(f"Birthday index rebuilt: {len(snapshot[1])} staff")
+
+    def rebuild_from(self, session: Session):
+        """Перестройка по таблице staff (для AsyncSession — через run_sync)"""
+        with self._lock:
+            self._changes_during_rebuild = []
+        try:
+            rows = session.execute(select(Staff.id, Staff.birthday_md)).all()
+        except Exception:
+            with self._lock:
+                self._changes_during_rebuild = None
+            raise
+        self.rebuild(rows)
+
+    async def ensure_loaded(self, session: AsyncSession):
+        """Первичная загрузка при первом обращении"""
+        if not self.loaded:
+            await session.run_sync(self.rebuild_from)
+
+    def _change(self, staff_id: int, ordinal: Optional[int]):
+        with self._lock:
+            self._snapshot = _changed(self._snapshot, staff_id, ordinal)
+            if self._changes_during_rebuild is not None:
+                self._changes_during_rebuild.append((staff_id, ordinal))
+
+    def add(self, staff_id: int, birthday):
+        """Добавление или обновление сотрудника"""
+        self._change(staff_id, birthday_ordinal(birthday))
+
+    def remove(self, staff_id: int):
+        self._change(staff_id, None)
+
+    def _collect(self, ranges: Iterable[Tuple[int, int]]) -> List[int]:
+        ordinals, staff_ids, _ = self._snapshot
+        result: List[int] = []
+        for lower, upper in ranges:
+            start = bisect_left(ordinals, lower)
+            end = bisect_right(ordinals, upper)
+            result.extend(staff_ids[start:end])
+        return result
+
+    def within(self, days: int, today: Optional[date] = None) -> List[int]:
+        """ID сотрудников с днём рождения в ближайшие days дней (включая сегодня), по порядку дат"""
+        return self._collect(birthday_ranges(today or clock.today(), days))
+
+    def in_month(self, month: int) -> List[int]:
+        """ID сотрудников с днём рождения в месяце month"""
+        return self._collect([month_range(month)])
+
+    def on_date(self, day: date) -> List[int]:
+        """ID сотрудников с днём рождения в дату day (29.02 — 28-го в невисокосный год)"""
+        return self._collect(birthday_ranges(day, 0))
+
+    def __len__(self) -> int:
+        return len(self._snapshot[1])
+
+
+def _changed(snapshot, staff_id: int, ordinal: Optional[int]):
+    """Новый снимок индекса с сотрудником staff_id на позиции ordinal (None — без него)"""
+    ordinals, staff_ids, by_id = array("H", snapshot[0]), array("l", snapshot[1]), dict(snapshot[2])
+    previous = by_id.pop(staff_id, None)
+    if previous is not None:
+        for position in range(bisect_left(ordinals, previous), bisect_right(ordinals, previous)):
+            if staff_ids[position] == staff_id:
+                del ordinals[position]
+                del staff_ids[position]
+                break
+    if ordinal:
+        position = bisect_right(ordinals, ordinal)
+        ordinals.insert(position, ordinal)
+        staff_ids.insert(position, staff_id)
+        by_id[staff_id] = ordinal
+    return ordinals, staff_ids, by_id
+
+
+# Общий индекс процесса
+birthday_index = BirthdayIndex()
@@ -22,7 +22,8 @@ def get_admin_commands():
         BotCommand(command="assign_treasurer", description="Назначить казначея"),
         BotCommand(command="broadcast", description="Рассылка всем"),
         BotCommand(command="birthday_broadcast", description="Рассылка без именинников"),
-        BotCommand(command="announcement", description="Объявление")
+        BotCommand(command="announcement", description="Объявление"),
+        BotCommand(command="audience", description="Размеры аудиторий")
     ]
 
 async def set_commands_by_role(bot: Bot, telegram_id: int, role: str):
@@ -1,32 +1,44 @@
 # utils/decorators.py
 
 from functools import wraps
+from typing import Optional
 from aiogram import types
-from database import SessionLocal
-from models import User, Log
+from database import AsyncSessionLocal
+from models import Log
+from utils.identity_cache import UserIdentity
+from utils.middleware import load_identity
 from datetime import datetime
 
+# Маркер «middleware не передало пользователя» (None означает «не зарегистрирован»)
+_UNRESOLVED = object()
+
+async def _resolve_user(message: types.Message, user) -> Optional[UserIdentity]:
+    """
+    Пользователь, найденный DbSessionMiddleware, либо поиск через identity_cache,
+    если middleware не подключено (например, в тестах)
+    """
+    if user is not _UNRESOLVED:
+        return user
+    async with AsyncSessionLocal() as session:
+        return await load_identity(session, message.from_user.id)
+
 def role_required(roles: list[str]):
     """
     Проверка ролей пользователя
     """
     def decorator(handler):
         @wraps(handler)
-        async def wrapper(message: types.Message, *args, **kwargs):
-            session = SessionLocal()
-            try:
-                user = session.query(User).filter_by(telegram_id=message.from_user.id).first()
-                if not user:
-                    await message.answer("❌ Вы не зарегистрированы.")
-                    return
+        async def wrapper(message: types.Message, *args, user=_UNRESOLVED, **kwargs):
+            user = await _resolve_user(message, user)
+            if not user:
+                await message.answer("❌ Вы не зарегистрированы.")
+                return
 
-                if user.role not in roles:
-                    await message.answer("⛔ Нет доступа к этой команде.")
-                    return
+            if user.role not in roles:
+                await message.answer("⛔ Нет доступа к этой команде.")
+                return
 
-                return await handler(message, user, *args, **kwargs)
-            finally:
-                session.close()
+            return await handler(message, *args, user=user, **kwargs)
         return wrapper
     return decorator
 
@@ -37,16 +49,12 @@ def ensure_registered():
     """
     def decorator(handler):
         @wraps(handler)
-        async def wrapper(message: types.Message, *args, **kwargs):
-            session = SessionLocal()
-            try:
-                user = session.query(User).filter_by(telegram_id=message.from_user.id).first()
-                if not user:
-                    await message.answer("❌ Вы не зарегистрированы. Введите /start для регистрации.")
-                    return
-                return await handler(message, user, *args, **kwargs)
-            finally:
-                session.close()
+        async def wrapper(message: types.Message, *args, user=_UNRESOLVED, **kwargs):
+            user = await _resolve_user(message, user)
+            if not user:
+                await message.answer("❌ Вы не зарегистрированы. Введите /start для регистрации.")
+                return
+            return await handler(message, *args, user=user, **kwargs)
         return wrapper
     return decorator
 
@@ -58,12 +66,15 @@ def log_action(action_name: str):
     def decorator(handler):
         @wraps(handler)
         async def wrapper(message: types.Message, *args, **kwargs):
-            session = SessionLocal()
-            try:
-                session.add(Log(user_id=message.from_user.id, action=action_name, timestamp=datetime.utcnow()))
-                session.commit()
-            finally:
-                session.close()
+            log = Log(user_id=message.from_user.id, action=action_name, timestamp=datetime.utcnow())
+            session = kwargs.get("session")
+            if session is not None:
+                session.add(log)
+                await session.commit()
+            else:
+                async with AsyncSessionLocal() as session:
+                    session.add(log)
+                    await session.commit()
             return await handler(message, *args, **kwargs)
         return wrapper
     return decorator
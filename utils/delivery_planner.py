@@ -0,0 +1,93 @@
+# utils/delivery_planner.py
+import logging
+from datetime import date, datetime, time, timedelta, tzinfo
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo
+
+from config import (
+    DEPARTMENT_TIMEZONES, REMINDER_DEFAULT_TIMEZONE, REMINDER_HOUR, REMINDER_PLAN_HOUR,
+    REMINDER_SLOT_SECONDS, REMINDER_WINDOW_MINUTES
+)
+
+logger = logging.getLogger(__name__)
+
+# Мультипликативный хеш Кнута: соседние id попадают в далёкие слоты
+_SPREAD_MULTIPLIER = 2654435761
+
+
+class DeliveryPlanner:
+    """
+    Слоты доставки ежедневных напоминаний.
+
+    Каждому получателю назначается слот в окне [hour:00, hour:00 + window)
+    по местному времени его отдела. Слот зависит только от user_id, поэтому
+    получатели распределяются по окну равномерно, а повторный расчёт
+    (перезапуск задачи) даёт то же время.
+
+    Волна дня day готовится в plan_hour по времени сервера и попадает в первое
+    окно отдела, которое начинается не раньше этого момента. Для отделов далеко
+    впереди сервера (Владивосток при сервере в UTC) местное окно этих суток
+    к plan_hour уже прошло — волна уходит в окно следующего местного дня.
+
+    Возвращаемое время — наивное локальное время сервера, как и остальные
+    DateTime в БД (сравнивается с clock.now()).
+    """
+
+    def __init__(
+        self,
+        hour: int = REMINDER_HOUR,
+        window_minutes: int = REMINDER_WINDOW_MINUTES,
+        slot_seconds: int = REMINDER_SLOT_SECONDS,
+        department_timezones: Optional[Dict[str, str]] = None,
+        default_timezone: str = REMINDER_DEFAULT_TIMEZONE,
+        plan_hour: int = REMINDER_PLAN_HOUR
+    ):
+        self.hour = hour
+        self.plan_hour = plan_hour
+        self.slot_seconds = max(slot_seconds, 1)
+        self.slots = max(window_minutes * 60 // self.slot_seconds, 1)
+        self.default_timezone: Optional[tzinfo] = (
+            ZoneInfo(default_timezone) if default_timezone else None
+        )
+        if department_timezones is None:
+            department_timezones = DEPARTMENT_TIMEZONES
+        self.department_timezones = {
+            department: ZoneInfo(name) for department, name in department_timezones.items()
+        }
+
+    def timezone_for(self, department: Optional[str]) -> Optional[tzinfo]:
+        """Часовой пояс отдела; None — часовой пояс сервера"""
+        return self.department_timezones.get(department, self.default_timezone)
+
+    def window_start(self, department: Optional[str], day: date) -> datetime:
+        """Начало окна отдела для волны дня day (локальное время сервера)"""
+        planned = datetime.combine(day, time(self.plan_hour))
+        timezone = self.timezone_for(department)
+        if timezone is not None:
+            planned = planned.astimezone(timezone)
+        start = datetime.combine(planned.date(), time(self.hour), tzinfo=planned.tzinfo)
+        if start < planned:
+            # Местное окно этих суток прошло ещё до подготовки волны
+            start += timedelta(days=1)
+        if timezone is not None:
+            # Местное время отдела → локальное время сервера
+            start = start.astimezone().replace(tzinfo=None)
+        return start
+
+    def slot(self, user_id: int, department: Optional[str], day: date,
+             not_before: Optional[datetime] = None) -> datetime:
+        """
+        Время доставки получателю волны дня day (см. window_start).
+
+        Если окно отдела уже прошло (волна готовится с опозданием, например
+        после простоя), слот отсчитывается от not_before — опоздавшая волна
+        тоже растягивается на окно, а не уходит разом.
+        """
+        offset = timedelta(seconds=(user_id * _SPREAD_MULTIPLIER) % self.slots * self.slot_seconds)
+        start = self.window_start(department, day)
+        if not_before is not None and start + offset < not_before:
+            start = not_before
+        return start + offset
+
+
+delivery_planner = DeliveryPlanner()
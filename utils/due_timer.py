@@ -0,0 +1,122 @@
+# utils/due_timer.py
+import asyncio
+import heapq
+import logging
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+
+from models import Notification
+
+logger = logging.getLogger(__name__)
+
+
+class DueTimer:
+    """
+    Мин-куча времён scheduled_for неотправленных уведомлений.
+
+    Диспетчер рассылок (NotificationScheduler.dispatch_scheduled) спит ровно
+    до ближайшего времени из кучи и просыпается сразу, если BroadcastService
+    запланировал что-то раньше. Куча загружается из БД при старте.
+    """
+
+    def __init__(self):
+        self._heap: List[datetime] = []
+        # Времена, добавленные во время load (запрос к БД мог их не увидеть)
+        self._pushed_during_load: Optional[List[datetime]] = None
+        # push может прийти из потоков планировщика
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def load(self, db: Session):
+        """
+        Загрузка времён неотправленных уведомлений (для AsyncSession — через run_sync).
+
+        Повторная загрузка добавляет времена, запланированные другими процессами.
+        """
+        with self._lock:
+            self._pushed_during_load = []
+        try:
+            due = db.scalars(
+                select(Notification.scheduled_for).filter(
+                    and_(
+                        Notification.delivered_at.is_(None),
+                        Notification.failed_at.is_(None),
+                        Notification.scheduled_for.isnot(None)
+                    )
+                ).distinct()
+            ).all()
+        except Exception:
+            with self._lock:
+                self._pushed_during_load = None
+            raise
+        with self._lock:
+            self._heap = list(set(due).union(self._pushed_during_load or []))
+            self._pushed_during_load = None
+            heapq.heapify(self._heap)
+        logger.info(f"Due timer loaded: {len(due)} scheduled times")
+
+    def push(self, when: datetime):
+        """Новое запланированное время; будит диспетчер, если оно раньше текущего ближайшего"""
+        with self._lock:
+            earlier = not self._heap or when < self._heap[0]
+            heapq.heappush(self._heap, when)
+            if self._pushed_during_load is not None:
+                self._pushed_during_load.append(when)
+        if earlier and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def next_due(self) -> Optional[datetime]:
+        with self._lock:
+            return self._heap[0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> int:
+        """Удаление наступивших времён; возвращает их количество"""
+        popped = 0
+        with self._lock:
+            while self._heap and self._heap[0] <= now:
+                heapq.heappop(self._heap)
+                popped += 1
+        return popped
+
+    async def wait(self, max_sleep: float):
+        """
+        Ожидание до ближайшего времени из кучи, но не дольше max_sleep.
+
+        max_sleep ограничивает опоздание уведомлений, запланированных другим
+        процессом (см. NotificationScheduler.dispatch_scheduled).
+        """
+        if self._loop is not asyncio.get_running_loop():
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            now = datetime.now()
+            next_due = self.next_due()
+            if next_due is not None and next_due <= now:
+                self.pop_due(now)
+                return
+            timeout = max_sleep
+            if next_due is not None:
+                timeout = min(max_sleep, (next_due - now).total_seconds())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.pop_due(datetime.now())
+                return
+
+    def clear(self):
+        """Сброс кучи (прогоны на виртуальном времени, тесты)"""
+        with self._lock:
+            self._heap = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+# Общий таймер процесса
+due_timer = DueTimer()
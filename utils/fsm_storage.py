@@ -0,0 +1,231 @@
+# utils/fsm_storage.py
+import asyncio
+import logging
+import time
+from copy import copy
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Set
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+)
+from sqlalchemy import delete, insert, select, update
+
+from config import BOT_MODE, FSM_FLUSH_INTERVAL, FSM_STATE_TTL
+from database import AsyncSessionLocal, upsert_statement
+from models import FsmRecord
+
+logger = logging.getLogger(__name__)
+
+
+class _Record:
+    __slots__ = ("state", "data", "touched_at")
+
+    def __init__(self, state: Optional[str] = None, data: Optional[Dict[str, Any]] = None):
+        self.state = state
+        self.data = data or {}
+        self.touched_at = time.monotonic()
+
+
+class SQLAlchemyStorage(BaseStorage):
+    """
+    FSM-хранилище в БД (SQLite/PostgreSQL).
+
+    Режим write-back (по умолчанию при polling, где экземпляр бота один):
+    - Чтение и запись идут в память, поэтому хендлеры не ждут БД
+      (кроме первого обращения к ключу после старта).
+    - Изменённые ключи раз в flush_interval секунд пишутся в БД одной транзакцией;
+      при close() выполняется финальная запись.
+    - Состояния, к которым не обращались дольше state_ttl секунд, удаляются
+      из памяти и из БД, чтобы брошенные диалоги не копились. Чтение тоже
+      считается активностью: при flush у прочитанных ключей обновляется
+      updated_at, поэтому живой, но не меняющийся диалог не удаляется из БД.
+
+    При аварийном завершении теряются изменения не более чем за flush_interval.
+
+    Режим write-through (по умолчанию при BOT_MODE=webhook, где за балансировщиком
+    может работать несколько экземпляров): слоя в памяти нет, каждое чтение идёт
+    в БД, а set_state/set_data сразу обновляют в строке только свой столбец.
+    Так экземпляры видят изменения друг друга и не затирают чужое состояние
+    устаревшей копией. Отметки активности прочитанных ключей по-прежнему
+    пишутся пакетом при flush.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        flush_interval: float = FSM_FLUSH_INTERVAL,
+        state_ttl: float = FSM_STATE_TTL,
+        key_builder: Optional[KeyBuilder] = None,
+        write_through: bool = BOT_MODE == 'webhook'
+    ):
+        self.session_factory = session_factory
+        self.write_through = write_through
+        self.flush_interval = flush_interval
+        self.state_ttl = state_ttl
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        self._records: Dict[str, _Record] = {}
+        self._dirty: Set[str] = set()
+        self._touched: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def _get_record(self, key: StorageKey) -> _Record:
+        storage_key = self.key_builder.build(key)
+        if self.write_through:
+            # Состояние мог изменить другой экземпляр — всегда читаем из БД
+            async with self.session_factory() as session:
+                row = await session.get(FsmRecord, storage_key)
+            self._touched.add(storage_key)
+            self._ensure_flush_task()
+            return _Record(row.state, dict(row.data or {})) if row else _Record()
+        record = self._records.get(storage_key)
+        if record is None:
+            async with self.session_factory() as session:
+                row = await session.get(FsmRecord, storage_key)
+            # Параллельный вызов мог уже создать запись, пока шёл запрос
+            record = self._records.get(storage_key)
+            if record is None:
+                record = _Record(row.state, dict(row.data or {})) if row else _Record()
+                self._records[storage_key] = record
+        record.touched_at = time.monotonic()
+        self._touched.add(storage_key)
+        self._ensure_flush_task()
+        return record
+
+    async def _write_through(self, key: StorageKey, **values):
+        """Немедленная запись одного столбца (state или data) строки ключа"""
+        storage_key = self.key_builder.build(key)
+        values.update(key=storage_key, updated_at=datetime.utcnow())
+        async with self.session_factory() as session:
+            await session.execute(
+                upsert_statement(session.get_bind(), FsmRecord, values, ["key"])
+            )
+            # state.clear() вызывает set_state(None), затем set_data({}):
+            # пустое состояние хранить не нужно
+            if values.get("data") == {}:
+                await session.execute(
+                    delete(FsmRecord)
+                    .where(FsmRecord.key == storage_key, FsmRecord.state.is_(None))
+                )
+            await session.commit()
+
+    def _mark_dirty(self, key: StorageKey):
+        self._dirty.add(self.key_builder.build(key))
+        self._ensure_flush_task()
+
+    def _ensure_flush_task(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        if self.write_through:
+            await self._write_through(key, state=state)
+            return
+        record = await self._get_record(key)
+        record.state = state
+        self._mark_dirty(key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get_record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        if self.write_through:
+            await self._write_through(key, data=data.copy())
+            return
+        record = await self._get_record(key)
+        record.data = data.copy()
+        self._mark_dirty(key)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get_record(key)).data.copy()
+
+    async def get_value(
+        self, storage_key: StorageKey, dict_key: str, default: Optional[Any] = None
+    ) -> Optional[Any]:
+        record = await self._get_record(storage_key)
+        return copy(record.data.get(dict_key, default))
+
+    async def flush(self):
+        """Запись изменённых ключей и отметок активности прочитанных в БД одной транзакцией"""
+        async with self._flush_lock:
+            if not self._dirty and not self._touched:
+                return
+            keys, self._dirty = self._dirty, set()
+            touched, self._touched = self._touched - keys, set()
+            now = datetime.utcnow()
+            rows = []
+            for storage_key in keys:
+                record = self._records.get(storage_key)
+                # Пустое состояние (после state.clear()) хранить не нужно
+                if record and (record.state is not None or record.data):
+                    rows.append({"key": storage_key, "state": record.state,
+                                 "data": record.data, "updated_at": now})
+            try:
+                async with self.session_factory() as session:
+                    await session.execute(delete(FsmRecord).where(FsmRecord.key.in_(keys)))
+                    if rows:
+                        await session.execute(insert(FsmRecord), rows)
+                    if touched:
+                        await session.execute(
+                            update(FsmRecord)
+                            .where(FsmRecord.key.in_(touched))
+                            .values(updated_at=now)
+                        )
+                    await session.commit()
+            except Exception as e:
+                # Вернём ключи в очередь, чтобы записать их на следующем шаге
+                self._dirty |= keys
+                self._touched |= touched
+                logger.error(f"Error flushing FSM states: {e}")
+            except asyncio.CancelledError:
+                self._dirty |= keys
+                self._touched |= touched
+                raise
+
+    async def expire(self):
+        """
+        Удаление состояний, неактивных дольше state_ttl.
+
+        В памяти и в БД срок считается от последнего обращения (в БД — с точностью
+        до flush_interval, см. flush); ключи, живые в памяти, из БД не удаляются.
+        """
+        deadline = time.monotonic() - self.state_ttl
+        for storage_key in [k for k, r in self._records.items() if r.touched_at < deadline]:
+            if storage_key not in self._dirty:
+                del self._records[storage_key]
+
+        cutoff = datetime.utcnow() - timedelta(seconds=self.state_ttl)
+        async with self.session_factory() as session:
+            stale = (await session.scalars(
+                select(FsmRecord.key).where(FsmRecord.updated_at < cutoff)
+            )).all()
+            stale = [storage_key for storage_key in stale if storage_key not in self._records]
+            if stale:
+                await session.execute(delete(FsmRecord).where(FsmRecord.key.in_(stale)))
+                await session.commit()
+
+    async def _flush_loop(self):
+        last_expire = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            # Очистка устаревших состояний — не чаще раза в минуту
+            if time.monotonic() - last_expire >= 60:
+                last_expire = time.monotonic()
+                try:
+                    await self.expire()
+                except Exception as e:
+                    logger.error(f"Error expiring FSM states: {e}")
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
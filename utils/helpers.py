@@ -1,9 +1,12 @@
 from datetime import datetime
-from models import Staff, Log
+from models import Log
 from database import SessionLocal
+from utils.birthday_index import birthday_index
 
 def get_birthday_staff_ids(session, month_list):
-    return [s.id for s in session.query(Staff).all() if s.birthday and s.birthday.month in month_list]
+    if not birthday_index.loaded:
+        birthday_index.rebuild_from(session)
+    return [staff_id for month in month_list for staff_id in birthday_index.in_month(month)]
 
 def format_date(date: datetime):
     return date.strftime('%d.%m.%Y')
@@ -0,0 +1,114 @@
+# utils/identity_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from config import IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL
+from models import highest_role
+
+
+class UserIdentity:
+    """
+    Снимок пользователя для проверки доступа: id, роли, активность и отдел.
+
+    Повторяет атрибуты User, которые нужны хендлерам и декораторам,
+    поэтому передаётся в хендлеры вместо ORM-объекта.
+    """
+    __slots__ = (
+        "id", "telegram_id", "staff_id", "roles", "is_active", "department", "is_reachable"
+    )
+
+    def __init__(self, id: int, telegram_id: int, staff_id: Optional[int],
+                 roles: Tuple[str, ...], is_active: bool, department: Optional[str],
+                 is_reachable: bool = True):
+        self.id = id
+        self.telegram_id = telegram_id
+        self.staff_id = staff_id
+        self.roles = roles
+        self.is_active = is_active
+        self.department = department
+        self.is_reachable = is_reachable
+
+    @classmethod
+    def from_user(cls, user) -> "UserIdentity":
+        return cls(
+            id=user.id,
+            telegram_id=user.telegram_id,
+            staff_id=user.staff_id,
+            roles=tuple(role.name for role in user.roles),
+            is_active=user.is_active,
+            department=user.department,
+            is_reachable=user.unreachable_since is None
+        )
+
+    @property
+    def role(self) -> str:
+        """Старшая роль пользователя (по весу из ROLES)"""
+        return highest_role(self.roles)
+
+
+class IdentityCache:
+    """
+    Ограниченный LRU-кэш telegram_id → UserIdentity с TTL.
+
+    Записи инвалидируются явно из UserService при изменении ролей и данных
+    пользователя; TTL ограничивает устаревание при изменениях из других процессов.
+    """
+
+    def __init__(self, maxsize: int = IDENTITY_CACHE_SIZE, ttl: float = IDENTITY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[float, UserIdentity]]" = OrderedDict()
+        # Инвалидация может прийти из потоков планировщика
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, telegram_id: int) -> Optional[UserIdentity]:
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, identity = entry
+            if expires_at < time.monotonic():
+                del self._entries[telegram_id]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(telegram_id)
+            self.hits += 1
+            return identity
+
+    def set(self, identity: UserIdentity):
+        with self._lock:
+            self._entries[identity.telegram_id] = (time.monotonic() + self.ttl, identity)
+            self._entries.move_to_end(identity.telegram_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, telegram_id: int):
+        with self._lock:
+            self._entries.pop(telegram_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Счётчики попаданий, промахов и вытеснений"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,64 @@
+# utils/loop_monitor.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from config import LOOP_STALL_WARNING_MS
+
+logger = logging.getLogger(__name__)
+
+
+class LoopStallMonitor:
+    """
+    Замер блокировок event loop.
+
+    Фоновая задача засыпает на interval секунд и измеряет, насколько позже
+    она проснулась: это задержка, с которой loop начал бы обрабатывать
+    любой другой апдейт. Задержки дольше warning_ms пишутся в лог.
+    """
+
+    def __init__(self, interval: float = 0.05, warning_ms: float = LOOP_STALL_WARNING_MS,
+                 max_samples: int = 100000):
+        self.interval = interval
+        self.warning_ms = warning_ms
+        # Последние замеры; в долгоживущем процессе память ограничена
+        self.samples: Deque[float] = deque(maxlen=max_samples)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            stall_ms = (time.perf_counter() - started - self.interval) * 1000
+            self.samples.append(stall_ms)
+            if stall_ms > self.warning_ms:
+                logger.warning(f"Event loop stalled for {stall_ms:.0f} ms")
+
+    def reset(self):
+        self.samples.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Максимальная и p99 задержка (мс) с момента запуска или reset()"""
+        if not self.samples:
+            return {"max_ms": 0.0, "p99_ms": 0.0, "samples": 0}
+        ordered = sorted(self.samples)
+        return {
+            "max_ms": ordered[-1],
+            "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            "samples": len(ordered),
+        }
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
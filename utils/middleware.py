@@ -1,10 +1,17 @@
-from typing import Dict, Callable, Any, Awaitable
+from typing import Dict, Callable, Any, Awaitable, Optional
 from datetime import datetime, timedelta
 from aiogram import BaseMiddleware
-from aiogram.types import Message, TelegramObject
+from aiogram.types import Message, TelegramObject, Update
+from sqlalchemy import select, update
 import logging
 import sqlite3
 from collections import defaultdict
+from database import AsyncSessionLocal, DbStats, current_db_stats
+from models import User
+from utils.identity_cache import UserIdentity, identity_cache
+from utils.segment_cache import segment_cache
+
+logger = logging.getLogger(__name__)
 
 class AntiSpamMiddleware(BaseMiddleware):
     def __init__(self, rate_limit: int = 5):
@@ -85,10 +92,92 @@ class LoggingMiddleware(BaseMiddleware):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO bot_logs (user_id, username, command, message_text, role) VALUES (?, ?, ?, ?, ?)",
+            "INSERT INTO bot_logs (user_id, username, command, message_text, role) "
+            "VALUES (?, ?, ?, ?, ?)",
             (user_id, username, command, message_text, role)
         )
         conn.commit()
         conn.close()
         
-        return await handler(event, data) 
\ No newline at end of file
+        return await handler(event, data) 
+
+async def load_identity(session, telegram_id: int) -> Optional[UserIdentity]:
+    """UserIdentity из кэша либо из БД (с сохранением в кэш)"""
+    identity = identity_cache.get(telegram_id)
+    if identity is None:
+        user = await session.scalar(select(User).filter_by(telegram_id=telegram_id))
+        if user:
+            identity = UserIdentity.from_user(user)
+            identity_cache.set(identity)
+    return identity
+
+async def restore_reachability(session, identity: UserIdentity):
+    """Пользователь снова пишет боту — возвращаем его в рассылки"""
+    await session.execute(update(User).where(User.id == identity.id).values(unreachable_since=None))
+    await session.commit()
+    identity_cache.invalidate(identity.telegram_id)
+    segment_cache.invalidate_users()
+    identity.is_reachable = True
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Открывает одну AsyncSession на апдейт и один раз определяет пользователя.
+
+    В data хендлеров передаются:
+    - session: AsyncSession, общая для middleware, декораторов и хендлера
+    - user: UserIdentity или None, если отправитель не зарегистрирован.
+      Берётся из identity_cache; в БД идём только при промахе.
+      Если пользователь был отмечен заблокировавшим бота, отметка снимается
+    - role: старшая роль пользователя (используется LoggingMiddleware)
+    - db_stats: DbStats — число сессий и SQL-запросов в рамках апдейта
+
+    Регистрируется как outer middleware на dp.update перед LoggingMiddleware.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+        # Накопленные счётчики для сравнения «до/после»
+        self.totals = {"updates": 0, "sessions": 0, "queries": 0}
+        super().__init__()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        stats = DbStats()
+        token = current_db_stats.set(stats)
+        try:
+            async with self.session_factory() as session:
+                from_user = data.get("event_from_user")
+                user = None
+                if from_user:
+                    user = await load_identity(session, from_user.id)
+                if user is not None and not user.is_reachable:
+                    await restore_reachability(session, user)
+
+                data["session"] = session
+                data["user"] = user
+                data["role"] = user.role if user else "unknown"
+                data["db_stats"] = stats
+                return await handler(event, data)
+        finally:
+            current_db_stats.reset(token)
+            self._account(event, stats)
+
+    def _account(self, event: TelegramObject, stats: DbStats):
+        self.totals["updates"] += 1
+        self.totals["sessions"] += stats.sessions
+        self.totals["queries"] += stats.queries
+        update_id = event.update_id if isinstance(event, Update) else None
+        logger.debug(f"Update {update_id}: sessions={stats.sessions}, queries={stats.queries}")
+
+    def get_stats(self) -> Dict[str, float]:
+        """Средние значения сессий и запросов на апдейт"""
+        updates = self.totals["updates"] or 1
+        return {
+            **self.totals,
+            "sessions_per_update": self.totals["sessions"] / updates,
+            "queries_per_update": self.totals["queries"] / updates,
+        }
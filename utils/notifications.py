@@ -1,14 +1,10 @@
+import asyncio
 from aiogram import Bot
+from utils.send_queue import get_send_queue
 
 async def remind_admins(bot: Bot, admin_ids: list[int], text: str):
-    for admin_id in admin_ids:
-        try:
-            await bot.send_message(admin_id, text)
-        except Exception as e:
-            print(f"Ошибка при отправке уведомления админу {admin_id}: {e}")
+    send_queue = get_send_queue(bot)
+    await asyncio.gather(*(send_queue.enqueue(admin_id, text) for admin_id in admin_ids))
 
 async def remind_user(bot: Bot, user_id: int, text: str):
-    try:
-        await bot.send_message(user_id, text)
-    except Exception as e:
-        print(f"Ошибка при отправке уведомления пользователю {user_id}: {e}")
+    await get_send_queue(bot).send_message(user_id, text)
@@ -0,0 +1,148 @@
+# utils/segment_cache.py
+import logging
+import threading
+import time
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+
+from config import SEGMENT_CACHE_TTL
+from models import Donation, User
+from services.birthday_service import birthday_ranges
+from clock import clock
+
+logger = logging.getLogger(__name__)
+
+
+def to_bitset(ids: Iterable[int]) -> int:
+    """Множество id как int: бит i установлен, если id i входит в множество"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def iter_bitset(bits: int) -> Iterator[int]:
+    """id из битового множества по возрастанию"""
+    digits = bin(bits)[:1:-1]  # младший бит первым
+    position = digits.find("1")
+    while position != -1:
+        yield position
+        position = digits.find("1", position + 1)
+
+
+class SegmentCache:
+    """
+    Предвычисленные сегменты аудитории рассылок в виде битовых множеств id.
+
+    Сегменты: активные и доступные пользователи, отделы, именинники по MMDD
+    и сдавшие в каждый сбор. Аудитория собирается алгеброй множеств, например
+    «отдел X без сдавших и без именинника»: department & ~paid & ~(1 << id),
+    а размер — bit_count() без запроса к БД.
+
+    Сегменты пользователей перестраиваются одним запросом при первом обращении
+    и инвалидируются явно из UserService и middleware, сдавшие — из FundService.
+    TTL ограничивает устаревание при изменениях из других процессов.
+    """
+
+    def __init__(self, ttl: float = SEGMENT_CACHE_TTL):
+        self.ttl = ttl
+        # Инвалидация может прийти из потоков планировщика
+        self._lock = threading.Lock()
+        self._users_expire_at = 0.0
+        self._active = 0
+        self._departments: Dict[str, int] = {}
+        self._birthdays: Dict[int, int] = {}
+        self._paid: Dict[int, Tuple[float, int]] = {}
+        self.rebuilds = 0
+
+    def _load_users(self, db: Session):
+        if self._users_expire_at > time.monotonic():
+            return
+        rows = db.execute(
+            select(User.id, User.department, User.birthday_md).filter(
+                and_(
+                    User.is_active == True,
+                    User.unreachable_since.is_(None)
+                )
+            )
+        ).all()
+        departments: Dict[str, List[int]] = {}
+        birthdays: Dict[int, List[int]] = {}
+        for user_id, department, birthday_md in rows:
+            if department:
+                departments.setdefault(department, []).append(user_id)
+            if birthday_md:
+                birthdays.setdefault(birthday_md, []).append(user_id)
+        with self._lock:
+            self._active = to_bitset(user_id for user_id, *_ in rows)
+            self._departments = {name: to_bitset(ids) for name, ids in departments.items()}
+            self._birthdays = {ordinal: to_bitset(ids) for ordinal, ids in birthdays.items()}
+            self._users_expire_at = time.monotonic() + self.ttl
+            self.rebuilds += 1
+        logger.info(f"Audience segments rebuilt: {len(rows)} users, {len(departments)} departments")
+
+    def active(self, db: Session) -> int:
+        """Активные пользователи, не заблокировавшие бота"""
+        self._load_users(db)
+        return self._active
+
+    def department(self, db: Session, name: str) -> int:
+        """Активные пользователи отдела"""
+        self._load_users(db)
+        return self._departments.get(name, 0)
+
+    def birthday_on(self, db: Session, day: Optional[date] = None) -> int:
+        """Именинники в дату day (по умолчанию сегодня)"""
+        self._load_users(db)
+        bits = 0
+        for lower, upper in birthday_ranges(day or clock.today(), 0):
+            for ordinal, members in self._birthdays.items():
+                if lower <= ordinal <= upper:
+                    bits |= members
+        return bits
+
+    def paid(self, db: Session, fund_id: int) -> int:
+        """Сдавшие в сбор"""
+        entry = self._paid.get(fund_id)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        bits = to_bitset(db.scalars(
+            select(Donation.donor_id).filter(Donation.fund_id == fund_id).distinct()
+        ))
+        with self._lock:
+            self._paid[fund_id] = (time.monotonic() + self.ttl, bits)
+        return bits
+
+    def sizes(self, db: Session) -> Dict[str, int]:
+        """Размеры сегментов пользователей для предпросмотра рассылки"""
+        self._load_users(db)
+        sizes = {
+            "active": self._active.bit_count(),
+            "birthday_today": self.birthday_on(db).bit_count()
+        }
+        for name, members in sorted(self._departments.items()):
+            sizes[f"department:{name}"] = members.bit_count()
+        return sizes
+
+    def invalidate_users(self):
+        with self._lock:
+            self._users_expire_at = 0.0
+
+    def invalidate_fund(self, fund_id: int):
+        """Сброс сдавших в сбор: после взноса и при закрытии сбора"""
+        with self._lock:
+            self._paid.pop(fund_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users_expire_at = 0.0
+            self._paid.clear()
+
+
+segment_cache = SegmentCache()
@@ -0,0 +1,207 @@
+# utils/send_queue.py
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError
+)
+
+from config import SEND_RATE_LIMIT, SEND_PER_CHAT_INTERVAL, SEND_WORKERS, SEND_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Итоговые статусы доставки сообщения
+DELIVERY_SENT = "sent"
+DELIVERY_FAILED = "failed"
+DELIVERY_BLOCKED = "blocked"  # пользователь заблокировал бота
+
+
+class TokenBucket:
+    """Глобальный ограничитель скорости: не более rate отправок в секунду"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Приостановка отправок (Telegram вернул RetryAfter)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                refill = (now - self._updated_at) * self.rate
+                self._tokens = min(self.capacity, self._tokens + refill)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _SendJob:
+    __slots__ = ("chat_id", "text", "kwargs", "future", "attempts")
+
+    def __init__(self, chat_id: int, text: str, kwargs: Dict[str, Any], future: asyncio.Future):
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+
+
+class SendQueue:
+    """
+    Централизованная очередь исходящих сообщений с учётом лимитов Telegram.
+
+    - глобальный token bucket (SEND_RATE_LIMIT сообщений/с, ~30 по правилам Bot API);
+    - не чаще одного сообщения в SEND_PER_CHAT_INTERVAL секунд в один чат;
+    - TelegramRetryAfter: сообщение возвращается в очередь через retry_after секунд,
+      глобальная отправка приостанавливается на то же время;
+    - сетевые и серверные ошибки повторяются до SEND_MAX_RETRIES раз;
+    - отправляют SEND_WORKERS параллельных воркеров.
+
+    enqueue() возвращает Future с итоговым статусом доставки
+    (DELIVERY_SENT, DELIVERY_FAILED, DELIVERY_BLOCKED).
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        rate: float = SEND_RATE_LIMIT,
+        per_chat_interval: float = SEND_PER_CHAT_INTERVAL,
+        workers: int = SEND_WORKERS,
+        max_retries: int = SEND_MAX_RETRIES
+    ):
+        self.bot = bot
+        self.bucket = TokenBucket(rate)
+        self.per_chat_interval = per_chat_interval
+        self.workers = workers
+        self.max_retries = max_retries
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks = []
+        self._chat_ready_at: Dict[int, float] = {}
+        self._pending = 0
+        self._idle: Optional[asyncio.Event] = None
+        self.stats = {DELIVERY_SENT: 0, DELIVERY_FAILED: 0, DELIVERY_BLOCKED: 0, "retried": 0}
+
+    def start(self):
+        """Запуск воркеров (вызывается автоматически при первой постановке в очередь)"""
+        if self._worker_tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def enqueue(self, chat_id: int, text: str, **kwargs: Any) -> asyncio.Future:
+        """Постановка сообщения в очередь; kwargs передаются в bot.send_message"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending += 1
+        self._idle.clear()
+        self._queue.put_nowait(_SendJob(chat_id, text, kwargs, future))
+        return future
+
+    async def send_message(self, chat_id: int, text: str, **kwargs: Any) -> str:
+        """Отправка через очередь с ожиданием итогового статуса"""
+        return await self.enqueue(chat_id, text, **kwargs)
+
+    async def join(self):
+        """Ожидание доставки всех поставленных сообщений"""
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def close(self, timeout: float = 10):
+        """Остановка воркеров после доставки очереди (не дольше timeout секунд)"""
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Send queue closed with {self._pending} undelivered messages")
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def _requeue_later(self, job: _SendJob, delay: float):
+        asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job)
+
+    def _finish(self, job: _SendJob, status: str):
+        self.stats[status] += 1
+        if not job.future.done():
+            job.future.set_result(status)
+        self._pending -= 1
+        if self._pending == 0:
+            self._idle.set()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+
+            # Темп по чату: не занимаем воркер ожиданием, а откладываем сообщение
+            now = time.monotonic()
+            ready_at = self._chat_ready_at.get(job.chat_id, 0.0)
+            if ready_at > now:
+                self._requeue_later(job, ready_at - now)
+                continue
+            # Резервируем чат, пока ждём токен, и отсчитываем интервал от момента отправки
+            self._chat_ready_at[job.chat_id] = now + self.per_chat_interval
+            await self.bucket.acquire()
+            self._chat_ready_at[job.chat_id] = time.monotonic() + self.per_chat_interval
+            job.attempts += 1
+            try:
+                await self.bot.send_message(job.chat_id, job.text, **job.kwargs)
+                self._finish(job, DELIVERY_SENT)
+            except TelegramRetryAfter as e:
+                self.bucket.pause(e.retry_after)
+                self._retry(job, e.retry_after, e)
+            except TelegramForbiddenError:
+                self._finish(job, DELIVERY_BLOCKED)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                self._retry(job, min(2 ** job.attempts, 30), e)
+            except Exception as e:
+                logger.error(f"Error sending message to {job.chat_id}: {e}")
+                self._finish(job, DELIVERY_FAILED)
+            finally:
+                self._prune_chat_pacing()
+
+    def _retry(self, job: _SendJob, delay: float, error: Exception):
+        if job.attempts > self.max_retries:
+            logger.error(
+                f"Giving up sending message to {job.chat_id} after {job.attempts} attempts: {error}"
+            )
+            self._finish(job, DELIVERY_FAILED)
+            return
+        self.stats["retried"] += 1
+        self._requeue_later(job, delay)
+
+    def _prune_chat_pacing(self):
+        # Не даём словарю расти бесконечно при рассылках по большим аудиториям
+        if len(self._chat_ready_at) > 10000:
+            now = time.monotonic()
+            self._chat_ready_at = {k: v for k, v in self._chat_ready_at.items() if v > now}
+
+
+_queues: Dict[int, SendQueue] = {}
+
+def get_send_queue(bot: Bot) -> SendQueue:
+    """Общая очередь отправки для экземпляра бота"""
+    queue = _queues.get(id(bot))
+    if queue is None or queue.bot is not bot:
+        queue = _queues[id(bot)] = SendQueue(bot)
+    return queue
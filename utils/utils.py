@@ -46,7 +46,8 @@ def setup_superadmin_commands() -> List[BotCommand]:
     commands = [
         BotCommand(command="promote_user", description="Назначить админом"),
         BotCommand(command="demote_admin", description="Снять с админов"),
-        BotCommand(command="remove_user", description="Удалить пользователя")
+        BotCommand(command="remove_user", description="Удалить пользователя"),
+        BotCommand(command="job_stats", description="Статистика задач планировщика")
     ]
     return commands
 
@@ -0,0 +1,157 @@
+"""
+Модуль приёма обновлений Telegram через вебхук.
+
+Альтернатива поллингу: встроенный aiohttp-сервер принимает апдейты,
+сразу отвечает Telegram и передаёт их в Dispatcher в фоне с ограничением
+параллельности. Несколько экземпляров бота можно запускать за балансировщиком.
+
+Локальная проверка — POST канонического JSON апдейта на WEBHOOK_PATH:
+    curl -X POST -H 'Content-Type: application/json' \\
+         -H 'X-Telegram-Bot-Api-Secret-Token: <WEBHOOK_SECRET>' \\
+         -d @update.json http://localhost:8080/webhook
+"""
+
+import asyncio
+import logging
+import secrets
+from typing import Any, Dict, Optional, Set
+from urllib.parse import urlsplit
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import setup_application
+
+from config import (
+    WEBHOOK_BASE_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_MAX_CONCURRENCY
+)
+
+logger = logging.getLogger(__name__)
+
+class WebhookHandler:
+    """
+    Обработчик POST-запросов вебхука.
+
+    Отвечает 200 сразу после разбора JSON, а апдейт обрабатывает в фоновой задаче.
+    Одновременно в Dispatcher находится не более max_concurrency апдейтов,
+    остальные ждут своей очереди.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        secret_token: Optional[str] = WEBHOOK_SECRET,
+        max_concurrency: int = WEBHOOK_MAX_CONCURRENCY,
+        **data: Any
+    ):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret_token = secret_token
+        self.data = data
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def register(self, app: web.Application, path: str = WEBHOOK_PATH):
+        app.router.add_post(path, self.handle)
+        app.on_shutdown.append(self._on_shutdown)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret_token and not secrets.compare_digest(
+            request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), self.secret_token
+        ):
+            return web.Response(status=401, text="Unauthorized")
+
+        try:
+            update = await request.json(loads=self.bot.session.json_loads)
+        except ValueError:
+            return web.Response(status=400, text="Bad Request")
+
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.json_response({})
+
+    async def _process(self, update: Dict[str, Any]):
+        async with self._semaphore:
+            try:
+                result = await self.dispatcher.feed_raw_update(self.bot, update, **self.data)
+                if isinstance(result, TelegramMethod):
+                    await self.dispatcher.silent_call_request(bot=self.bot, result=result)
+            except Exception as e:
+                logger.error(f"Error processing webhook update {update.get('update_id')}: {e}")
+
+    async def drain(self):
+        """Ожидание обработки уже принятых апдейтов"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _on_shutdown(self, app: web.Application):
+        await self.drain()
+
+def create_webhook_app(dispatcher: Dispatcher, bot: Bot, **kwargs: Any) -> web.Application:
+    """
+    Создание aiohttp-приложения с маршрутом вебхука.
+
+    Args:
+        dispatcher (Dispatcher): Диспетчер с зарегистрированными роутерами
+        bot (Bot): Экземпляр бота
+        **kwargs: Параметры WebhookHandler (secret_token, max_concurrency)
+
+    Returns:
+        web.Application: Приложение, готовое к запуску через AppRunner
+    """
+    app = web.Application()
+    WebhookHandler(dispatcher, bot, **kwargs).register(app)
+    # Связываем startup/shutdown диспетчера с жизненным циклом приложения
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+def webhook_url(base_url: str = WEBHOOK_BASE_URL, path: str = WEBHOOK_PATH) -> str:
+    """
+    Полный адрес вебхука для set_webhook.
+
+    Raises:
+        ValueError: Если WEBHOOK_BASE_URL не задан или не является https-адресом
+            (Telegram принимает вебхуки только по HTTPS)
+    """
+    parts = urlsplit(base_url or "")
+    if parts.scheme != "https" or not parts.netloc:
+        raise ValueError(
+            f"BOT_MODE=webhook requires WEBHOOK_BASE_URL to be a public https URL "
+            f"(e.g. https://bot.example.com), got {base_url!r}"
+        )
+    return f"{base_url.rstrip('/')}{path}"
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot):
+    """
+    Регистрация вебхука в Telegram и запуск встроенного сервера.
+
+    Работает до отмены задачи (остановки бота).
+
+    Raises:
+        ValueError: При некорректном WEBHOOK_BASE_URL (до обращения к Telegram)
+    """
+    url = webhook_url()
+    await bot.set_webhook(
+        url=url,
+        secret_token=WEBHOOK_SECRET or None,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+        max_connections=min(WEBHOOK_MAX_CONCURRENCY, 100)  # предел Bot API
+    )
+
+    runner = web.AppRunner(create_webhook_app(dispatcher, bot))
+    await runner.setup()
+    site = web.TCPSite(runner, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Webhook server started on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()